@@ -1,41 +1,99 @@
+import importlib
 import os
+import time
 from flask import Flask
 from dotenv import load_dotenv
 from flask_cors import CORS
 
 load_dotenv()
 
-from routes.main import main_bp
-from routes.transcription import transcription_bp
-from routes.video import video_bp
-from routes.sentiment import sentiment_bp
+# Blueprint registry: name -> (module, attribute, url prefix)
+BLUEPRINTS = {
+    "main": ("routes.main", "main_bp", None),
+    "transcription": ("routes.transcription", "transcription_bp", "/api/transcription"),
+    "video": ("routes.video", "video_bp", "/api/video"),
+    "sentiment": ("routes.sentiment", "sentiment_bp", "/api/sentiment"),
+}
 
-app = Flask(__name__)
+# Worker profiles: which blueprints a worker serves (and therefore imports)
+PROFILES = {
+    "full": ["main", "transcription", "video", "sentiment"],
+    "sentiment": ["sentiment"],
+}
 
-CORS(app, origins=["http://localhost:3000"])
 
-app.config["AZURE_SPEECH_KEY"] = os.getenv("AZURE_SPEECH_KEY")
-app.config["AZURE_SPEECH_REGION"] = os.getenv("AZURE_SPEECH_REGION")
-app.config["STATIC_DIR"] = os.path.join(os.getcwd(), "static")
-app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
+def create_app(profile=None):
+    """Application factory.
 
-os.makedirs(app.config["STATIC_DIR"], exist_ok=True)
+    `profile` (or the APP_PROFILE env var) selects the blueprints to load, so a
+    sentiment-only worker never imports the download/transcription stack.
+    Per-module import times are recorded in IMPORT_TIMINGS_MS.
+    """
+    started = time.perf_counter()
+    profile = profile or os.getenv("APP_PROFILE", "full")
+    if profile not in PROFILES:
+        raise ValueError(f"Unknown app profile: {profile}")
 
-app.register_blueprint(main_bp)
-app.register_blueprint(transcription_bp, url_prefix="/api/transcription")
-app.register_blueprint(video_bp, url_prefix="/api/video")
-app.register_blueprint(sentiment_bp, url_prefix="/api/sentiment")
+    app = Flask(__name__)
 
+    CORS(app, origins=["http://localhost:3000"])
 
-@app.errorhandler(404)
-def not_found(error):
-    return {"error": "Endpoint not found"}, 404
+    app.config["APP_PROFILE"] = profile
+    app.config["AZURE_SPEECH_KEY"] = os.getenv("AZURE_SPEECH_KEY")
+    app.config["AZURE_SPEECH_REGION"] = os.getenv("AZURE_SPEECH_REGION")
+    app.config["STATIC_DIR"] = os.path.join(os.getcwd(), "static")
+    app.config["MAX_CONTENT_LENGTH"] = 16 * 1024 * 1024  # 16MB max file size
+    # Admin token enabling per-request profiling (X-Profile-Token / ?profile=); off when unset
+    app.config["PROFILE_TOKEN"] = os.getenv("PROFILE_TOKEN")
+    app.config["PROFILE_DIR"] = os.getenv("PROFILE_DIR", os.path.join(os.getcwd(), "profiles"))
+    app.config["ANALYSIS_DB"] = os.getenv(
+        "ANALYSIS_DB", os.path.join(os.getcwd(), "data", "analysis.db")
+    )
 
+    os.makedirs(app.config["STATIC_DIR"], exist_ok=True)
 
-@app.errorhandler(500)
-def internal_error(error):
-    return {"error": "Internal server error"}, 500
+    timings = {}
+    for name in PROFILES[profile]:
+        module_name, attribute, url_prefix = BLUEPRINTS[name]
+        import_started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        timings[module_name] = round((time.perf_counter() - import_started) * 1000, 2)
+        app.register_blueprint(getattr(module, attribute), url_prefix=url_prefix)
+
+    app.config["IMPORT_TIMINGS_MS"] = timings
+
+    # Negotiated gzip/brotli for JSON payloads
+    from routes.http_utils import compress_response
+
+    app.after_request(compress_response)
+
+    # Bulk maintenance commands (flask --app app rescore ...)
+    from commands import register_commands
+
+    register_commands(app)
+
+    @app.errorhandler(404)
+    def not_found(error):
+        return {"error": "Endpoint not found"}, 404
+
+    @app.errorhandler(500)
+    def internal_error(error):
+        return {"error": "Internal server error"}, 500
+
+    startup_ms = (time.perf_counter() - started) * 1000
+    print(f"App profile '{profile}' ready in {startup_ms:.1f} ms (imports: {timings})")
+    return app
+
+
+def __getattr__(name):
+    # `from app import app` builds the default app on first access, so that
+    # `create_app("sentiment")` callers never pay for the full route set.
+    if name == "app":
+        global app
+        app = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
-    app.run(debug=True, host="0.0.0.0", port=5000)
+    create_app().run(debug=True, host="0.0.0.0", port=5000)
@@ -0,0 +1,529 @@
+"""
+CLI Commands
+Bulk maintenance commands registered on the Flask CLI (`flask --app app <command>`)
+"""
+
+import asyncio
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from services.language_service import RECOGNITION_LOCALES
+
+REPORT_INTERVAL = 5.0  # seconds between throughput lines
+IN_FLIGHT_PER_WORKER = 4  # queued tasks per worker; bounds memory on huge corpora
+
+
+# -- rescore ------------------------------------------------------------------
+
+
+def _init_rescore_worker(lexicon_source: str):
+    """Pool initializer: load the lexicon once per worker process."""
+    from services.lexicon import reload_lexicon
+
+    reload_lexicon(lexicon_source)
+
+
+def _rescore_one(item_id: str, path: Optional[str], text: Optional[str], language, pack):
+    """Score one transcript (read from `path` when given); returns (id, results, characters)."""
+    from services.sentiment_service import SentimentAnalysisService
+
+    if path is not None:
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+    results = SentimentAnalysisService().analyze_all_features(text, language=language, pack=pack)
+    return item_id, results, len(text)
+
+
+def _scan_transcript_files(directory: str, placeholder: str) -> Iterator[Tuple[str, str, bool]]:
+    """Stream (file stem, path, is placeholder) for `*.txt` transcripts without listing the directory up front.
+
+    Only files exactly as long as `placeholder` are read to tell it from a transcript.
+    """
+    size = len(placeholder.encode("utf-8"))
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if not (entry.name.endswith(".txt") and entry.is_file()):
+                continue
+            is_placeholder = False
+            if entry.stat().st_size == size:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    is_placeholder = f.read() == placeholder
+            yield entry.name[:-4], entry.path, is_placeholder
+
+
+def _jsonl_entries(path: str) -> List[dict]:
+    """Complete entries of an append-only JSONL file; a torn last line is truncated away."""
+    entries = []
+    if not os.path.exists(path):
+        return entries
+    with open(path, "rb+") as f:
+        valid_end = 0
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            valid_end += len(line)
+            entries.append(json.loads(line))
+        f.truncate(valid_end)
+    return entries
+
+
+def _jsonl_done(path: str, version: str) -> Set[str]:
+    """Ids already written to a JSONL output at this lexicon version; drops a torn last line."""
+    return {entry["id"] for entry in _jsonl_entries(path) if entry.get("lexicon_version") == version}
+
+
+class _Throughput:
+    """Periodic progress lines: transcripts and characters per second."""
+
+    def __init__(self):
+        self.started = self.last_report = time.perf_counter()
+        self.items = self.characters = self.skipped = self.failed = self.unmatched = 0
+
+    def add(self, characters: int):
+        self.items += 1
+        self.characters += characters
+        now = time.perf_counter()
+        if now - self.last_report >= REPORT_INTERVAL:
+            self.last_report = now
+            click.echo(self.line(now))
+
+    def line(self, now: Optional[float] = None) -> str:
+        elapsed = max((now or time.perf_counter()) - self.started, 1e-9)
+        return (
+            f"{self.items} rescored, {self.skipped} skipped, {self.failed} failed"
+            f" in {elapsed:.1f}s"
+            f" ({self.items / elapsed:.1f} transcripts/s,"
+            f" {self.characters / elapsed / 1e6:.2f} M chars/s)"
+        )
+
+
+@click.command("rescore")
+@click.option(
+    "--source",
+    type=click.Choice(["files", "store"]),
+    default="files",
+    show_default=True,
+    help="Score transcripts from STATIC_DIR/*.txt or from the analysis store.",
+)
+@click.option("--output", type=click.Path(dir_okay=False), help="Append results to this JSONL file.")
+@click.option("--to-store", is_flag=True, help="Write results back to the analysis store.")
+@click.option("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+@click.option("--batch-size", type=int, default=256, show_default=True, help="Results per write.")
+@click.option("--pack", default=None, help="Feature pack to score (default: the lexicon's).")
+@click.option("--force", is_flag=True, help="Re-score transcripts already at this lexicon version.")
+@with_appcontext
+def rescore_command(source, output, to_store, workers, batch_size, pack, force):
+    """Re-score stored transcripts with the current lexicon.
+
+    Progress is checkpointed in the output itself: a JSONL file is appended
+    and flushed per batch, and the store stamps each job with the lexicon
+    version in the same transaction as its results. An interrupted run
+    started again skips what was already written at this lexicon version.
+
+    Transcripts of videos without speech are skipped. With --source files
+    --to-store, only files named after a stored job (as video analyses
+    name theirs) can be written back; the rest are reported as unmatched.
+    """
+    from services.analysis_store import Rescored, get_store
+    from services.lexicon import get_lexicon, lexicon_path
+    from services.transcription_service import NO_SPEECH_TRANSCRIPT
+
+    if bool(output) == bool(to_store):
+        raise click.UsageError("Choose exactly one of --output FILE or --to-store.")
+
+    version = get_lexicon().version
+    store = get_store(current_app.config["ANALYSIS_DB"]) if source == "store" or to_store else None
+    stored = store.lexicon_versions() if to_store else {}
+    done = set()
+    if output and not force:
+        done = _jsonl_done(output, version)
+    elif to_store and not force:
+        done = {job_id for job_id, stamp in stored.items() if stamp == version}
+
+    progress = _Throughput()
+
+    def items() -> Iterator[Tuple[str, Optional[str], Optional[str], Optional[str]]]:
+        """(id, path, text, language) of every transcript still to score."""
+        if source == "files":
+            scan = _scan_transcript_files(current_app.config["STATIC_DIR"], NO_SPEECH_TRANSCRIPT)
+            rows = ((item_id, path, None, None, empty) for item_id, path, empty in scan)
+        else:
+            rows = (
+                (row["job_id"], None, row["text"], row["language"], row["text"] == NO_SPEECH_TRANSCRIPT)
+                for row in store.transcripts()
+            )
+        for item_id, path, text, language, empty in rows:
+            if empty or item_id in done:
+                progress.skipped += 1
+            elif to_store and item_id not in stored:
+                progress.unmatched += 1
+            else:
+                yield item_id, path, text, language
+
+    pending = []
+    out = open(output, "a", encoding="utf-8") if output else None
+
+    def write_batch():
+        if out is not None:
+            for item_id, results in pending:
+                line = {"id": item_id, "lexicon_version": version, "results": results}
+                out.write(json.dumps(line, ensure_ascii=False) + "\n")
+            out.flush()
+            os.fsync(out.fileno())
+        elif pending:
+            store.rescore([Rescored(item_id, results, version) for item_id, results in pending])
+        pending.clear()
+
+    def collect(item_id: str, run):
+        try:
+            _, results, characters = run()
+        except Exception as e:
+            progress.failed += 1
+            click.echo(f"Failed to rescore {item_id}: {e}", err=True)
+            return
+        pending.append((item_id, results))
+        progress.add(characters)
+        if len(pending) >= batch_size:
+            write_batch()
+
+    workers = workers or os.cpu_count() or 1
+    click.echo(f"Rescoring {source} with lexicon {version} using {workers} worker(s)")
+    try:
+        if workers == 1:
+            for item in items():
+                collect(item[0], lambda: _rescore_one(*item, pack))
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_rescore_worker,
+                initargs=(lexicon_path(),),
+            ) as executor:
+                in_flight = {}
+                for item in items():
+                    in_flight[executor.submit(_rescore_one, *item, pack)] = item[0]
+                    if len(in_flight) >= workers * IN_FLIGHT_PER_WORKER:
+                        finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in finished:
+                            collect(in_flight.pop(future), future.result)
+                for future in wait(in_flight).done:
+                    collect(in_flight[future], future.result)
+        write_batch()
+    finally:
+        if out is not None:
+            out.close()
+
+    click.echo(f"Done: {progress.line()}")
+    if progress.unmatched:
+        click.echo(
+            f"{progress.unmatched} transcript file(s) match no stored job and were not written back",
+            err=True,
+        )
+
+
+# -- ingest -------------------------------------------------------------------
+
+UNSAFE_FILENAME_CHARS = re.compile(r"[^\w.-]+")
+
+
+def _read_url_file(path: str) -> Tuple[Dict[str, Tuple[str, str]], int, List[str]]:
+    """Canonical video key -> (first URL, platform), duplicates dropped, unsupported listed.
+
+    Blank lines and lines starting with "#" are ignored.
+    """
+    from services.video_urls import canonical_video_key, detect_platform
+
+    videos: Dict[str, Tuple[str, str]] = {}
+    duplicates = 0
+    unsupported = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            url = line.strip()
+            if not url or url.startswith("#"):
+                continue
+            platform = detect_platform(url)
+            if platform is None:
+                unsupported.append(url)
+                continue
+            key = canonical_video_key(url, platform)
+            if key in videos:
+                duplicates += 1
+            else:
+                videos[key] = (url, platform)
+    return videos, duplicates, unsupported
+
+
+def _work_name(video_key: str) -> str:
+    """Filesystem-safe, collision-free file stem for a video key."""
+    digest = hashlib.sha1(video_key.encode("utf-8")).hexdigest()[:10]
+    return f"{UNSAFE_FILENAME_CHARS.sub('_', video_key)[:80]}-{digest}"
+
+
+class _IngestJournal:
+    """Append-only JSONL of completed stages per video key, fsynced per entry.
+
+    A stage is trusted on resume only once it is journaled: files a crashed
+    run left behind without a journal entry are treated as partial.
+    """
+
+    def __init__(self, path: str):
+        self.stages: Dict[str, Dict[str, dict]] = {}
+        for entry in _jsonl_entries(path):
+            self.stages.setdefault(entry["key"], {})[entry["stage"]] = entry
+        self._file = open(path, "a", encoding="utf-8")
+
+    def completed(self, key: str, stage: str) -> Optional[dict]:
+        return self.stages.get(key, {}).get(stage)
+
+    def record(self, key: str, stage: str, **details):
+        entry = {"key": key, "stage": stage, **details}
+        self._file.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.stages.setdefault(key, {})[stage] = entry
+
+    def close(self):
+        self._file.close()
+
+
+def _remove(*paths: str):
+    for path in paths:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _fsync(path: str):
+    """Flush a file the stages wrote to disk before the journal vouches for it."""
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+
+
+async def _ingest_video(key, service, journal, limits, score, keep_media):
+    """Run the stages of one video that the journal does not already cover; returns the result line."""
+    from services.pipeline import pipeline
+
+    stage = journal.completed(key, "transcribed")
+    transcript = stage.get("transcript", service.transcript_file) if stage else None
+    if transcript and os.path.exists(transcript):
+        with open(transcript, "r", encoding="utf-8") as f:
+            text = f.read()
+        service.language = stage.get("language") or service.language
+    else:
+        # Journaled stages count only while their output is still on disk
+        downloaded = journal.completed(key, "downloaded")
+        converted = (
+            journal.completed(key, "converted") is not None and os.path.exists(service.audio_wav)
+        )
+        if downloaded is None:
+            async with limits["download"]:
+                await pipeline.preflight(service)
+        else:
+            service.duration = downloaded.get("duration")
+            if not converted and not os.path.exists(service.audio_mp3):
+                downloaded = None  # media removed after an earlier transcript that is gone too
+        if service.caption_text is not None:
+            text = service._save_transcript([service.caption_text])
+        else:
+            # Media stages share the pipeline scheduler as batch-lane jobs
+            async with pipeline.scheduler.slot("batch", service.duration):
+                if downloaded is None:
+                    async with limits["download"]:
+                        _remove(service.audio_mp3)
+                        await pipeline.download(service)
+                    journal.record(key, "downloaded", duration=service.duration)
+                if not converted:
+                    async with limits["convert"]:
+                        _remove(service.audio_wav)
+                        await pipeline.convert(service)
+                    journal.record(key, "converted")
+                async with limits["transcribe"]:
+                    await pipeline.trim(service)
+                    text = await pipeline.transcribe(service)
+        if text.startswith("["):
+            raise RuntimeError(text)
+        # Media is the only way back to a lost transcript, so it goes once the transcript is durable
+        _fsync(service.transcript_file)
+        journal.record(
+            key, "transcribed", language=service.language, transcript=service.transcript_file
+        )
+        if not keep_media:
+            _remove(service.audio_mp3, service.audio_wav, service.speech_wav)
+
+    async with limits["score"]:
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(None, score, text, service.language)
+    return text, results
+
+
+async def _ingest_all(videos, make_service, journal, jobs, score, keep_media, max_in_flight, emit):
+    """Feed videos through the stages, at most `max_in_flight` between download and result.
+
+    `jobs` maps each stage (download, convert, transcribe, score) to its concurrency.
+    """
+    limits = {stage: asyncio.Semaphore(count) for stage, count in jobs.items()}
+    window = asyncio.Semaphore(max_in_flight)
+    tasks = set()
+
+    async def run(key, url, platform):
+        try:
+            service = make_service(key, url, platform)
+            outcome = await _ingest_video(key, service, journal, limits, score, keep_media)
+        except Exception as e:
+            emit(key, url, platform, None, error=f"{type(e).__name__}: {e}")
+        else:
+            emit(key, url, platform, service, *outcome)
+        finally:
+            window.release()
+
+    for key, (url, platform) in videos.items():
+        await window.acquire()
+        task = asyncio.create_task(run(key, url, platform))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    if tasks:
+        await asyncio.gather(*tasks)
+
+
+@click.command("ingest")
+@click.argument("url_file", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--output", required=True, type=click.Path(dir_okay=False),
+    help="Append per-video results to this JSONL file.",
+)
+@click.option("--journal", type=click.Path(dir_okay=False), help="Stage journal (default: OUTPUT.journal).")
+@click.option("--work-dir", type=click.Path(file_okay=False), help="Media and transcripts (default: STATIC_DIR/ingest).")
+@click.option("--download-jobs", type=int, default=4, show_default=True, help="Concurrent metadata fetches and downloads.")
+@click.option("--convert-jobs", type=int, default=2, show_default=True, help="Concurrent MP3 -> WAV conversions.")
+@click.option(
+    "--transcribe-jobs", type=int, default=2, show_default=True,
+    help="Concurrent recognitions (the speech quota still applies).",
+)
+@click.option("--score-jobs", type=int, default=2, show_default=True, help="Concurrent sentiment scorings.")
+@click.option(
+    "--max-in-flight", type=int, default=None,
+    help="Videos started but not yet written (default: sum of stage jobs).",
+)
+@click.option("--language", type=click.Choice(sorted(RECOGNITION_LOCALES)), default=None, help="Force the recognition language.")
+@click.option("--pack", default=None, help="Feature pack to score (default: the lexicon's).")
+@click.option("--keep-media", is_flag=True, help="Keep MP3/WAV files after transcription.")
+@with_appcontext
+def ingest_command(
+    url_file, output, journal, work_dir, download_jobs, convert_jobs, transcribe_jobs,
+    score_jobs, max_in_flight, language, pack, keep_media,
+):
+    """Analyze every video URL listed in URL_FILE (one per line).
+
+    URLs are canonicalized to video keys and de-duplicated, then run through
+    download -> convert -> transcribe -> sentiment on the pipeline loop, each
+    stage with its own concurrency limit. Videos already in OUTPUT are
+    skipped; for the rest, every completed stage is journaled, so a rerun
+    after an interruption picks each video up at its first unfinished stage.
+    Failed videos are written with an "error" and retried by the next run.
+
+    A video that needs its audio holds a batch-lane pipeline scheduler slot
+    from download to recognition, so at most PIPELINE_MAX_JOBS are in the
+    media stages at once.
+    """
+    from services.analysis_store import overall_sentiment
+    from services.pipeline import pipeline
+    from services.sentiment_service import SentimentAnalysisService
+    from services.transcription_service import TranscriptionService
+
+    jobs = {
+        "download": download_jobs,
+        "convert": convert_jobs,
+        "transcribe": transcribe_jobs,
+        "score": score_jobs,
+    }
+    if min(jobs.values()) < 1 or (max_in_flight is not None and max_in_flight < 1):
+        raise click.UsageError("Job counts and --max-in-flight must be at least 1.")
+
+    videos, duplicates, unsupported = _read_url_file(url_file)
+    for url in unsupported:
+        click.echo(f"Skipping unsupported URL: {url}", err=True)
+    done = {entry["video_key"] for entry in _jsonl_entries(output) if "error" not in entry}
+    pending = {key: video for key, video in videos.items() if key not in done}
+    click.echo(
+        f"{len(videos)} videos ({duplicates} duplicate URLs dropped, {len(unsupported)} unsupported),"
+        f" {len(videos) - len(pending)} already done"
+    )
+
+    work_dir = os.path.abspath(work_dir or os.path.join(current_app.config["STATIC_DIR"], "ingest"))
+    os.makedirs(work_dir, exist_ok=True)
+    azure_key = current_app.config["AZURE_SPEECH_KEY"]
+    azure_region = current_app.config["AZURE_SPEECH_REGION"]
+
+    def make_service(key, url, platform):
+        return TranscriptionService(
+            azure_key=azure_key,
+            azure_region=azure_region,
+            static_dir=work_dir,
+            youtube_url=url,
+            filename=_work_name(key),
+            platform=platform,
+            language=language,
+            record_segments=False,
+        )
+
+    sentiment = SentimentAnalysisService()
+
+    def score(text, text_language):
+        return sentiment.analyze_all_features(text, language=text_language, pack=pack)
+
+    progress = {"done": 0, "failed": 0}
+    out = open(output, "a", encoding="utf-8")
+
+    # Called on the pipeline loop thread only, so writes never interleave
+    def emit(key, url, platform, service, text=None, results=None, error=None):
+        line = {"video_key": key, "url": url, "platform": platform}
+        if error is not None:
+            line["error"] = error
+            progress["failed"] += 1
+            click.echo(f"Failed {url}: {error}", err=True)
+        else:
+            line.update(
+                language=service.language,
+                lexicon_version=next((r["lexicon_version"] for r in results.values()), None),
+                overall=overall_sentiment(results),
+                results=results,
+                transcript=text,
+            )
+            progress["done"] += 1
+        out.write(json.dumps(line, ensure_ascii=False) + "\n")
+        out.flush()
+        os.fsync(out.fileno())
+        finished = progress["done"] + progress["failed"]
+        click.echo(f"[{finished}/{len(pending)}] {key}: {line.get('overall', 'failed')}")
+
+    stage_journal = _IngestJournal(journal or f"{output}.journal")
+    started = time.perf_counter()
+    try:
+        pipeline.submit(
+            _ingest_all(
+                pending, make_service, stage_journal, jobs, score, keep_media,
+                max_in_flight or sum(jobs.values()), emit,
+            )
+        ).result()
+    finally:
+        stage_journal.close()
+        out.close()
+
+    click.echo(
+        f"Done: {progress['done']} analyzed, {progress['failed']} failed"
+        f" in {time.perf_counter() - started:.1f}s"
+    )
+
+
+def register_commands(app):
+    app.cli.add_command(rescore_command)
+    app.cli.add_command(ingest_command)
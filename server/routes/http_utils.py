@@ -0,0 +1,213 @@
+"""
+Shared helpers for route handlers.
+"""
+
+import gzip
+import hmac
+import inspect
+import os
+import uuid
+from datetime import datetime, timezone
+from functools import wraps
+
+from flask import current_app, jsonify, request
+
+PROFILE_HEADER = "X-Profile-Token"
+PROFILE_QUERY = "profile"
+
+MIN_COMPRESS_SIZE = 1024  # bytes; smaller bodies are sent as is
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# brotli is optional: without it clients are offered gzip only
+brotli = None
+_brotli_checked = False
+
+
+def _load_brotli():
+    global brotli, _brotli_checked
+    if not _brotli_checked:
+        try:
+            import brotli as brotli_module
+
+            brotli = brotli_module
+        except ImportError:
+            brotli = None
+        _brotli_checked = True
+    return brotli
+
+
+def _parse_fields(spec):
+    """Split "a,b.*.c,-d" into (include tree or None, exclude tree); True marks a whole subtree."""
+    include, exclude = {}, {}
+    for field in (f.strip() for f in spec.split(",")):
+        if not field or field == "-":
+            continue
+        tree = exclude if field.startswith("-") else include
+        parts = field.lstrip("-").split(".")
+        for part in parts[:-1]:
+            node = tree.get(part)
+            if node is True:
+                break
+            tree = tree.setdefault(part, {})
+        else:
+            tree[parts[-1]] = True
+    return include or None, exclude
+
+
+def _subtree(tree, key):
+    return tree.get(key) or tree.get("*")
+
+
+def _keep(data, tree):
+    if tree is True:
+        return data
+    if isinstance(data, list):
+        return [_keep(item, tree) for item in data]
+    if not isinstance(data, dict):
+        return data
+    kept = {}
+    for key, value in data.items():
+        node = _subtree(tree, key)
+        if node:
+            kept[key] = _keep(value, node)
+    return kept
+
+
+def _drop(data, tree):
+    if isinstance(data, list):
+        return [_drop(item, tree) for item in data]
+    if not isinstance(data, dict):
+        return data
+    kept = {}
+    for key, value in data.items():
+        node = _subtree(tree, key)
+        if node is True:
+            continue
+        kept[key] = _drop(value, node) if node else value
+    return kept
+
+
+def project(data, spec):
+    """Apply a fields= projection to a response payload.
+
+    Dotted paths select nested keys, "*" matches any key (list items are
+    matched element-wise) and a leading "-" excludes a path, e.g.
+    fields=-fullTranscription,-sentiment.*.relevant_text.
+    """
+    if not spec:
+        return data
+    include, exclude = _parse_fields(spec)
+    if include is not None:
+        data = _keep(data, include)
+    if exclude:
+        data = _drop(data, exclude)
+    return data
+
+
+def json_response(payload, status=200):
+    """jsonify the payload after the request's fields= projection."""
+    return jsonify(project(payload, request.args.get("fields"))), status
+
+
+def not_modified(etag, last_modified=None):
+    """304 response when the client's validators match the current version, else None."""
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    else:
+        since = request.if_modified_since
+        matched = (
+            last_modified is not None
+            and since is not None
+            and int(last_modified) <= since.timestamp()
+        )
+    if not matched:
+        return None
+    return with_validators(current_app.response_class(status=304), etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    """Attach a weak ETag (bodies may be re-encoded) and Last-Modified."""
+    response = current_app.make_response(response)
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = datetime.fromtimestamp(int(last_modified), timezone.utc)
+    return response
+
+
+def compress_response(response):
+    """after_request hook: gzip/brotli-encode JSON bodies the client accepts."""
+    if (
+        response.direct_passthrough
+        or response.mimetype != "application/json"
+        or "Content-Encoding" in response.headers
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    accepted = request.accept_encodings
+    body = response.get_data()
+    if len(body) < MIN_COMPRESS_SIZE:
+        return response
+
+    if accepted["br"] and _load_brotli() is not None:
+        response.set_data(brotli.compress(body, quality=BROTLI_QUALITY))
+        response.headers["Content-Encoding"] = "br"
+    elif accepted["gzip"]:
+        response.set_data(gzip.compress(body, compresslevel=GZIP_LEVEL))
+        response.headers["Content-Encoding"] = "gzip"
+    return response
+
+
+def _profile_path():
+    """Profile file for this request when an admin asked for one, else None."""
+    token = current_app.config.get("PROFILE_TOKEN")
+    if not token:
+        return None
+    supplied = request.headers.get(PROFILE_HEADER) or request.args.get(PROFILE_QUERY)
+    if not supplied or not hmac.compare_digest(supplied, token):
+        return None
+    request_id = request.headers.get("X-Request-Id") or uuid.uuid4().hex
+    # Request ids become file names: keep only safe characters
+    request_id = "".join(c for c in request_id if c.isalnum() or c in "-_")[:64] or uuid.uuid4().hex
+    return os.path.join(current_app.config["PROFILE_DIR"], f"{request_id}.folded")
+
+
+def _tag(response, path):
+    response = current_app.make_response(response)
+    response.headers["X-Profile-Id"] = os.path.splitext(os.path.basename(path))[0]
+    return response
+
+
+def profiled(view):
+    """Run the view under the sampling profiler when PROFILE_TOKEN is presented.
+
+    Requests without the token call the view directly; the profiler module is
+    only imported for profiled requests.
+    """
+    if inspect.iscoroutinefunction(view):
+        @wraps(view)
+        async def wrapper(*args, **kwargs):
+            path = _profile_path()
+            if path is None:
+                return await view(*args, **kwargs)
+            from services.profiling import profile_to
+
+            with profile_to(path):
+                response = await view(*args, **kwargs)
+            return _tag(response, path)
+    else:
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            path = _profile_path()
+            if path is None:
+                return view(*args, **kwargs)
+            from services.profiling import profile_to
+
+            with profile_to(path):
+                response = view(*args, **kwargs)
+            return _tag(response, path)
+
+    return wrapper
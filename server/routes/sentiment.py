@@ -1,6 +1,11 @@
-from flask import Blueprint, request, jsonify, render_template_string, current_app
+import codecs
+from flask import Blueprint, request, jsonify, render_template_string
+from werkzeug.wsgi import get_input_stream
 from services.sentiment_service import SentimentAnalysisService
-from services.transcription_service import TranscriptionService
+from services.lexicon import get_lexicon, reload_lexicon
+from services.custom_features import custom_feature_sets
+from services.job_registry import DEFAULT_JOB, job_registry
+from routes.http_utils import json_response, profiled
 
 sentiment_bp = Blueprint("sentiment", __name__)
 
@@ -8,7 +13,19 @@ sentiment_bp = Blueprint("sentiment", __name__)
 sentiment_service = SentimentAnalysisService()
 
 
+def _unsupported_language(language):
+    """400 response for a language without a lexicon shard; None if it has one or is omitted."""
+    shards = get_lexicon().shards
+    if language is None or language in shards:
+        return None
+    return jsonify({
+        "error": "Unsupported language",
+        "supported_languages": sorted(shards),
+    }), 400
+
+
 @sentiment_bp.route("/analyze", methods=["POST"])
+@profiled
 def analyze_sentiment():
     """
     Analyze sentiment for device features from provided text.
@@ -16,7 +33,10 @@ def analyze_sentiment():
     Request body:
     {
         "text": "The camera is amazing but the battery life is terrible...",
-        "features": ["camera", "battery", "screen"]  // optional
+        "features": ["camera", "battery", "screen"],  // optional, sub-features included
+        "pack": "laptop",  // optional feature pack used when features are omitted
+        "custom_features": {"wifi": ["wifi", "wi-fi"]},  // optional, or a registered set id
+        "language": "en"  // optional lexicon shard, detected from the text when omitted
     }
     """
     try:
@@ -27,36 +47,152 @@ def analyze_sentiment():
 
         text = data["text"]
         features = data.get("features", None)
+        language = data.get("language", None)
+        pack = data.get("pack", None)
+        custom_features = custom_feature_sets.resolve(data.get("custom_features"))
 
         if not text.strip():
             return jsonify({"error": "Text cannot be empty"}), 400
 
-        results = sentiment_service.analyze_all_features(text, features)
+        unsupported = _unsupported_language(language)
+        if unsupported is not None:
+            return unsupported
+
+        results = sentiment_service.analyze_all_features(
+            text, features, language, pack, custom_features
+        )
+
+        return json_response({"results": results, "analyzed_features": list(results.keys())})
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+def _iter_request_text(chunk_size=64 * 1024):
+    """Decode the raw request body as UTF-8 text chunks without buffering it."""
+    # Read straight from the WSGI input so MAX_CONTENT_LENGTH does not apply
+    stream = get_input_stream(request.environ, max_content_length=None)
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    while True:
+        block = stream.read(chunk_size)
+        if not block:
+            break
+        yield decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+
+@sentiment_bp.route("/analyze-stream", methods=["POST"])
+def analyze_sentiment_stream():
+    """
+    Analyze sentiment for a plain-text body of any size (chunked uploads supported).
+
+    Request: raw UTF-8 text body, optional ?features=camera,battery (or ?pack=earbuds)&language=pl
+    and ?custom=<registered custom feature set id>
+    Memory stays constant: the body is scored sentence by sentence.
+    """
+    try:
+        features_param = request.args.get("features")
+        features = (
+            [f.strip() for f in features_param.split(",") if f.strip()]
+            if features_param
+            else None
+        )
+
+        custom_features = custom_feature_sets.resolve(request.args.get("custom"))
+
+        language = request.args.get("language")
+        unsupported = _unsupported_language(language)
+        if unsupported is not None:
+            return unsupported
 
-        return (
-            jsonify({"results": results, "analyzed_features": list(results.keys())}),
-            200,
+        results = sentiment_service.analyze_stream(
+            _iter_request_text(),
+            features,
+            language,
+            request.args.get("pack"),
+            custom_features,
         )
 
+        return json_response({"results": results, "analyzed_features": list(results.keys())})
+
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+@sentiment_bp.route("/custom-features", methods=["POST"])
+def register_custom_features():
+    """
+    Register a custom feature dictionary for reuse by id.
+
+    Request body: {"features": {"wifi": ["wifi", "wi-fi"], "gps": ["gps", "navigation"]}}
+    Identical dictionaries get the same id; rarely used sets are forgotten first.
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        set_id = custom_feature_sets.register(data.get("features"))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"id": set_id, "features": list(custom_feature_sets.get(set_id))}), 201
+
+
+@sentiment_bp.route("/custom-features/<set_id>", methods=["GET"])
+def get_custom_features(set_id):
+    """Get a registered custom feature dictionary."""
+    definition = custom_feature_sets.get(set_id)
+    if definition is None:
+        return jsonify({"error": f"Unknown custom feature set: {set_id}"}), 404
+    return jsonify({"id": set_id, "features": definition}), 200
+
+
 @sentiment_bp.route("/features", methods=["GET"])
 def get_available_features():
-    """Get list of available features that can be analyzed."""
-    return jsonify({"features": sentiment_service.get_available_features()}), 200
+    """Get the features that can be analyzed, their sub-features and the feature packs."""
+    taxonomy = get_lexicon().taxonomy
+    return (
+        jsonify(
+            {
+                "features": sentiment_service.get_available_features(),
+                "subfeatures": taxonomy.children,
+                "packs": taxonomy.packs,
+                "default_pack": taxonomy.default_pack,
+            }
+        ),
+        200,
+    )
+
+
+@sentiment_bp.route("/lexicon", methods=["GET"])
+def get_lexicon_info():
+    """Get the version of the active lexicon."""
+    lexicon = get_lexicon()
+    return jsonify({"version": lexicon.version, "features": list(lexicon.features)}), 200
+
+
+@sentiment_bp.route("/lexicon/reload", methods=["POST"])
+def reload_lexicon_route():
+    """Recompile (if changed) and atomically swap in the lexicon from LEXICON_PATH."""
+    try:
+        lexicon = reload_lexicon()
+        return jsonify({"version": lexicon.version}), 200
+    except Exception as e:
+        return jsonify({"error": f"Lexicon reload failed: {str(e)}"}), 500
 
 
 @sentiment_bp.route("/analyze-transcription", methods=["POST"])
 def analyze_transcription():
-    """Analyze sentiment from the current transcription."""
+    """Analyze sentiment from a finished transcription job (body: {"job_id": ...})."""
     try:
-        transcription_service = TranscriptionService(
-            azure_key=current_app.config["AZURE_SPEECH_KEY"],
-            azure_region=current_app.config["AZURE_SPEECH_REGION"],
-            static_dir=current_app.config["STATIC_DIR"],
-        )
+        job_id = (request.get_json(silent=True) or {}).get("job_id") or DEFAULT_JOB
+        job = job_registry.get(job_id)
+        if job is None:
+            return jsonify({"error": f"Unknown transcription job: {job_id}"}), 404
+        transcription_service = job.service
+        if transcription_service.state == "failed":
+            return jsonify({"error": "Transcription failed", "details": transcription_service.error}), 500
 
         if not transcription_service.is_transcription_done():
             return jsonify({"error": "Transcription not yet complete"}), 202
@@ -68,15 +204,12 @@ def analyze_transcription():
         # Analyze sentiment
         results = sentiment_service.analyze_all_features(text)
 
-        return (
-            jsonify(
-                {
-                    "results": results,
-                    "analyzed_features": list(results.keys()),
-                    "source": "transcription",
-                }
-            ),
-            200,
+        return json_response(
+            {
+                "results": results,
+                "analyzed_features": list(results.keys()),
+                "source": "transcription",
+            }
         )
 
     except Exception as e:
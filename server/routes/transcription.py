@@ -1,36 +1,156 @@
-import os
-from flask import Blueprint, render_template_string, current_app, jsonify
+from flask import Blueprint, render_template_string, current_app, jsonify, request
+from services.job_registry import DEFAULT_JOB, JobRegistryFull, job_registry
+from services.language_service import RECOGNITION_LOCALES
 from services.transcription_service import TranscriptionService
+from services.video_urls import detect_platform
+from routes.http_utils import not_modified, with_validators
+import hashlib
+import re
 import time
 
 transcription_bp = Blueprint("transcription", __name__)
 
-# Initialize service
-transcription_service = None
+UNSAFE_FILENAME_CHARS = re.compile(r"[^A-Za-z0-9_-]")
 
 
-def get_transcription_service():
-    """Get or create transcription service instance."""
-    global transcription_service
-    if transcription_service is None:
-        transcription_service = TranscriptionService(
+def _job_id():
+    return request.args.get("job") or DEFAULT_JOB
+
+
+def _job_filename(job_id):
+    """Filename prefix of a job's artifacts: the id, made safe and kept unique."""
+    safe = UNSAFE_FILENAME_CHARS.sub("_", job_id)[:64]
+    if safe != job_id:
+        # Distinct ids may sanitize alike, so tell them apart by a hash of the original
+        safe += "-" + hashlib.sha1(job_id.encode("utf-8")).hexdigest()[:10]
+    return f"job-{safe}"
+
+
+def get_transcription_service(job_id=DEFAULT_JOB, url=None, platform=None, language=None):
+    """Get or create (without starting) the transcription service of a job.
+
+    Each job has its own files in STATIC_DIR; without a url the job
+    transcribes the demo video.
+    """
+    def create():
+        return TranscriptionService(
             azure_key=current_app.config["AZURE_SPEECH_KEY"],
             azure_region=current_app.config["AZURE_SPEECH_REGION"],
             static_dir=current_app.config["STATIC_DIR"],
+            youtube_url=url,
+            filename=_job_filename(job_id),
+            platform=platform,
+            language=language,
+        )
+
+    return job_registry.get_or_create(job_id, create).service
+
+
+def _find_service():
+    """(service, None) for the requested job, or (None, 404 response) when it is unknown."""
+    job = job_registry.get(_job_id())
+    if job is None:
+        return None, (
+            jsonify({"error": "Unknown job", "message": "POST /api/transcription/start first"}),
+            404,
         )
-    return transcription_service
+    return job.service, None
+
+
+@transcription_bp.route("/start", methods=["POST"])
+def start_transcription():
+    """
+    Start the download/transcription of a job (?job=, default "default"); idempotent.
+
+    Optional JSON body: {"url": "https://...", "language": "en"}; a job keeps
+    the video it was started with.
+    """
+    job_id = _job_id()
+    data = request.get_json(silent=True) or {}
+
+    url = (data.get("url") or "").strip() or None
+    platform = None
+    if url is not None:
+        if not (url.startswith("http://") or url.startswith("https://")):
+            return jsonify({"error": "Invalid URL format"}), 400
+        platform = detect_platform(url)
+        if not platform:
+            return jsonify({"error": "Unsupported video platform"}), 400
+
+    language = data.get("language")
+    if language is not None and language not in RECOGNITION_LOCALES:
+        return jsonify({
+            "error": "Unsupported language",
+            "supported_languages": list(RECOGNITION_LOCALES),
+        }), 400
+
+    try:
+        service = get_transcription_service(job_id, url, platform, language)
+    except JobRegistryFull as e:
+        return jsonify({"error": "Too many active jobs", "message": str(e)}), 503
+    if url is not None and service.youtube_url != url:
+        return jsonify({"error": "Job already exists for another video", "job_id": job_id}), 409
+    service.start()
+    return jsonify({"job_id": job_id, "state": service.state}), 202
 
 
 @transcription_bp.route("/status")
 def transcription_status():
-    """Get transcription status."""
-    service = get_transcription_service()
+    """Get transcription status (conditional: If-None-Match / If-Modified-Since -> 304)."""
+    service, error = _find_service()
+    if error:
+        return error
+    version, modified = service.content_version()
+    done = service.is_transcription_done()
+    state = service.state
+    etag = f"{version}-{state}"
+    cached = not_modified(etag, modified)
+    if cached is not None:
+        return cached
+
+    response = jsonify(
+        {
+            "transcription_done": done,
+            "state": state,
+            "error": service.error,
+            "transcript_available": modified is not None,
+            "timestamp": int(time.time()),
+        }
+    )
+    return with_validators(response, etag, modified)
+
+
+@transcription_bp.route("/segments")
+def get_transcription_segments():
+    """
+    Get timed transcript segments.
+
+    Query: ?start=120&end=180 for the segments overlapping that window (seconds),
+    or ?since=N for the segments recognized after the first N (poll with "next").
+    """
+    service, error = _find_service()
+    if error:
+        return error
+    segments = service.segments
+    try:
+        if "since" in request.args:
+            since = max(0, int(request.args["since"]))
+            found = segments.since(since)
+            next_index = since + len(found)
+        else:
+            start = float(request.args.get("start", 0))
+            end = float(request.args.get("end", "inf"))
+            found = segments.range(start, end)
+            next_index = len(segments)
+    except ValueError:
+        return jsonify({"error": "start/end must be numbers and since an integer"}), 400
+
     return (
         jsonify(
             {
+                "segments": [segment.to_dict() for segment in found],
+                "next": next_index,
                 "transcription_done": service.is_transcription_done(),
-                "transcript_available": service.has_transcript_file(),
-                "timestamp": int(time.time()),
             }
         ),
         200,
@@ -39,16 +159,43 @@ def transcription_status():
 
 @transcription_bp.route("/text")
 def get_transcription_text():
-    """Get transcription text."""
-    service = get_transcription_service()
+    """Get transcription text (reads never start work: POST /start does)."""
+    service, error = _find_service()
+    if error:
+        return error
+
+    state = service.state
+    if state == "created":
+        return (
+            jsonify({"error": "Transcription not started", "message": "POST /api/transcription/start first"}),
+            409,
+        )
+    if state == "failed":
+        return jsonify({"error": "Transcription failed", "details": service.error}), 500
 
-    # If WAV file doesn't exist yet, start download/conversion
-    if not os.path.exists(service.audio_wav):
-        print(f"DEBUG: WAV file missing: {service.audio_wav}, starting preparation...")
+    # ?since=<cursor>: only text appended after the cursor returned as "next"
+    cursor = None
+    if "since" in request.args:
         try:
-            service._download_and_prepare_audio()
-        except Exception as e:
-            return jsonify({"error": "Failed to prepare audio", "details": str(e)}), 500
+            cursor = max(0, int(request.args["since"]))
+        except ValueError:
+            return jsonify({"error": "since must be an integer"}), 400
+
+    # Polls are answered from the file's size/mtime (or segment count) alone;
+    # a since= body depends on the cursor too, so its tag names both
+    version, modified = service.content_version()
+    if cursor is not None:
+        version = f"{version}-{cursor}"
+    cached = not_modified(version, modified)
+    if cached is not None:
+        return cached
+
+    if cursor is not None:
+        text, next_cursor = service.get_transcript_since(cursor)
+        response = jsonify(
+            {"text": text, "next": next_cursor, "done": service.is_transcription_done()}
+        )
+        return with_validators(response, version, modified)
 
     # If transcription hasn't started yet, let the service start it
     if not service.is_transcription_done():
@@ -65,7 +212,8 @@ def get_transcription_text():
     # Try to read transcript
     text = service.get_transcript_text()
     if text:
-        return jsonify({"text": text, "length": len(text)}), 200
+        response = jsonify({"text": text, "length": len(text)})
+        return with_validators(response, version, modified)
 
     # Still nothing
     return (
@@ -109,7 +257,7 @@ def transcription_page():
     <div class="audio-player">
         <h3>Audio:</h3>
         <audio controls>
-            <source src="{{ url_for('static', filename='audio.mp3') }}" type="audio/mpeg">
+            <source src="{{ url_for('static', filename='job-default.mp3') }}" type="audio/mpeg">
             Your browser does not support the audio element.
         </audio>
     </div>
@@ -133,8 +281,13 @@ async function checkStatus() {
     const transcript = document.getElementById('transcript');
     try {
         const resp = await fetch('/api/transcription/status');
+        if (resp.status === 404) {
+            transcript.innerHTML = '<p>No transcription started yet.</p>';
+            return;
+        }
         const data = await resp.json();
         transcript.innerHTML = '<h3>Status:</h3>' +
+            '<p>State: ' + escapeHtml(data.state) + '</p>' +
             '<p>Transcription complete: ' + (data.transcription_done ? '✅' : '❌') + '</p>' +
             '<p>File available: ' + (data.transcript_available ? '✅' : '❌') + '</p>' +
             '<p>Timestamp: ' + new Date(data.timestamp * 1000).toLocaleTimeString() + '</p>';
@@ -152,6 +305,13 @@ async function loadTranscription() {
     let attempt = 0;
     let delay = 1000;
 
+    const started = await fetch('/api/transcription/start', { method: 'POST' });
+    if (!started.ok) {
+        const body = await started.json().catch(() => ({}));
+        transcript.innerHTML = '<p style="color:red;">❌ Error: ' + (body.error || started.statusText) + '</p>';
+        return;
+    }
+
     while (Date.now() - startTime < maxWait) {
         attempt++;
         try {
@@ -1,11 +1,15 @@
 from flask import Blueprint, request, jsonify, current_app
+import asyncio
 import os
 import uuid
-import time
 import re
 from urllib.parse import urlparse, parse_qs
-from services.transcription_service import TranscriptionService
-from services.sentiment_service import SentimentAnalysisService
+from services.transcription_service import TranscriptionService, VideoRejected
+from services.language_service import RECOGNITION_LOCALES
+from services.pipeline import pipeline
+from services.analysis_store import AnalysisRecord, get_store
+from services.video_urls import SUPPORTED_PLATFORMS, canonical_video_key, detect_platform
+from routes.http_utils import json_response, profiled
 
 video_bp = Blueprint("video", __name__)
 
@@ -86,8 +90,16 @@ def _generate_embed_url(url: str, platform: str) -> str:
     return url
 
 
+def _record_failure(store, record: AnalysisRecord, error: str):
+    """Store a job as failed, unless its record was already stored."""
+    if record.finished_at is None:
+        record.status, record.error = "failed", error
+        store.record(record)
+
+
 @video_bp.route("/analyze", methods=["POST"])
-def analyze_video():
+@profiled
+async def analyze_video():
     """
     Complete video analysis workflow:
     1. Download YouTube video
@@ -95,6 +107,9 @@ def analyze_video():
     3. Transcribe with Azure (REAL LOGIC)
     4. Analyze sentiment (REAL LOGIC)
     5. Return full results
+
+    Stages run as coroutines on the shared analysis pipeline loop; this view
+    only awaits the job result.
     """
     data = request.get_json()
 
@@ -105,32 +120,31 @@ def analyze_video():
     if not url or not (url.startswith("http://") or url.startswith("https://")):
         return jsonify({"error": "Invalid URL format"}), 400
 
+    # Optional spoken language; detected from the audio when omitted
+    language = data.get("language")
+    if language is not None and language not in RECOGNITION_LOCALES:
+        return jsonify({
+            "error": "Unsupported language",
+            "supported_languages": list(RECOGNITION_LOCALES),
+        }), 400
+
     # Detect supported video platform
-    supported_platforms = {
-        "youtube.com": "youtube",
-        "youtu.be": "youtube",
-        "vimeo.com": "vimeo",
-        "tiktok.com": "tiktok",
-        "vm.tiktok.com": "tiktok",
-    }
-    
-    platform = None
-    for domain, platform_name in supported_platforms.items():
-        if domain in url:
-            platform = platform_name
-            break
-    
+    platform = detect_platform(url)
     if not platform:
         return jsonify({
             "error": "Unsupported video platform",
-            "supported_platforms": list(set(supported_platforms.values())),
+            "supported_platforms": list(set(SUPPORTED_PLATFORMS.values())),
             "message": "Currently supported: YouTube, Vimeo, TikTok"
         }), 400
 
     # Generate unique ID to avoid file conflicts
     request_id = str(uuid.uuid4())
+    video_key = canonical_video_key(url, platform)
+    record = AnalysisRecord(job_id=request_id, video_key=video_key, url=url, platform=platform)
+    store = get_store(current_app.config["ANALYSIS_DB"])
     static_dir = current_app.config.get("STATIC_DIR", "static")
     os.makedirs(static_dir, exist_ok=True)
+    leader = False  # only the job's leader stores its record
 
     try:
         # Initialize transcription service with unique filename
@@ -141,36 +155,44 @@ def analyze_video():
             youtube_url=url,  # yt-dlp supports multiple platforms, parameter name kept for compatibility
             filename=request_id,
             platform=platform,
+            autostart=False,
+            language=language,
+            record_segments=False,  # no endpoint reads an analysis's segments
         )
         
         # Generate embed URL based on platform
         embed_url = _generate_embed_url(url, platform)
 
-        # Wait for transcription (blocking with timeout) - KLUCZOWE
+        # Wait for the pipeline job (with timeout) - KLUCZOWE
+        # Identical concurrent submissions share one job; only its leader records it
         max_wait = 600  # 10 minutes
-        start_time = time.time()
-
-        while not transcription_service.is_transcription_done():
-            if time.time() - start_time > max_wait:
-                return jsonify({"error": "Transcription timeout"}), 504
-
-            # Check for failure indicators
-            if transcription_service.has_transcript_file():
-                text = transcription_service.get_transcript_text()
-                if text and text.startswith("["):
-                    return jsonify({"error": f"Transcription failed: {text}"}), 500
-
-            time.sleep(2)
+        flight, leader = pipeline.submit_analysis((video_key, language), transcription_service)
+        transcription_service = flight.context
+        if leader:
+            # However the job ends (result, error, cancellation), its files go with it
+            flight.future.add_done_callback(
+                lambda _, service=transcription_service: service.remove_files()
+            )
+        try:
+            # shield: one waiter timing out must not cancel the job for the others
+            transcription_text, sentiment_results = await asyncio.wait_for(
+                asyncio.shield(asyncio.wrap_future(flight.future)), max_wait
+            )
+        except asyncio.CancelledError:
+            pipeline.flights.leave(flight)
+            raise
+        except asyncio.TimeoutError:
+            # The last waiter to give up cancels the job
+            pipeline.flights.leave(flight)
+            if leader:
+                _record_failure(store, record, "Transcription timeout")
+            return jsonify({"error": "Transcription timeout"}), 504
 
-        # Get transcription
-        transcription_text = transcription_service.get_transcript_text()
-        if transcription_text is None:
-            return jsonify({"error": "Transcription completed but no text found"}), 500
+        if transcription_text.startswith("["):
+            if leader:
+                _record_failure(store, record, transcription_text)
+            return jsonify({"error": f"Transcription failed: {transcription_text}"}), 500
 
-        # Analyze sentiment
-        sentiment_service = SentimentAnalysisService()
-        sentiment_results = sentiment_service.analyze_all_features(transcription_text)
-        
         # Extract phone name from transcription
         phone_name = _extract_phone_name(transcription_text)
         
@@ -194,6 +216,16 @@ def analyze_video():
         else:
             general_score_value = "Brak Cech"
             general_score_trend = "neutral"
+
+        record.model = phone_name
+        record.language = transcription_service.language
+        record.transcript = transcription_text
+        record.results = sentiment_results
+        record.lexicon_version = next(
+            (result["lexicon_version"] for result in sentiment_results.values()), None
+        )
+        if leader:
+            store.record(record)
         
         # 1. Przekształcenie szczegółów sentymentu na format "stats"
         detailed_stats = [
@@ -224,38 +256,91 @@ def analyze_video():
             },
         ]
         
-        # Clean up temporary files
-        try:
-            for ext in ["mp3", "wav", "txt"]:
-                filepath = os.path.join(static_dir, f"{request_id}.ext")
-                if os.path.exists(filepath):
-                    os.remove(filepath)
-        except Exception as cleanup_error:
-            print(f"Warning: File cleanup failed: {cleanup_error}")
-
         # ZWRACANIE PEŁNEGO PAKIETU DANYCH
-        return (
-            jsonify(
-                {
-                    # To pole jest używane do wyświetlania fragmentów tekstu w ReviewTable
-                    "sentiment": sentiment_results, 
-                    "fullTranscription": transcription_text, # <--- DODANE
-                    "embedUrl": embed_url,  # Embed URL for the video player
-                    "platform": platform,  # Platform name (youtube, vimeo, tiktok)
-                    "phoneName": phone_name,  # Extracted phone model name
-                    "analysisData": {
-                        "title": f"Video Analysis - {phone_name} ({request_id[:8]})",
-                        "stats": initial_stats + detailed_stats, # <--- PEŁNE STATYSTYKI SENTYMENTU
-                    },
-                }
-            ),
-            200,
+        # fields= projection happens before encoding, so dropped data is never serialized
+        return json_response(
+            {
+                # To pole jest używane do wyświetlania fragmentów tekstu w ReviewTable
+                "sentiment": sentiment_results, 
+                "fullTranscription": transcription_text, # <--- DODANE
+                "embedUrl": embed_url,  # Embed URL for the video player
+                "platform": platform,  # Platform name (youtube, vimeo, tiktok)
+                "phoneName": phone_name,  # Extracted phone model name
+                "language": transcription_service.language,  # Spoken language (given or detected)
+                "analysisData": {
+                    "title": f"Video Analysis - {phone_name} ({request_id[:8]})",
+                    "stats": initial_stats + detailed_stats, # <--- PEŁNE STATYSTYKI SENTYMENTU
+                },
+            }
         )
 
+    except VideoRejected as e:
+        if leader:
+            _record_failure(store, record, str(e))
+        return jsonify({"error": str(e)}), 413
     except KeyError as e:
+        if leader:
+            _record_failure(store, record, f"Missing configuration: {e}")
         return jsonify({"error": f"Missing configuration: {str(e)}"}), 500
     except Exception as e:
         import traceback
 
         traceback.print_exc()
-        return jsonify({"error": f"Analysis failed: {str(e)}"}), 500
\ No newline at end of file
+        if leader:
+            # PipelineError and anything else the job raised
+            _record_failure(store, record, f"{type(e).__name__}: {e}")
+        return jsonify({"error": f"Analysis failed: {str(e)}"}), 500
+
+
+@video_bp.route("/latest", methods=["GET"])
+def get_latest_analysis():
+    """
+    Most recent stored analysis of a video, so repeat lookups skip re-analysis.
+
+    Query: ?url=https://youtu.be/... (any URL form of the same video matches)
+    """
+    url = request.args.get("url", "").strip()
+    if not url:
+        return jsonify({"error": "Missing required parameter: url"}), 400
+
+    video_key = canonical_video_key(url, detect_platform(url))
+    analysis = get_store(current_app.config["ANALYSIS_DB"]).latest_for_video(video_key)
+    if analysis is None:
+        return jsonify({"error": f"No stored analysis for video: {video_key}"}), 404
+    return json_response(analysis)
+
+
+@video_bp.route("/sentiment", methods=["GET"])
+def query_feature_sentiment():
+    """
+    Stored per-video sentiment for one feature, served from the analysis store.
+
+    Query: ?feature=battery&model=Pixel 8&limit=100 (model and limit optional)
+    """
+    feature = request.args.get("feature", "").strip()
+    if not feature:
+        return jsonify({"error": "Missing required parameter: feature"}), 400
+
+    limit = request.args.get("limit", 100, type=int)
+    model = request.args.get("model") or None
+    results = get_store(current_app.config["ANALYSIS_DB"]).feature_sentiments(
+        feature, model, max(1, min(limit, 1000))
+    )
+    return json_response({"feature": feature, "model": model, "results": results})
+
+
+@video_bp.route("/rollups", methods=["GET"])
+def get_model_rollup():
+    """
+    Aggregate sentiment for a phone model across all analyzed videos.
+
+    Query: ?model=Pixel 8 - served from rollups maintained as analyses finish.
+    """
+    model = request.args.get("model", "").strip()
+    if not model:
+        return jsonify({"error": "Missing required parameter: model"}), 400
+
+    rollup = get_store(current_app.config["ANALYSIS_DB"]).model_rollup(model)
+    if rollup is None:
+        return jsonify({"error": f"No analyses for model: {model}"}), 404
+    return json_response(rollup)
@@ -0,0 +1,618 @@
+"""
+Analysis Store
+Persists analysis jobs, transcripts and per-feature sentiment in SQLite
+"""
+
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from queue import Empty, Queue
+from threading import Lock, Thread, local
+from typing import Dict, Iterator, List, Optional
+
+BATCH_SIZE = 256  # records written per transaction at most
+
+# Brand words dropped from model keys, so "Pixel 8" finds "Google Pixel 8"
+BRAND_PREFIXES = {"apple", "google", "samsung"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    video_key TEXT NOT NULL,
+    url TEXT NOT NULL,
+    platform TEXT,
+    model TEXT,
+    model_key TEXT,
+    language TEXT,
+    lexicon_version TEXT,
+    status TEXT NOT NULL,
+    error TEXT,
+    created_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_video_key ON jobs (video_key, finished_at);
+CREATE INDEX IF NOT EXISTS jobs_model_key ON jobs (model_key);
+
+CREATE TABLE IF NOT EXISTS transcripts (
+    job_id TEXT PRIMARY KEY REFERENCES jobs (id),
+    text TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS feature_sentiments (
+    job_id TEXT NOT NULL REFERENCES jobs (id),
+    feature TEXT NOT NULL,
+    model_key TEXT,
+    sentiment TEXT NOT NULL,
+    score REAL NOT NULL,
+    confidence REAL NOT NULL,
+    relevant_text TEXT NOT NULL,
+    PRIMARY KEY (job_id, feature)
+);
+CREATE INDEX IF NOT EXISTS feature_sentiments_feature_model
+    ON feature_sentiments (feature, model_key);
+
+CREATE TABLE IF NOT EXISTS model_rollups (
+    model_key TEXT PRIMARY KEY,
+    model TEXT NOT NULL,
+    video_count INTEGER NOT NULL,
+    positive_count INTEGER NOT NULL,
+    negative_count INTEGER NOT NULL,
+    neutral_count INTEGER NOT NULL,
+    updated_at REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS model_feature_rollups (
+    model_key TEXT NOT NULL,
+    feature TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    positive_count INTEGER NOT NULL,
+    negative_count INTEGER NOT NULL,
+    neutral_count INTEGER NOT NULL,
+    score_sum REAL NOT NULL,
+    confidence_sum REAL NOT NULL,
+    weighted_score_sum REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (model_key, feature)
+);
+
+-- The one analysis of each video that the rollups currently count
+CREATE TABLE IF NOT EXISTS video_rollups (
+    video_key TEXT PRIMARY KEY,
+    job_id TEXT NOT NULL REFERENCES jobs (id)
+);
+CREATE INDEX IF NOT EXISTS video_rollups_job ON video_rollups (job_id);
+"""
+
+
+def model_key(model: Optional[str]) -> Optional[str]:
+    """Normalized model name used for lookups ("Google Pixel 8" -> "pixel 8")."""
+    if not model or model == "Unknown Phone":
+        return None
+    words = model.lower().split()
+    if len(words) > 1 and words[0] in BRAND_PREFIXES:
+        words = words[1:]
+    return " ".join(words)
+
+
+@dataclass(slots=True)
+class AnalysisRecord:
+    """One finished (or failed) analysis job."""
+
+    job_id: str
+    video_key: str
+    url: str
+    platform: Optional[str] = None
+    model: Optional[str] = None
+    language: Optional[str] = None
+    lexicon_version: Optional[str] = None
+    status: str = "done"
+    error: Optional[str] = None
+    transcript: Optional[str] = None
+    results: Dict[str, Dict] = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    finished_at: Optional[float] = None
+
+
+@dataclass(slots=True)
+class Rescored:
+    """New feature results for an already stored job (e.g. after a lexicon change)."""
+
+    job_id: str
+    results: Dict[str, Dict]
+    lexicon_version: Optional[str] = None
+
+
+def flatten_results(results: Dict[str, Dict], prefix: str = "") -> Dict[str, Dict]:
+    """Feature results with nested "subfeatures" lifted to "parent.child" keys, as stored."""
+    flat = {}
+    for feature, result in results.items():
+        name = prefix + feature
+        flat[name] = result
+        flat.update(flatten_results(result.get("subfeatures", {}), name + "."))
+    return flat
+
+
+def nest_results(flat: Dict[str, Dict]) -> Dict[str, Dict]:
+    """Inverse of flatten_results: "parent.child" keys nested under "subfeatures"."""
+    results = {}
+    for name in sorted(flat, key=lambda name: name.count(".")):
+        *parents, feature = name.split(".")
+        level = results
+        for parent in parents:
+            level = level.setdefault(parent, {}).setdefault("subfeatures", {})
+        level.setdefault(feature, {}).update(flat[name])
+    return results
+
+
+def overall_sentiment(results: Dict[str, Dict]) -> Optional[str]:
+    """Video verdict: the majority of positive vs negative features (None without features).
+
+    Only top-level features vote; flattened sub-features ("parent.child") are skipped.
+    """
+    results = {feature: result for feature, result in results.items() if "." not in feature}
+    if not results:
+        return None
+    positive = sum(1 for result in results.values() if result.get("sentiment") == "positive")
+    negative = sum(1 for result in results.values() if result.get("sentiment") == "negative")
+    if positive > negative:
+        return "positive"
+    if negative > positive:
+        return "negative"
+    return "neutral"
+
+
+class AnalysisStore:
+    """SQLite-backed store with a single batching writer thread.
+
+    Writers only enqueue records; the writer thread drains whatever is queued
+    and commits it as one transaction. Readers use their own per-thread
+    connections, which WAL mode lets run alongside the writer.
+
+    Per-model rollups are updated in the same transaction as the records they
+    summarize, so aggregate reads are single-row lookups. Each video counts
+    once: its latest analysis replaces the contribution of the previous one.
+    Sub-features are stored and rolled up as "parent.child" features.
+    """
+
+    def __init__(self, path: str, batch_size: int = BATCH_SIZE):
+        self.path = path
+        self.batch_size = batch_size
+        self._queue = Queue()
+        self._readers = local()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.executescript(SCHEMA)
+
+        Thread(target=self._write_loop, name="analysis-store-writer", daemon=True).start()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        return connection
+
+    def _reader(self) -> sqlite3.Connection:
+        connection = getattr(self._readers, "connection", None)
+        if connection is None:
+            connection = self._readers.connection = self._connect()
+        return connection
+
+    # -- writes -------------------------------------------------------------
+
+    def record(self, record: AnalysisRecord):
+        """Queue a record for the next batch; returns immediately."""
+        if record.finished_at is None:
+            record.finished_at = time.time()
+        self._queue.put(record)
+
+    def flush(self):
+        """Block until every queued record is committed."""
+        self._queue.join()
+
+    def _write_loop(self):
+        connection = self._connect()
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+            try:
+                with connection:
+                    self._write_batch(connection, batch)
+            except sqlite3.Error as e:
+                print(f"ERROR writing {len(batch)} analysis records: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, connection: sqlite3.Connection, batch: List[AnalysisRecord]):
+        # Take the write lock before reading: rescore() writes from another
+        # connection, and sqlite3 would otherwise only BEGIN at the first INSERT
+        connection.execute("BEGIN IMMEDIATE")
+        # Only jobs seen for the first time contribute to rollups
+        placeholders = ", ".join("?" * len(batch))
+        known = {
+            row[0]
+            for row in connection.execute(
+                f"SELECT id FROM jobs WHERE id IN ({placeholders})", [r.job_id for r in batch]
+            )
+        }
+        latest = {r.job_id: r for r in batch}
+        fresh = [
+            r for r in latest.values()
+            if r.job_id not in known and r.status == "done" and model_key(r.model)
+        ]
+        # Read before this batch rewrites any rows they come from
+        counted = self._counted_analyses(connection, {r.video_key for r in fresh})
+
+        connection.executemany(
+            "INSERT OR REPLACE INTO jobs (id, video_key, url, platform, model, model_key,"
+            " language, lexicon_version, status, error, created_at, finished_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    r.job_id, r.video_key, r.url, r.platform, r.model, model_key(r.model),
+                    r.language, r.lexicon_version, r.status, r.error, r.created_at, r.finished_at,
+                )
+                for r in batch
+            ],
+        )
+        connection.executemany(
+            "INSERT OR REPLACE INTO transcripts (job_id, text) VALUES (?, ?)",
+            [(r.job_id, r.transcript) for r in batch if r.transcript is not None],
+        )
+        # A rewritten job's feature rows are replaced as a whole, so dropped features go too
+        connection.executemany(
+            "DELETE FROM feature_sentiments WHERE job_id = ?",
+            [(job_id,) for job_id in latest if job_id in known],
+        )
+        connection.executemany(
+            "INSERT INTO feature_sentiments (job_id, feature, model_key,"
+            " sentiment, score, confidence, relevant_text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [
+                (
+                    r.job_id, feature, model_key(r.model), result["sentiment"],
+                    result.get("score", 0.0), result["confidence"],
+                    json.dumps(result.get("relevant_text", []), ensure_ascii=False),
+                )
+                for r in latest.values()
+                for feature, result in flatten_results(r.results).items()
+            ],
+        )
+        self._update_rollups(connection, fresh, counted)
+
+    def _counted_analyses(self, connection: sqlite3.Connection, video_keys) -> Dict[str, Dict]:
+        """Video key -> the analysis the rollups count for it (model, model_key, results)."""
+        if not video_keys:
+            return {}
+        placeholders = ", ".join("?" * len(video_keys))
+        counted = {
+            row["video_key"]: {
+                "job_id": row["id"], "model": row["model"], "model_key": row["model_key"],
+            }
+            for row in connection.execute(
+                "SELECT v.video_key, j.id, j.model, j.model_key FROM video_rollups v"
+                f" JOIN jobs j ON j.id = v.job_id WHERE v.video_key IN ({placeholders})",
+                list(video_keys),
+            )
+        }
+        for analysis in counted.values():
+            analysis["results"] = self._stored_results(connection, analysis["job_id"])
+        return counted
+
+    def _stored_results(self, connection: sqlite3.Connection, job_id: str) -> Dict[str, Dict]:
+        """Stored feature results of a job (the fields rollups are built from)."""
+        return {
+            row["feature"]: {
+                "sentiment": row["sentiment"],
+                "score": row["score"],
+                "confidence": row["confidence"],
+            }
+            for row in connection.execute(
+                "SELECT feature, sentiment, score, confidence FROM feature_sentiments"
+                " WHERE job_id = ?",
+                (job_id,),
+            )
+        }
+
+    def _update_rollups(
+        self,
+        connection: sqlite3.Connection,
+        records: List[AnalysisRecord],
+        counted: Dict[str, Dict],
+    ):
+        """Fold finished analyses into the rollups, replacing earlier analyses of the same video."""
+        for r in records:
+            key = model_key(r.model)
+            results = flatten_results(r.results)
+            previous = counted.get(r.video_key)
+            if previous is not None and previous["model_key"] == key:
+                self._shift_rollups(connection, key, r.model, previous["results"], results)
+            else:
+                if previous is not None:
+                    self._shift_rollups(
+                        connection, previous["model_key"], previous["model"],
+                        previous["results"], {}, videos=-1,
+                    )
+                self._shift_rollups(connection, key, r.model, {}, results, videos=1)
+            counted[r.video_key] = {
+                "job_id": r.job_id, "model": r.model, "model_key": key, "results": results,
+            }
+
+        connection.executemany(
+            "INSERT OR REPLACE INTO video_rollups (video_key, job_id) VALUES (?, ?)",
+            [(r.video_key, r.job_id) for r in records],
+        )
+
+    def rescore(self, updates: List[Rescored]) -> int:
+        """Replace the results of stored jobs in one transaction; returns jobs updated.
+
+        Runs on the caller's thread (bulk tools), not the writer queue. Rollups
+        are moved by the difference between old and new results, so rescoring
+        the same job twice changes nothing the second time; superseded analyses
+        of a video are not counted and leave them alone. Unknown jobs are
+        skipped.
+        """
+        connection = self._rescore_connection()
+        updated = 0
+        with connection:
+            # Old results must be read under the write lock, as in _write_batch
+            connection.execute("BEGIN IMMEDIATE")
+            for update in updates:
+                job = connection.execute(
+                    "SELECT j.model, j.model_key, v.job_id IS NOT NULL AS counted FROM jobs j"
+                    " LEFT JOIN video_rollups v ON v.job_id = j.id WHERE j.id = ?",
+                    (update.job_id,),
+                ).fetchone()
+                if job is None:
+                    continue
+                old = self._stored_results(connection, update.job_id)
+                new = flatten_results(update.results)
+                connection.execute("DELETE FROM feature_sentiments WHERE job_id = ?", (update.job_id,))
+                connection.executemany(
+                    "INSERT INTO feature_sentiments (job_id, feature, model_key, sentiment,"
+                    " score, confidence, relevant_text) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        (
+                            update.job_id, feature, job["model_key"], result["sentiment"],
+                            result.get("score", 0.0), result["confidence"],
+                            json.dumps(result.get("relevant_text", []), ensure_ascii=False),
+                        )
+                        for feature, result in new.items()
+                    ],
+                )
+                connection.execute(
+                    "UPDATE jobs SET lexicon_version = ? WHERE id = ?",
+                    (update.lexicon_version, update.job_id),
+                )
+                if job["counted"]:
+                    self._shift_rollups(connection, job["model_key"], job["model"], old, new)
+                updated += 1
+        return updated
+
+    def _rescore_connection(self) -> sqlite3.Connection:
+        # The calling thread's own write connection, apart from its reader
+        connection = getattr(self._readers, "rescore_connection", None)
+        if connection is None:
+            connection = self._readers.rescore_connection = self._connect()
+        return connection
+
+    def _shift_rollups(
+        self,
+        connection: sqlite3.Connection,
+        key: str,
+        model: str,
+        old: Dict[str, Dict],
+        new: Dict[str, Dict],
+        videos: int = 0,
+    ):
+        """Move a model's rollups from one set of feature results to another.
+
+        `videos` adjusts the model's video count: 1 when `new` is a video
+        counted for the first time, -1 when `old` stops being counted.
+        """
+        now = time.time()
+        verdicts = ("positive", "negative", "neutral")
+        old_overall, new_overall = overall_sentiment(old), overall_sentiment(new)
+        deltas = [int(v == new_overall) - int(v == old_overall) for v in verdicts]
+        connection.execute(
+            "INSERT INTO model_rollups (model_key, model, video_count, positive_count,"
+            " negative_count, neutral_count, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (model_key) DO UPDATE SET"
+            " video_count = video_count + excluded.video_count,"
+            " positive_count = positive_count + excluded.positive_count,"
+            " negative_count = negative_count + excluded.negative_count,"
+            " neutral_count = neutral_count + excluded.neutral_count,"
+            " updated_at = excluded.updated_at",
+            (key, model, videos, *deltas, now),
+        )
+
+        rows = []
+        for feature in dict.fromkeys([*old, *new]):
+            delta = [0, 0, 0, 0, 0.0, 0.0, 0.0]
+            for sign, result in ((-1, old.get(feature)), (1, new.get(feature))):
+                if result is None:
+                    continue
+                score, confidence = result.get("score", 0.0), result["confidence"]
+                delta[0] += sign
+                delta[1 + verdicts.index(result["sentiment"])] += sign
+                delta[4] += sign * score
+                delta[5] += sign * confidence
+                delta[6] += sign * score * confidence
+            rows.append((key, feature, *delta, now))
+        connection.executemany(
+            "INSERT INTO model_feature_rollups (model_key, feature, count, positive_count,"
+            " negative_count, neutral_count, score_sum, confidence_sum, weighted_score_sum,"
+            " updated_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (model_key, feature) DO UPDATE SET"
+            " count = count + excluded.count,"
+            " positive_count = positive_count + excluded.positive_count,"
+            " negative_count = negative_count + excluded.negative_count,"
+            " neutral_count = neutral_count + excluded.neutral_count,"
+            " score_sum = score_sum + excluded.score_sum,"
+            " confidence_sum = confidence_sum + excluded.confidence_sum,"
+            " weighted_score_sum = weighted_score_sum + excluded.weighted_score_sum,"
+            " updated_at = excluded.updated_at",
+            rows,
+        )
+        connection.execute(
+            "DELETE FROM model_feature_rollups WHERE model_key = ? AND count <= 0", (key,)
+        )
+        connection.execute(
+            "DELETE FROM model_rollups WHERE model_key = ? AND video_count <= 0", (key,)
+        )
+
+    # -- reads --------------------------------------------------------------
+
+    def transcripts(self, after: str = "", page_size: int = BATCH_SIZE) -> Iterator[Dict]:
+        """Stream stored transcripts (job_id, language, lexicon_version, text) in job id order.
+
+        Pages are fetched by key, so no read transaction stays open between pages
+        and `after` resumes from a job id.
+        """
+        reader = self._reader()
+        while True:
+            rows = reader.execute(
+                "SELECT t.job_id, j.language, j.lexicon_version, t.text FROM transcripts t"
+                " JOIN jobs j ON j.id = t.job_id WHERE t.job_id > ? ORDER BY t.job_id LIMIT ?",
+                (after, page_size),
+            ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield dict(row)
+            after = rows[-1]["job_id"]
+
+    def lexicon_versions(self) -> Dict[str, Optional[str]]:
+        """Job id -> lexicon version its stored results were scored with."""
+        return {
+            row[0]: row[1]
+            for row in self._reader().execute("SELECT id, lexicon_version FROM jobs")
+        }
+
+    def feature_sentiments(
+        self, feature: str, model: Optional[str] = None, limit: int = 100
+    ) -> List[Dict]:
+        """Per-video sentiment for one feature, newest first, optionally for one model."""
+        query = (
+            "SELECT j.id, j.video_key, j.url, j.model, j.finished_at, f.sentiment, f.score,"
+            " f.confidence, f.relevant_text FROM feature_sentiments f JOIN jobs j ON j.id = f.job_id"
+            " WHERE f.feature = ?"
+        )
+        params = [feature]
+        if model is not None:
+            query += " AND f.model_key = ?"
+            params.append(model_key(model))
+        query += " ORDER BY j.finished_at DESC LIMIT ?"
+        params.append(limit)
+
+        return [
+            {
+                "job_id": row["id"],
+                "video_key": row["video_key"],
+                "url": row["url"],
+                "model": row["model"],
+                "sentiment": row["sentiment"],
+                "score": row["score"],
+                "confidence": row["confidence"],
+                "relevant_text": json.loads(row["relevant_text"]),
+                "finished_at": row["finished_at"],
+            }
+            for row in self._reader().execute(query, params)
+        ]
+
+    def latest_for_video(self, video_key: str) -> Optional[Dict]:
+        """Most recent successful analysis of a video, with transcript and results."""
+        reader = self._reader()
+        job = reader.execute(
+            "SELECT * FROM jobs WHERE video_key = ? AND status = 'done'"
+            " ORDER BY finished_at DESC LIMIT 1",
+            (video_key,),
+        ).fetchone()
+        if job is None:
+            return None
+
+        transcript = reader.execute(
+            "SELECT text FROM transcripts WHERE job_id = ?", (job["id"],)
+        ).fetchone()
+        results = nest_results({
+            row["feature"]: {
+                "sentiment": row["sentiment"],
+                "score": row["score"],
+                "confidence": row["confidence"],
+                "relevant_text": json.loads(row["relevant_text"]),
+            }
+            for row in reader.execute(
+                "SELECT * FROM feature_sentiments WHERE job_id = ?", (job["id"],)
+            )
+        })
+        return {
+            "job_id": job["id"],
+            "video_key": job["video_key"],
+            "url": job["url"],
+            "platform": job["platform"],
+            "model": job["model"],
+            "language": job["language"],
+            "lexicon_version": job["lexicon_version"],
+            "finished_at": job["finished_at"],
+            "transcript": transcript["text"] if transcript else None,
+            "results": results,
+        }
+
+    def model_rollup(self, model: str) -> Optional[Dict]:
+        """Aggregate sentiment for a model, read from the maintained rollup rows."""
+        key = model_key(model)
+        reader = self._reader()
+        summary = reader.execute(
+            "SELECT * FROM model_rollups WHERE model_key = ?", (key,)
+        ).fetchone()
+        if summary is None:
+            return None
+
+        features = {}
+        for row in reader.execute(
+            "SELECT * FROM model_feature_rollups WHERE model_key = ? ORDER BY feature", (key,)
+        ):
+            count = row["count"]
+            confidence_sum = row["confidence_sum"]
+            features[row["feature"]] = {
+                "count": count,
+                "positive": row["positive_count"],
+                "negative": row["negative_count"],
+                "neutral": row["neutral_count"],
+                "mean_score": row["score_sum"] / count,
+                "mean_confidence": confidence_sum / count,
+                "weighted_score": row["weighted_score_sum"] / confidence_sum if confidence_sum else 0.0,
+            }
+
+        return {
+            "model": summary["model"],
+            "videos": {
+                "count": summary["video_count"],
+                "positive": summary["positive_count"],
+                "negative": summary["negative_count"],
+                "neutral": summary["neutral_count"],
+            },
+            "features": features,
+            "updated_at": summary["updated_at"],
+        }
+
+
+_stores: Dict[str, AnalysisStore] = {}
+_lock = Lock()
+
+
+def get_store(path: str) -> AnalysisStore:
+    """Shared store for a database path (one writer thread per file)."""
+    with _lock:
+        store = _stores.get(path)
+        if store is None:
+            store = _stores[path] = AnalysisStore(path)
+    return store
@@ -0,0 +1,115 @@
+"""
+Audio Conversion Service
+Converts downloaded audio to WAV 16kHz mono in a dedicated process pool
+"""
+
+import multiprocessing
+import os
+import signal
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from threading import Lock
+
+CONVERSION_TIMEOUT = 600  # 10 minutes per job
+
+
+class ConversionTimeout(Exception):
+    """Raised when a conversion job exceeds its time budget."""
+
+
+@dataclass
+class ConversionResult:
+    path: str
+    duration: float
+    channels: int
+    frame_rate: int
+    size: int
+
+
+def _on_alarm(signum, frame):
+    raise ConversionTimeout("conversion exceeded its time budget")
+
+
+def _convert_job(source, target, converter, ffprobe, timeout):
+    """Worker entry point: decode, downmix, resample and export in a pool process."""
+    from pydub import AudioSegment
+
+    AudioSegment.converter = converter
+    AudioSegment.ffprobe = ffprobe
+
+    # Enforce the job timeout inside the worker so the process stays reusable
+    use_alarm = hasattr(signal, "SIGALRM")
+    if use_alarm:
+        signal.signal(signal.SIGALRM, _on_alarm)
+        signal.alarm(max(1, int(timeout)))
+    try:
+        sound = AudioSegment.from_file(source, format="mp3")
+        sound = sound.set_channels(1).set_frame_rate(16000)
+        sound.export(target, format="wav")
+    except BaseException:
+        if os.path.exists(target):
+            os.remove(target)
+        raise
+    finally:
+        if use_alarm:
+            signal.alarm(0)
+
+    return ConversionResult(
+        path=target,
+        duration=len(sound) / 1000.0,
+        channels=sound.channels,
+        frame_rate=sound.frame_rate,
+        size=os.path.getsize(target),
+    )
+
+
+class ConversionPool:
+    """Process pool sized to the core count for GIL-heavy pydub conversions."""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = Lock()
+
+    def _ensure_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a threaded Flask process is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return self._executor
+
+    def submit(self, source, target, timeout=CONVERSION_TIMEOUT):
+        """Queue a conversion job; returns a Future resolving to ConversionResult."""
+        from services import transcription_service
+
+        audio_segment = transcription_service._load_pydub()
+        return self._ensure_executor().submit(
+            _convert_job,
+            source,
+            target,
+            audio_segment.converter,
+            audio_segment.ffprobe,
+            timeout,
+        )
+
+    def convert(self, source, target, timeout=CONVERSION_TIMEOUT):
+        """Convert synchronously, waiting at most `timeout` seconds for the job."""
+        future = self.submit(source, target, timeout)
+        try:
+            # small grace period on top of the worker-side alarm
+            return future.result(timeout=timeout + 5)
+        except TimeoutError:
+            future.cancel()
+            raise ConversionTimeout(f"conversion of {source} timed out after {timeout}s")
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+conversion_pool = ConversionPool()
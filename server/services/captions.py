@@ -0,0 +1,92 @@
+"""
+Captions
+Picks a platform caption track from yt-dlp metadata and flattens it into transcript text
+"""
+
+import html
+import json
+import re
+from typing import List, Optional, Tuple
+
+# Preferred caption formats, best first
+CAPTION_FORMATS = ("json3", "vtt")
+
+VTT_TAG = re.compile(r"<[^>]+>")
+VTT_HEADERS = ("WEBVTT", "Kind:", "Language:", "NOTE")
+WHITESPACE = re.compile(r"\s+")
+
+
+def _base_language(code: str) -> str:
+    return code.split("-")[0].lower()
+
+
+def _pick_format(formats: List[dict]) -> Optional[dict]:
+    for ext in CAPTION_FORMATS:
+        for track in formats:
+            if track.get("ext") == ext and track.get("url"):
+                return track
+    return None
+
+
+def select_caption_track(
+    info: dict, languages: List[str]
+) -> Optional[Tuple[str, dict]]:
+    """Best caption track for the first language available; returns (language, track).
+
+    Creator-uploaded subtitles win over automatic captions. Automatic tracks
+    are only used in the video's spoken language (or the "-orig" track):
+    YouTube also lists machine translations of them for every language.
+    """
+    spoken = _base_language(info.get("language") or "")
+    for language in languages:
+        for code, formats in (info.get("subtitles") or {}).items():
+            if _base_language(code) == language:
+                track = _pick_format(formats)
+                if track:
+                    return language, track
+
+        for code, formats in (info.get("automatic_captions") or {}).items():
+            original = code.endswith("-orig") or language == spoken
+            if _base_language(code) == language and original:
+                track = _pick_format(formats)
+                if track:
+                    return language, track
+    return None
+
+
+def _json3_cues(data: str) -> List[str]:
+    events = json.loads(data).get("events", [])
+    return [
+        "".join(segment.get("utf8", "") for segment in event.get("segs", []))
+        for event in events
+    ]
+
+
+def _vtt_cues(data: str) -> List[str]:
+    cues, previous = [], None
+    for line in data.splitlines():
+        line = line.strip()
+        if not line or "-->" in line or line.isdigit() or line.startswith(VTT_HEADERS):
+            continue
+        line = VTT_TAG.sub("", line)
+        # Rolling automatic captions repeat each line in the following cue
+        if line != previous:
+            cues.append(line)
+        previous = line
+    return cues
+
+
+def flatten_captions(data: str, ext: str) -> str:
+    """Caption file contents -> plain transcript text.
+
+    Automatic captions carry no punctuation, so each cue is closed as a
+    sentence to keep feature sentences short.
+    """
+    cues = _json3_cues(data) if ext == "json3" else _vtt_cues(data)
+    cues = [WHITESPACE.sub(" ", html.unescape(cue)).strip() for cue in cues]
+    cues = [cue for cue in cues if cue]
+    if not cues:
+        return ""
+    if not any(cue[-1] in ".!?" for cue in cues):
+        return ". ".join(cues) + "."
+    return " ".join(cues)
@@ -0,0 +1,78 @@
+"""
+Custom Features
+Validation and registration of caller-supplied feature dictionaries (name -> keywords)
+"""
+
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+from services.lru_cache import LRUCache
+
+MAX_FEATURES = 100
+MAX_KEYWORDS = 100
+MAX_KEYWORD_CHARS = 64
+MAX_REGISTERED_SETS = 256
+
+
+def validate_definition(data) -> Dict[str, List[str]]:
+    """Normalized feature definitions, or ValueError describing what is wrong."""
+    if not isinstance(data, dict) or not data:
+        raise ValueError("Custom features must be a non-empty object of name -> keyword list")
+    if len(data) > MAX_FEATURES:
+        raise ValueError(f"At most {MAX_FEATURES} custom features are allowed")
+
+    definition = {}
+    for name, keywords in data.items():
+        name = name.strip() if isinstance(name, str) else ""
+        if not name:
+            raise ValueError("Custom feature names must be non-empty strings")
+        if not isinstance(keywords, list) or not keywords or len(keywords) > MAX_KEYWORDS:
+            raise ValueError(f"Feature {name!r} needs a list of 1-{MAX_KEYWORDS} keywords")
+        cleaned = []
+        for keyword in keywords:
+            if not isinstance(keyword, str) or not keyword.strip():
+                raise ValueError(f"Feature {name!r} has an empty or non-string keyword")
+            keyword = keyword.strip().lower()
+            if len(keyword) > MAX_KEYWORD_CHARS:
+                raise ValueError(f"Keywords are limited to {MAX_KEYWORD_CHARS} characters")
+            if keyword not in cleaned:
+                cleaned.append(keyword)
+        definition[name] = cleaned
+    return definition
+
+
+def definition_id(definition: Dict[str, List[str]]) -> str:
+    """Stable id of a definition: identical dictionaries get the same id."""
+    canonical = json.dumps(definition, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+class CustomFeatureSets:
+    """Registered definitions by id; the least recently used are forgotten past capacity."""
+
+    def __init__(self, max_sets: int = MAX_REGISTERED_SETS):
+        self._sets: LRUCache[Dict[str, List[str]]] = LRUCache(max_sets)
+
+    def register(self, data) -> str:
+        definition = validate_definition(data)
+        set_id = definition_id(definition)
+        self._sets.put(set_id, definition)
+        return set_id
+
+    def get(self, set_id: str) -> Optional[Dict[str, List[str]]]:
+        return self._sets.get(set_id)
+
+    def resolve(self, value) -> Optional[Dict[str, List[str]]]:
+        """Inline definitions or a registered set id from a request -> definitions."""
+        if value is None:
+            return None
+        if isinstance(value, str):
+            definition = self.get(value)
+            if definition is None:
+                raise ValueError(f"Unknown custom feature set: {value} (register it again)")
+            return definition
+        return validate_definition(value)
+
+
+custom_feature_sets = CustomFeatureSets()
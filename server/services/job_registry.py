@@ -0,0 +1,113 @@
+"""
+Job Registry
+Process-wide map of job ids to transcription services, bounded with LRU eviction of finished jobs
+"""
+
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Callable, Optional
+
+MAX_JOBS = int(os.getenv("MAX_TRACKED_JOBS", "64"))
+DEFAULT_JOB = "default"
+
+FINISHED_STATES = ("done", "failed")
+
+
+class JobRegistryFull(Exception):
+    """Raised when a new job would exceed capacity and no finished job can be evicted."""
+
+
+@dataclass(slots=True)
+class Job:
+    job_id: str
+    service: object  # TranscriptionService (anything with .state and .start())
+    created: float = field(default_factory=time.time)
+    last_access: float = field(default_factory=time.time)
+
+    @property
+    def state(self) -> str:
+        return self.service.state
+
+    @property
+    def finished(self) -> bool:
+        return self.state in FINISHED_STATES
+
+
+class JobRegistry:
+    """Job id -> Job, most recently used last.
+
+    Lookups and inserts are O(1) dict operations under one lock. Reads never
+    start work: a job runs only after an explicit start(). When the registry
+    is full, the least recently used finished jobs are evicted; running or
+    not-yet-started jobs are never dropped, so a registry full of them
+    refuses new jobs instead of growing. `on_evict` is called with each
+    evicted job, e.g. to delete its files.
+    """
+
+    def __init__(self, max_jobs: int = MAX_JOBS, on_evict: Optional[Callable[[Job], None]] = None):
+        self.max_jobs = max_jobs
+        self.on_evict = on_evict
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def __contains__(self, job_id):
+        return job_id in self._jobs
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """The job, marked as recently used; None when unknown (or evicted)."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._jobs.move_to_end(job_id)
+                job.last_access = time.time()
+            return job
+
+    def get_or_create(self, job_id: str, factory: Callable[[], object]) -> Job:
+        """The existing job, or a new (not started) one wrapping factory()."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._jobs.move_to_end(job_id)
+                job.last_access = time.time()
+                return job
+            self._make_room()
+            job = Job(job_id, factory())
+            self._jobs[job_id] = job
+            return job
+
+    def start(self, job_id: str) -> Optional[Job]:
+        """Explicitly start a registered job (idempotent)."""
+        job = self.get(job_id)
+        if job is not None:
+            job.service.start()
+        return job
+
+    def discard(self, job_id: str):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+    def _make_room(self):
+        """Evict least recently used finished jobs until one more fits."""
+        if len(self._jobs) < self.max_jobs:
+            return
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished]:
+            job = self._jobs.pop(job_id)
+            if self.on_evict is not None:
+                self.on_evict(job)
+            if len(self._jobs) < self.max_jobs:
+                return
+        raise JobRegistryFull(f"All {len(self._jobs)} tracked jobs are still active")
+
+
+def _remove_job_files(job: Job):
+    job.service.remove_files()
+
+
+# Shared by every route in the process
+job_registry = JobRegistry(on_evict=_remove_job_files)
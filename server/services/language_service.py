@@ -0,0 +1,100 @@
+"""
+Language Service
+Fast character n-gram language identification for transcripts and recognized segments
+"""
+
+import math
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from threading import Lock
+from typing import Dict, Optional
+
+SAMPLES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lexicons", "samples"
+)
+
+# Azure Speech locale for each supported language
+RECOGNITION_LOCALES = {"en": "en-US", "pl": "pl-PL"}
+
+NGRAM_SIZE = 3
+SAMPLE_CHARS = 2000  # only the head of a text is classified
+MIN_NGRAMS = 12  # below this the evidence is too thin to decide
+MIN_CONFIDENCE = 0.9
+
+NON_LETTERS = re.compile(r"[^\w']+|[\d_]+")
+
+
+@dataclass(slots=True)
+class DetectedLanguage:
+    language: Optional[str]  # None when undecided
+    confidence: float
+
+
+def _ngrams(text: str) -> Counter:
+    """Character trigrams of space-padded, lowercased words."""
+    normalized = f" {NON_LETTERS.sub(' ', text.lower()).strip()} "
+    return Counter(
+        normalized[i:i + NGRAM_SIZE] for i in range(len(normalized) - NGRAM_SIZE + 1)
+    )
+
+
+class LanguageDetector:
+    """Naive Bayes classifier over character trigram profiles (one per language)."""
+
+    def __init__(self, samples: Dict[str, str]):
+        self.profiles = {}
+        self.unseen = {}
+        vocabulary = set()
+        counts = {language: _ngrams(text) for language, text in samples.items()}
+        for language_counts in counts.values():
+            vocabulary.update(language_counts)
+        for language, language_counts in counts.items():
+            # Add-one smoothing over the joint trigram vocabulary
+            total = sum(language_counts.values()) + len(vocabulary) + 1
+            self.profiles[language] = {
+                gram: math.log((count + 1) / total) for gram, count in language_counts.items()
+            }
+            self.unseen[language] = math.log(1 / total)
+
+    def detect(self, text: str) -> DetectedLanguage:
+        """Classify the head of `text`; language is None when not confident."""
+        grams = _ngrams(text[:SAMPLE_CHARS])
+        if sum(grams.values()) < MIN_NGRAMS:
+            return DetectedLanguage(None, 0.0)
+
+        scores = {}
+        for language, profile in self.profiles.items():
+            unseen = self.unseen[language]
+            scores[language] = sum(
+                count * profile.get(gram, unseen) for gram, count in grams.items()
+            )
+
+        best = max(scores, key=scores.get)
+        # Posterior of the best language (softmax over log-likelihoods)
+        confidence = 1.0 / sum(math.exp(score - scores[best]) for score in scores.values())
+        if confidence < MIN_CONFIDENCE:
+            return DetectedLanguage(None, confidence)
+        return DetectedLanguage(best, confidence)
+
+
+_detector: Optional[LanguageDetector] = None
+_lock = Lock()
+
+
+def get_detector() -> LanguageDetector:
+    """Detector built from lexicons/samples/<language>.txt on first use."""
+    global _detector
+    with _lock:
+        if _detector is None:
+            samples = {}
+            for language in RECOGNITION_LOCALES:
+                with open(os.path.join(SAMPLES_DIR, f"{language}.txt"), encoding="utf-8") as f:
+                    samples[language] = f.read()
+            _detector = LanguageDetector(samples)
+    return _detector
+
+
+def detect_language(text: str) -> DetectedLanguage:
+    return get_detector().detect(text)
@@ -0,0 +1,561 @@
+"""
+Lexicon
+Versioned, per-language sentiment/feature lexicons: JSON sources compiled to a
+memory-mapped binary snapshot that is searched in place, with single-pass
+n-gram phrase lookup, a feature taxonomy and atomic hot reload
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+from services.taxonomy import FeatureMatcher, FeatureTaxonomy, compiled_matcher
+
+# Words are letter/digit runs with optional inner apostrophes ("don't");
+# hyphens and other punctuation split tokens, so "top-notch," -> top, notch.
+TOKEN = re.compile(r"[^\W_]+(?:'[^\W_]+)*")
+MAX_PHRASE_TOKENS = 4
+MIXED = "mixed"  # shard used when the language is unknown
+
+DEFAULT_LEXICON_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "lexicons", "default.json"
+)
+
+# Snapshot layout (little-endian): header, JSON meta, then 8-byte aligned
+# sections described in meta["sections"] as [offset, length_in_bytes].
+SNAPSHOT_MAGIC = b"RLEX"
+SNAPSHOT_FORMAT = 2
+SNAPSHOT_HEADER = struct.Struct("<4sII")  # magic, format, meta length
+MAX_PHRASE_KEY = 2**63 - 1  # packed n-gram keys are stored as int64
+
+# Tokens already looked up in a mapped vocabulary (the working set, not the table)
+TOKEN_CACHE_SIZE = 50_000
+
+
+def tokenize(text: str, start: int = 0, end: Optional[int] = None) -> Iterator[str]:
+    """Yield normalized (lowercased) tokens of text[start:end]."""
+    for match in TOKEN.finditer(text, start, len(text) if end is None else end):
+        yield match.group().lower()
+
+
+def _compile_phrases(
+    weights: Iterable[Tuple[str, float]], max_tokens: int
+) -> Tuple[List[str], List[Tuple[List[int], float]]]:
+    """Tokenize phrases into (sorted vocabulary, [(token ids, weight)]); first definition wins."""
+    tokenized = []
+    seen = set()
+    for phrase, weight in weights:
+        tokens = tuple(tokenize(phrase))
+        if not tokens or len(tokens) > max_tokens:
+            raise ValueError(f"Phrase must have 1-{max_tokens} tokens: {phrase!r}")
+        if tokens not in seen:
+            seen.add(tokens)
+            tokenized.append((tokens, weight))
+
+    vocabulary = sorted({token for tokens, _ in tokenized for token in tokens})
+    ids = {token: index + 1 for index, token in enumerate(vocabulary)}
+    return vocabulary, [([ids[token] for token in tokens], weight) for tokens, weight in tokenized]
+
+
+def _pack_phrases(
+    entries: Iterable[Tuple[Sequence[int], float]], base: int
+) -> Iterator[Tuple[int, int, float]]:
+    """Yield (packed n-gram key, token count, weight) for each phrase."""
+    for token_ids, weight in entries:
+        key = 0
+        for token_id in token_ids:
+            key = key * base + token_id
+        yield key, len(token_ids), weight
+
+
+class MappedVocabulary:
+    """Token -> id read in place from a snapshot's sorted string table.
+
+    Ids are positions in the table plus one; lookups binary-search the UTF-8
+    strings (byte order equals code point order, the order they were sorted
+    in). Results are memoized per token, so only the tokens a process actually
+    meets are ever turned into Python objects.
+    """
+
+    __slots__ = ("_offsets", "_blob", "_cache")
+
+    def __init__(self, offsets: memoryview, blob: memoryview):
+        self._offsets = offsets  # uint32, one more than the token count
+        self._blob = blob
+        self._cache: Dict[str, int] = {}
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, index: int) -> bytes:
+        return bytes(self._blob[self._offsets[index]:self._offsets[index + 1]])
+
+    def get(self, token: str, default: int = 0) -> int:
+        token_id = self._cache.get(token)
+        if token_id is None:
+            encoded = token.encode("utf-8")
+            index = bisect_left(self, encoded)
+            token_id = index + 1 if index < len(self) and self[index] == encoded else 0
+            if len(self._cache) >= TOKEN_CACHE_SIZE:
+                self._cache.clear()
+            self._cache[token] = token_id
+        return token_id or default
+
+    def __reduce__(self):
+        # Pickled by value only when the snapshot file itself cannot be reopened
+        return _mapped_vocabulary, (bytes(self._offsets), bytes(self._blob))
+
+
+class MappedPhrases:
+    """Packed n-gram key -> (token count, weight) read in place from sorted snapshot arrays."""
+
+    __slots__ = ("_keys", "_lengths", "_weights")
+
+    def __init__(self, keys: memoryview, lengths: memoryview, weights: memoryview):
+        self._keys = keys  # int64, ascending
+        self._lengths = lengths  # uint8
+        self._weights = weights  # float64
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get(self, key: int) -> Optional[Tuple[int, float]]:
+        keys = self._keys
+        index = bisect_left(keys, key)
+        if index < len(keys) and keys[index] == key:
+            return self._lengths[index], self._weights[index]
+        return None
+
+    def __reduce__(self):
+        return _mapped_phrases, (bytes(self._keys), bytes(self._lengths), bytes(self._weights))
+
+
+def _mapped_vocabulary(offsets: bytes, blob: bytes) -> MappedVocabulary:
+    return MappedVocabulary(memoryview(offsets).cast("I"), memoryview(blob))
+
+
+def _mapped_phrases(keys: bytes, lengths: bytes, weights: bytes) -> MappedPhrases:
+    return MappedPhrases(
+        memoryview(keys).cast("q"), memoryview(lengths).cast("B"), memoryview(weights).cast("d")
+    )
+
+
+class PhraseLexicon:
+    """Weighted phrases of up to `max_tokens` tokens with O(max_tokens) lookup per token.
+
+    Every token that occurs in some phrase gets an id in [1, base). The n-gram
+    ending at each position is packed into one integer key, rolled forward as
+    key * base + id, so matching never slices or joins strings and the cost
+    per token does not depend on how many phrases the lexicon holds.
+    """
+
+    __slots__ = ("vocabulary", "base", "max_tokens", "phrases", "negations")
+
+    def __init__(
+        self,
+        vocabulary,
+        phrases,
+        negations: Iterable[str] = (),
+        max_tokens: int = MAX_PHRASE_TOKENS,
+    ):
+        """`vocabulary` maps token -> id and `phrases` packed key -> (length, weight).
+
+        Both only need len() and get(): dicts for lexicons compiled in memory,
+        MappedVocabulary/MappedPhrases for snapshots.
+        """
+        self.vocabulary = vocabulary
+        self.base = len(vocabulary) + 1
+        self.max_tokens = max_tokens
+        self.negations = frozenset(negations)
+        self.phrases = phrases
+
+    @classmethod
+    def compile(
+        cls,
+        weights: Iterable[Tuple[str, float]],
+        negations: Iterable[str] = (),
+        max_tokens: int = MAX_PHRASE_TOKENS,
+    ) -> "PhraseLexicon":
+        """Build an in-memory lexicon from (phrase, weight) pairs."""
+        vocabulary, entries = _compile_phrases(weights, max_tokens)
+        ids = {token: index + 1 for index, token in enumerate(vocabulary)}
+        phrases = {
+            key: (length, weight)
+            for key, length, weight in _pack_phrases(entries, len(ids) + 1)
+        }
+        return cls(ids, phrases, negations, max_tokens)
+
+    def score(self, text: str, start: int = 0, end: Optional[int] = None) -> float:
+        """Average weight of the phrases found in text[start:end].
+
+        The longest phrase ending at each token wins; a longer phrase that
+        overlaps the previous match replaces it. A phrase directly preceded by
+        a negation word has its weight flipped.
+        """
+        vocabulary = self.vocabulary
+        phrases = self.phrases
+        negations = self.negations
+        base = self.base
+        max_tokens = self.max_tokens
+        ring = max_tokens + 1
+
+        keys = [0] * max_tokens  # keys[n]: packed (n + 1)-gram ending here
+        negated = [False] * ring  # negation flags of the last `ring` tokens
+        score = 0.0
+        count = 0
+        last_end = -1
+        last_length = 0
+        last_contribution = 0.0
+
+        for position, token in enumerate(tokenize(text, start, end)):
+            negated[position % ring] = token in negations
+            token_id = vocabulary.get(token, 0)
+            if not token_id:
+                if keys[0]:
+                    for n in range(max_tokens):
+                        keys[n] = 0
+                continue
+
+            for n in range(max_tokens - 1, 0, -1):
+                previous = keys[n - 1]
+                keys[n] = previous * base + token_id if previous else 0
+            keys[0] = token_id
+
+            for n in range(max_tokens - 1, -1, -1):
+                entry = phrases.get(keys[n]) if keys[n] else None
+                if entry is None:
+                    continue
+                length, weight = entry
+                phrase_start = position - n
+                is_negated = phrase_start > 0 and negated[(phrase_start - 1) % ring]
+                contribution = -weight if is_negated else weight
+                if phrase_start <= last_end:
+                    if length <= last_length:
+                        continue
+                    score -= last_contribution
+                    count -= 1
+                score += contribution
+                count += 1
+                last_end = position
+                last_length = length
+                last_contribution = contribution
+                break
+
+        # Normalize score
+        if count > 0:
+            return score / count
+        return 0.0
+
+
+class LexiconShard:
+    """Feature keywords and sentiment phrases for one language."""
+
+    def __init__(
+        self,
+        language: str,
+        features: Dict[str, List[str]],
+        phrases: PhraseLexicon,
+        taxonomy: Optional[FeatureTaxonomy] = None,
+        snapshot: Optional[tuple] = None,
+    ):
+        self.language = language
+        self.features = features
+        self.phrases = phrases
+        self.taxonomy = taxonomy or FeatureTaxonomy()
+        self.snapshot = snapshot  # identity of the snapshot file it was mapped from
+
+    def __reduce_ex__(self, protocol):
+        # Worker processes map the same snapshot file (sharing its pages)
+        # instead of receiving a pickled copy of the tables
+        if self.snapshot is not None and _snapshot_identity(self.snapshot[0]) == self.snapshot:
+            return _open_snapshot_shard, (self.snapshot, self.language)
+        return super().__reduce_ex__(protocol)
+
+    def keywords(self, feature: str) -> List[str]:
+        """Keywords for a feature; unknown features match their own name."""
+        return self.features.get(feature.lower(), [feature.lower()])
+
+    def feature_matcher(
+        self, features: Sequence[str], custom: Optional[Dict[str, List[str]]] = None
+    ) -> FeatureMatcher:
+        """Single compiled matcher for the features and all of their sub-features.
+
+        `custom` (name -> keywords) overrides or adds feature definitions.
+        """
+        custom = custom or {}
+        keywords = {
+            feature: custom[feature] if feature in custom else self.keywords(feature)
+            for feature in self.taxonomy.expand(features)
+        }
+        return compiled_matcher(keywords, self.taxonomy)
+
+
+class Lexicon:
+    """One immutable, versioned lexicon made of per-language shards.
+
+    The MIXED shard merges every language and is used when a text's language
+    could not be identified.
+    """
+
+    def __init__(
+        self,
+        version: str,
+        shards: Dict[str, LexiconShard],
+        buffer=None,
+        taxonomy: Optional[FeatureTaxonomy] = None,
+        snapshot: Optional[tuple] = None,
+    ):
+        self.version = version
+        self.shards = shards
+        self.taxonomy = taxonomy or FeatureTaxonomy()
+        self.snapshot = snapshot
+        self._buffer = buffer  # keeps the snapshot mapping alive
+
+    @property
+    def features(self) -> Dict[str, List[str]]:
+        """Feature keywords across all languages."""
+        return self.shards[MIXED].features
+
+    def default_features(self, pack: Optional[str] = None) -> List[str]:
+        """Top-level features of a pack (default pack if None), or all top-level features."""
+        features = self.taxonomy.pack(pack)
+        if features is None:
+            features = self.taxonomy.roots(list(self.features))
+        return features
+
+    def shard(self, language: Optional[str]) -> LexiconShard:
+        return self.shards.get(language) or self.shards[MIXED]
+
+
+def snapshot_path_for(source_path: str) -> str:
+    return os.path.splitext(source_path)[0] + ".lexbin"
+
+
+def _shard_sources(source: dict) -> Dict[str, dict]:
+    """Per-language shard sources plus the merged MIXED shard."""
+    languages = source["languages"]
+    mixed = {"negations": [], "features": {}, "positive": {}, "negative": {}}
+    for shard in languages.values():
+        mixed["negations"].extend(shard.get("negations", []))
+        for feature, keywords in shard["features"].items():
+            merged = mixed["features"].setdefault(feature, [])
+            merged.extend(k for k in keywords if k not in merged)
+        for kind in ("positive", "negative"):
+            for phrase, weight in shard[kind].items():
+                mixed[kind].setdefault(phrase, weight)
+    return {**languages, MIXED: mixed}
+
+
+def _compile_taxonomy(source: dict, features: Dict[str, List[str]]) -> FeatureTaxonomy:
+    """Validated taxonomy of a lexicon source; every node must have keywords."""
+    taxonomy = FeatureTaxonomy.from_dict(source.get("taxonomy"))
+    referenced = taxonomy.nodes.union(*map(set, taxonomy.packs.values()))
+    unknown = sorted(referenced - set(features))
+    if unknown:
+        raise ValueError(f"Taxonomy features without keywords: {', '.join(unknown)}")
+    return taxonomy
+
+
+def compile_snapshot(source_path: str, snapshot_path: Optional[str] = None) -> str:
+    """Compile a JSON lexicon source into a binary snapshot (written atomically)."""
+    snapshot_path = snapshot_path or snapshot_path_for(source_path)
+    with open(source_path, "r", encoding="utf-8") as f:
+        source = json.load(f)
+
+    max_tokens = source.get("max_phrase_tokens", MAX_PHRASE_TOKENS)
+    shard_sources = _shard_sources(source)
+    taxonomy = _compile_taxonomy(source, shard_sources[MIXED]["features"])
+    sections = {}
+    shards = {}
+    for language, shard in shard_sources.items():
+        weights = list(shard["positive"].items()) + list(shard["negative"].items())
+        vocabulary, entries = _compile_phrases(weights, max_tokens)
+
+        base = len(vocabulary) + 1
+        if base ** max_tokens > MAX_PHRASE_KEY:
+            raise ValueError(
+                f"{language}: {len(vocabulary)} phrase tokens are too many for"
+                f" {max_tokens}-token phrase keys"
+            )
+
+        token_blob = bytearray()
+        token_offsets = array("I", [0])
+        for token in vocabulary:
+            token_blob += token.encode("utf-8")
+            token_offsets.append(len(token_blob))
+
+        # Sorted by key so lookups can binary-search the mapped arrays
+        packed = sorted(_pack_phrases(entries, base))
+        phrase_keys = array("q", (key for key, _, _ in packed))
+        phrase_lengths = array("B", (length for _, length, _ in packed))
+        phrase_weights = array("d", (weight for _, _, weight in packed))
+
+        sections[f"{language}.token_offsets"] = token_offsets.tobytes()
+        sections[f"{language}.token_blob"] = bytes(token_blob)
+        sections[f"{language}.phrase_keys"] = phrase_keys.tobytes()
+        sections[f"{language}.phrase_lengths"] = phrase_lengths.tobytes()
+        sections[f"{language}.phrase_weights"] = phrase_weights.tobytes()
+        shards[language] = {
+            "negations": shard.get("negations", []),
+            "features": shard["features"],
+        }
+
+    meta = {
+        "version": source["version"],
+        "max_phrase_tokens": max_tokens,
+        "taxonomy": taxonomy.to_dict(),
+        "shards": shards,
+        "sections": {},
+    }
+    # Section offsets depend on the meta size, so lay out until it is stable
+    while True:
+        meta_bytes = json.dumps(meta, ensure_ascii=False, sort_keys=True).encode("utf-8")
+        position = SNAPSHOT_HEADER.size + len(meta_bytes)
+        layout = {}
+        for name, data in sections.items():
+            position += -position % 8
+            layout[name] = [position, len(data)]
+            position += len(data)
+        if layout == meta["sections"]:
+            break
+        meta["sections"] = layout
+
+    tmp_path = f"{snapshot_path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT, len(meta_bytes)))
+        f.write(meta_bytes)
+        for name, data in sections.items():
+            f.write(b"\0" * (layout[name][0] - f.tell()))
+            f.write(data)
+    os.replace(tmp_path, snapshot_path)
+    return snapshot_path
+
+
+def _snapshot_identity(snapshot_path: str, stat: Optional[os.stat_result] = None) -> Optional[tuple]:
+    """(path, device, inode, mtime, size) of a snapshot file; None when it is gone."""
+    if stat is None:
+        try:
+            stat = os.stat(snapshot_path)
+        except OSError:
+            return None
+    return (snapshot_path, stat.st_dev, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+def _snapshot_format(snapshot_path: str) -> Optional[int]:
+    """Format number in a snapshot's header, or None if it is not a snapshot."""
+    with open(snapshot_path, "rb") as f:
+        header = f.read(SNAPSHOT_HEADER.size)
+    if len(header) < SNAPSHOT_HEADER.size:
+        return None
+    magic, file_format, _ = SNAPSHOT_HEADER.unpack(header)
+    return file_format if magic == SNAPSHOT_MAGIC else None
+
+
+def load_snapshot(snapshot_path: str) -> Lexicon:
+    """Map a compiled snapshot; phrase lookups run directly on the mapped arrays.
+
+    Loading parses only the header and the JSON meta (features, taxonomy), so
+    it does not grow with the number of phrases, and every process mapping
+    the same file shares its pages through the page cache.
+    """
+    if sys.byteorder != "little":
+        raise RuntimeError("lexicon snapshots are little-endian")
+
+    with open(snapshot_path, "rb") as f:
+        buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        snapshot = _snapshot_identity(snapshot_path, os.fstat(f.fileno()))
+
+    view = memoryview(buffer)
+    magic, file_format, meta_length = SNAPSHOT_HEADER.unpack_from(view)
+    if magic != SNAPSHOT_MAGIC or file_format != SNAPSHOT_FORMAT:
+        raise ValueError(f"Not a lexicon snapshot: {snapshot_path}")
+    meta = json.loads(bytes(view[SNAPSHOT_HEADER.size:SNAPSHOT_HEADER.size + meta_length]))
+
+    def section(name, fmt=None):
+        offset, length = meta["sections"][name]
+        data = view[offset:offset + length]
+        return data.cast(fmt) if fmt else data
+
+    taxonomy = FeatureTaxonomy.from_dict(meta.get("taxonomy"))
+    shards = {}
+    for language, shard in meta["shards"].items():
+        vocabulary = MappedVocabulary(
+            section(f"{language}.token_offsets", "I"), section(f"{language}.token_blob")
+        )
+        phrases = MappedPhrases(
+            section(f"{language}.phrase_keys", "q"),
+            section(f"{language}.phrase_lengths", "B"),
+            section(f"{language}.phrase_weights", "d"),
+        )
+        shards[language] = LexiconShard(
+            language,
+            shard["features"],
+            PhraseLexicon(vocabulary, phrases, shard["negations"], meta["max_phrase_tokens"]),
+            taxonomy,
+            snapshot,
+        )
+
+    return Lexicon(meta["version"], shards, buffer, taxonomy, snapshot)
+
+
+# Snapshots mapped by this process on behalf of pickled shards (worker side)
+_mapped: Dict[tuple, Lexicon] = {}
+
+
+def _open_snapshot_shard(snapshot: tuple, language: str) -> LexiconShard:
+    """Unpickle a shard by mapping the snapshot file it came from."""
+    lexicon = _mapped.get(snapshot)
+    if lexicon is None:
+        lexicon = load_snapshot(snapshot[0])
+        if lexicon.snapshot != snapshot:
+            raise RuntimeError(f"Lexicon snapshot changed while in use: {snapshot[0]}")
+        # Only the newest snapshot is kept mapped
+        _mapped.clear()
+        _mapped[snapshot] = lexicon
+    return lexicon.shards[language]
+
+
+def load_lexicon(source_path: str) -> Lexicon:
+    """Load a lexicon, recompiling its snapshot when the source is newer (or the format older)."""
+    snapshot_path = snapshot_path_for(source_path)
+    if (
+        not os.path.exists(snapshot_path)
+        or os.path.getmtime(snapshot_path) < os.path.getmtime(source_path)
+        or _snapshot_format(snapshot_path) != SNAPSHOT_FORMAT
+    ):
+        compile_snapshot(source_path, snapshot_path)
+    return load_snapshot(snapshot_path)
+
+
+_current: Optional[Lexicon] = None
+_lock = Lock()
+
+
+def lexicon_path() -> str:
+    return os.environ.get("LEXICON_PATH", DEFAULT_LEXICON_PATH)
+
+
+def get_lexicon() -> Lexicon:
+    """The active lexicon (loaded on first use)."""
+    lexicon = _current
+    if lexicon is None:
+        lexicon = reload_lexicon()
+    return lexicon
+
+
+def reload_lexicon(source_path: Optional[str] = None) -> Lexicon:
+    """Load a lexicon fully, then swap it in with a single reference assignment.
+
+    Analyses already running keep the lexicon they started with.
+    """
+    global _current
+    with _lock:
+        lexicon = load_lexicon(source_path or lexicon_path())
+        _current = lexicon
+    return lexicon
@@ -0,0 +1,272 @@
+"""
+Analysis Pipeline
+Runs download -> convert -> transcribe -> sentiment as coroutines on one shared event loop
+"""
+
+import asyncio
+import os
+import sys
+import wave
+from contextlib import contextmanager
+from threading import Thread, Lock
+
+from services.audio_conversion import conversion_pool, ConversionTimeout, CONVERSION_TIMEOUT
+from services.language_service import detect_language
+from services.sentiment_service import SentimentAnalysisService
+from services.scheduler import JobScheduler
+from services.single_flight import SingleFlight
+from services.speech_quota import (
+    MAX_ATTEMPTS,
+    RETRYABLE,
+    RecognitionRejected,
+    SpeechQuota,
+    backoff_delay,
+    classify_cancellation,
+)
+
+
+class PipelineError(Exception):
+    """Raised when a pipeline stage fails."""
+
+
+class AnalysisPipeline:
+    """Runs video analyses as coroutines on a single background event loop.
+
+    Waiting on yt-dlp, ffmpeg and Azure costs one coroutine per job instead of
+    one OS thread, so a single process can hold many in-flight analyses.
+    """
+
+    RECOGNITION_TIMEOUT = 1200  # 20 minutes
+    LANGUAGE_PROBE_CHARS = 300  # recognized text needed before checking the language
+
+    def __init__(self):
+        self._loop = None
+        self._lock = Lock()
+        self._sentiment_service = SentimentAnalysisService()
+        self.flights = SingleFlight()
+        self.quota = SpeechQuota()
+        self.scheduler = JobScheduler()
+
+    def _ensure_loop(self):
+        """Start the pipeline event loop thread on first use."""
+        with self._lock:
+            if self._loop is None:
+                loop = asyncio.new_event_loop()
+                Thread(
+                    target=loop.run_forever, name="analysis-pipeline", daemon=True
+                ).start()
+                self._loop = loop
+        return self._loop
+
+    def submit(self, coro):
+        """Schedule a coroutine on the pipeline loop; returns a concurrent Future."""
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_loop())
+
+    @contextmanager
+    def scheduled(self, lane, duration):
+        """Hold a scheduler slot from a thread outside the loop (blocks until admitted).
+
+        For jobs that run their media stages on their own thread: they are
+        admitted alongside pipeline analyses instead of around them.
+        """
+        self.submit(self.scheduler.acquire(lane, duration)).result()
+        try:
+            yield
+        finally:
+            self._ensure_loop().call_soon_threadsafe(self.scheduler.release)
+
+    def submit_analysis(self, key, service, lane="interactive"):
+        """Analyze once per key: concurrent callers share the in-flight job.
+
+        Returns (flight, leader); followers' services are never run, so results
+        belong to flight.context (the leader's service).
+        """
+        return self.flights.join(
+            key, service, lambda: self.submit(self.analyze(service, lane))
+        )
+
+    async def analyze(self, service, lane="interactive"):
+        """Run the full pipeline for a TranscriptionService and return (text, sentiment).
+
+        After the pre-flight step the media stages wait for a scheduler slot,
+        ordered by lane and the duration pre-flight reported.
+        """
+        await self.preflight(service)
+        if service.caption_text is not None:
+            text = service._save_transcript([service.caption_text])
+        else:
+            async with self.scheduler.slot(lane, service.duration):
+                await self.download(service)
+                await self.convert(service)
+                await self.trim(service)
+                text = await self.transcribe(service)
+        if text.startswith("["):
+            return text, {}
+
+        loop = asyncio.get_running_loop()
+        results = await loop.run_in_executor(
+            None, self._sentiment_service.analyze_all_features, text, None, service.language
+        )
+        return text, results
+
+    async def _run(self, *args):
+        """Run a subprocess without blocking the loop; raise on non-zero exit."""
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        try:
+            _, stderr = await process.communicate()
+        except asyncio.CancelledError:
+            # A cancelled job must not leave yt-dlp/ffmpeg downloading in the background
+            if process.returncode is None:
+                process.kill()
+            raise
+        if process.returncode != 0:
+            details = stderr.decode("utf-8", errors="replace").strip()
+            raise PipelineError(f"{os.path.basename(args[0])} failed: {details[-500:]}")
+
+    async def preflight(self, service):
+        """Fetch metadata (duration, captions) before any media is downloaded."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, service._preflight)
+
+    async def download(self, service):
+        """Download audio with the yt-dlp CLI as a subprocess."""
+        if os.path.exists(service.audio_mp3):
+            print(f"✓ Audio file already exists: {service.audio_mp3}")
+            return
+
+        print(f"Downloading audio from: {service.youtube_url}")
+        await self._run(
+            sys.executable, "-m", "yt_dlp",
+            "--format", service._download_format(),
+            "--extract-audio",
+            "--audio-format", "mp3",
+            "--audio-quality", "192K",
+            "--no-playlist",
+            "--output", service.output_path,
+            service.youtube_url,
+        )
+        print(f"✅ Downloaded: {service.audio_mp3}")
+
+    async def convert(self, service):
+        """Convert MP3 to WAV 16kHz mono in the conversion process pool."""
+        if os.path.exists(service.audio_wav):
+            print(f"✓ WAV file already exists: {service.audio_wav}")
+            return
+
+        job = conversion_pool.submit(service.audio_mp3, service.audio_wav)
+        try:
+            result = await asyncio.wait_for(asyncio.wrap_future(job), CONVERSION_TIMEOUT + 5)
+        except asyncio.TimeoutError:
+            raise ConversionTimeout(f"conversion of {service.audio_mp3} timed out")
+        print(f"✅ Converted to WAV: {result.path} ({result.duration:.1f}s)")
+
+    async def trim(self, service):
+        """Drop non-speech audio before recognition (NumPy VAD, off the loop thread)."""
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, service._trim_audio)
+
+    async def transcribe(self, service):
+        """Run Azure continuous recognition, bridging SDK callbacks into an asyncio queue.
+
+        The first recognized segments are language-checked: with auto-detection
+        the result pins service.language; with a forced locale that turns out to
+        be wrong, recognition restarts once in the detected language.
+        """
+        if not service.azure_key or not service.azure_region:
+            raise PipelineError("Azure credentials not configured")
+
+        forced = service.language
+        text, detected = await self._recognize_admitted(service)
+        if detected and forced and detected != forced:
+            print(f"Recognition language {forced} looks wrong, restarting as {detected}")
+            service.language = detected
+            text, _ = await self._recognize_admitted(service)
+        elif detected:
+            service.language = detected
+
+        return service._save_transcript(text)
+
+    async def _recognize_admitted(self, service):
+        """Recognize within the speech quota, requeueing throttled sessions with backoff."""
+        with wave.open(service.recognition_audio, "rb") as audio:
+            audio_seconds = audio.getnframes() / audio.getframerate()
+
+        for attempt in range(MAX_ATTEMPTS):
+            cost = await self.quota.acquire(audio_seconds)
+            refund = 0.0
+            try:
+                return await self._recognize(service)
+            except RecognitionRejected as e:
+                if attempt == MAX_ATTEMPTS - 1:
+                    raise PipelineError(f"{e} (gave up after {MAX_ATTEMPTS} attempts)")
+                # A throttled session was refused outright, so its audio budget is returned
+                refund = cost if e.category == "throttled" else 0.0
+                delay = backoff_delay(attempt)
+                print(f"WARNING: {e}; retrying in {delay:.1f}s")
+            finally:
+                await self.quota.release(refund)
+            # Back off outside the session slot so admitted jobs keep flowing
+            await asyncio.sleep(delay)
+
+    async def _recognize(self, service):
+        """One continuous recognition pass; returns (segments, detected language).
+
+        A forced-locale pass stops early once its segments identify another language.
+        """
+        loop = asyncio.get_running_loop()
+        events = asyncio.Queue()
+
+        def forward(kind):
+            # SDK callbacks fire on Azure's own threads
+            return lambda evt: loop.call_soon_threadsafe(events.put_nowait, (kind, evt))
+
+        recognizer = service._create_recognizer(service.recognition_audio)
+        recognizer.recognized.connect(forward("recognized"))
+        recognizer.canceled.connect(forward("canceled"))
+        recognizer.session_stopped.connect(forward("stopped"))
+
+        service._reset_segments()
+        await loop.run_in_executor(None, recognizer.start_continuous_recognition)
+
+        all_text = []
+        probe_chars = 0
+        detected = None
+        deadline = loop.time() + self.RECOGNITION_TIMEOUT
+        try:
+            while True:
+                kind, evt = await asyncio.wait_for(events.get(), deadline - loop.time())
+                if kind == "recognized":
+                    if evt.result and evt.result.text:
+                        all_text.append(evt.result.text)
+                        service._record_segment(evt.result)
+                        if detected is None and probe_chars < self.LANGUAGE_PROBE_CHARS:
+                            probe_chars += len(evt.result.text) + 1
+                            if probe_chars >= self.LANGUAGE_PROBE_CHARS:
+                                detected = detect_language(" ".join(all_text)).language
+                                if detected and service.language and detected != service.language:
+                                    break
+                else:
+                    if kind == "canceled":
+                        details = getattr(evt, "cancellation_details", None)
+                        category = classify_cancellation(details)
+                        if category in RETRYABLE:
+                            raise RecognitionRejected(category, details.error_details)
+                        if category == "fatal":
+                            raise PipelineError(f"Recognition canceled: {details.error_details}")
+                    print(f"Recognition {kind}: {getattr(evt, 'result', evt)}")
+                    break
+        except asyncio.TimeoutError:
+            print("WARNING: Recognition timeout!")
+        finally:
+            await loop.run_in_executor(None, recognizer.stop_continuous_recognition)
+
+        if detected is None and all_text:
+            detected = detect_language(" ".join(all_text)).language
+        return all_text, detected
+
+
+pipeline = AnalysisPipeline()
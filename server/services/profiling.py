@@ -0,0 +1,103 @@
+"""
+Profiling
+Low-overhead sampling profiler writing folded stacks (flamegraph.pl / speedscope input)
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+SAMPLE_INTERVAL = 0.005  # seconds between samples
+
+# Threads doing work on behalf of a request besides the request thread itself:
+# the pipeline loop, its executor workers and asgiref's loop threads
+WORKER_THREAD_PREFIXES = ("analysis-pipeline", "asyncio_", "ThreadPoolExecutor")
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _folded(frame) -> str:
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return ";".join(labels)
+
+
+class SamplingProfiler:
+    """Samples the stacks of selected threads from a background thread.
+
+    Each sample adds one count to a "thread;outer;...;inner" folded stack.
+    Nothing is installed in the profiled threads, so their code runs
+    unchanged; cost is one stack walk per selected thread per interval.
+    """
+
+    def __init__(
+        self,
+        thread_filter: Optional[Callable[[threading.Thread], bool]] = None,
+        interval: float = SAMPLE_INTERVAL,
+    ):
+        self.thread_filter = thread_filter or (lambda thread: True)
+        self.interval = interval
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            threads = {thread.ident: thread for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                thread = threads.get(ident)
+                if ident == own or thread is None or not self.thread_filter(thread):
+                    continue
+                self.samples[f"{thread.name};{_folded(frame)}"] += 1
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+    def write(self, path: str):
+        """Write samples as folded stacks, one "stack count" line each."""
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in self.samples.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+def request_profiler(request_thread: int) -> SamplingProfiler:
+    """Profiler for a request thread and the pipeline threads serving it."""
+    def selected(thread):
+        return thread.ident == request_thread or thread.name.startswith(WORKER_THREAD_PREFIXES)
+
+    return SamplingProfiler(selected)
+
+
+@contextmanager
+def profile_to(path: str):
+    """Profile the current thread (and pipeline threads) while the block runs; save to `path`."""
+    profiler = request_profiler(threading.get_ident())
+    started = time.perf_counter()
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        profiler.write(path)
+        elapsed = time.perf_counter() - started
+        samples = sum(profiler.samples.values())
+        print(f"Profile written to {path} ({elapsed:.2f}s, {samples} samples)")
@@ -0,0 +1,80 @@
+"""
+Job Scheduler
+Duration-aware admission of pipeline jobs: priority lanes, shortest job
+first within a lane, and aging so long or batch jobs are never starved
+"""
+
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Optional
+
+MAX_RUNNING = int(os.getenv("PIPELINE_MAX_JOBS", "4"))
+
+# Head start of each lane, in seconds of audio: a batch job waits behind
+# interactive jobs up to this much longer than itself
+LANES = {"interactive": 0.0, "batch": 1800.0}
+DEFAULT_DURATION = 600.0  # jobs whose duration is unknown
+AGING_RATE = 2.0  # seconds of priority gained per second waited
+
+
+class JobScheduler:
+    """Admits at most `max_running` jobs; the rest wait in one priority heap.
+
+    A job's key is lane offset + duration + AGING_RATE * enqueue time. Since
+    every waiting job ages at the same rate, comparing keys equals comparing
+    "duration minus credit for time waited", and the keys never need
+    updating. Used from the pipeline event loop only.
+    """
+
+    def __init__(self, max_running: int = MAX_RUNNING, clock=time.monotonic):
+        self.max_running = max_running
+        self.running = 0
+        self._clock = clock
+        self._waiting = []  # heap of (key, sequence, future)
+        self._sequence = itertools.count()
+
+    def priority(self, lane: str, duration: Optional[float]) -> float:
+        if lane not in LANES:
+            raise ValueError(f"Unknown lane: {lane}")
+        return LANES[lane] + (duration or DEFAULT_DURATION) + AGING_RATE * self._clock()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, _, future in self._waiting if not future.done())
+
+    async def acquire(self, lane: str, duration: Optional[float]):
+        key = self.priority(lane, duration)
+        if self.running < self.max_running and not self.waiting:
+            self.running += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiting, (key, next(self._sequence), future))
+        try:
+            await future
+        except asyncio.CancelledError:
+            # Granted just before the cancellation landed: pass the slot on
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self):
+        """Hand the slot to the best waiting job, or free it."""
+        while self._waiting:
+            _, _, future = heapq.heappop(self._waiting)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.running -= 1
+
+    @asynccontextmanager
+    async def slot(self, lane: str, duration: Optional[float]):
+        await self.acquire(lane, duration)
+        try:
+            yield
+        finally:
+            self.release()
@@ -0,0 +1,123 @@
+"""
+Segment Store
+Append-only, time-indexed storage of recognized transcript segments
+"""
+
+import math
+import os
+from array import array
+from bisect import bisect_left, bisect_right
+from dataclasses import dataclass
+from threading import Lock
+from typing import List
+
+# Index record: start ms, end ms, end of the segment's text in the blob (bytes)
+RECORD = array("q").itemsize * 3
+
+
+@dataclass(slots=True)
+class Segment:
+    index: int
+    start: float  # seconds in the original video
+    end: float
+    text: str
+
+    def to_dict(self):
+        return {"index": self.index, "start": self.start, "end": self.end, "text": self.text}
+
+
+class SegmentStore:
+    """Columnar segment file pair: `<base>.segidx` (int64 triples) and `<base>.segtext` (UTF-8).
+
+    Writers append text first and the index record second, so a reader that
+    sees a record always finds its text. Readers keep the columns in memory
+    and only read the bytes appended since their last refresh. Segments must
+    be appended in time order; range queries binary-search the columns.
+    """
+
+    def __init__(self, base_path: str):
+        self.index_path = base_path + ".segidx"
+        self.text_path = base_path + ".segtext"
+        self._starts = array("q")
+        self._ends = array("q")
+        self._text_ends = array("q")
+        self._lock = Lock()
+
+    # -- writes -------------------------------------------------------------
+
+    def reset(self):
+        """Start an empty transcript (e.g. before a new recognition pass)."""
+        with self._lock:
+            for path in (self.index_path, self.text_path):
+                open(path, "wb").close()
+            self._starts, self._ends, self._text_ends = array("q"), array("q"), array("q")
+
+    def append(self, start: float, end: float, text: str):
+        """Append one segment; times are seconds in the original video."""
+        data = text.encode("utf-8")
+        with self._lock:
+            with open(self.text_path, "ab") as f:
+                f.write(data)
+                text_end = f.tell()
+            record = array("q", (round(start * 1000), round(end * 1000), text_end))
+            with open(self.index_path, "ab") as f:
+                f.write(record.tobytes())
+
+    # -- reads --------------------------------------------------------------
+
+    def refresh(self) -> int:
+        """Load index records appended since the last call; returns the segment count."""
+        with self._lock:
+            known = len(self._starts)
+            try:
+                with open(self.index_path, "rb") as f:
+                    f.seek(known * RECORD)
+                    data = f.read()
+            except FileNotFoundError:
+                return known
+            records = array("q")
+            records.frombytes(data[: len(data) - len(data) % RECORD])  # skip a torn tail
+            self._starts.extend(records[0::3])
+            self._ends.extend(records[1::3])
+            self._text_ends.extend(records[2::3])
+            return len(self._starts)
+
+    def __len__(self):
+        return self.refresh()
+
+    def _read(self, first: int, last: int) -> List[Segment]:
+        """Segments [first, last) with one read of their contiguous text."""
+        if first >= last:
+            return []
+        blob_start = self._text_ends[first - 1] if first else 0
+        with open(self.text_path, "rb") as f:
+            f.seek(blob_start)
+            blob = f.read(self._text_ends[last - 1] - blob_start)
+
+        segments = []
+        for i in range(first, last):
+            text_start = (self._text_ends[i - 1] if i else 0) - blob_start
+            segments.append(Segment(
+                index=i,
+                start=self._starts[i] / 1000,
+                end=self._ends[i] / 1000,
+                text=blob[text_start:self._text_ends[i] - blob_start].decode("utf-8"),
+            ))
+        return segments
+
+    def range(self, start: float, end: float) -> List[Segment]:
+        """Segments overlapping [start, end) seconds."""
+        count = self.refresh()
+        # Segments are ordered and disjoint, so both columns are sorted
+        first = bisect_right(self._ends, round(start * 1000), 0, count)
+        last = count
+        if not math.isinf(end):
+            last = bisect_left(self._starts, round(end * 1000), first, count)
+        return self._read(first, last)
+
+    def since(self, index: int) -> List[Segment]:
+        """Segments appended after the first `index` ones (incremental reads)."""
+        return self._read(max(0, index), self.refresh())
+
+    def exists(self) -> bool:
+        return os.path.exists(self.index_path)
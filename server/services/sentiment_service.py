@@ -1,7 +1,37 @@
+import math
+import multiprocessing
+import os
 import re
-from typing import Dict, List, Optional
-from dataclasses import dataclass
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from dataclasses import dataclass, field
 from enum import Enum
+from services.language_service import SAMPLE_CHARS as LANGUAGE_SAMPLE_CHARS, detect_language
+from services.lexicon import Lexicon, LexiconShard, get_lexicon
+from services.taxonomy import FeatureMatcher
+
+# A sentence is a run between [.!?]+ delimiters, trimmed of surrounding
+# whitespace; matching it directly yields the stripped (start, end) span.
+SENTENCE_SPAN = re.compile(r"[^.!?\s](?:[^.!?]*[^.!?\s])?")
+SENTENCE_END = re.compile(r"[.!?]")
+
+# Texts at least this long are split into sentence-aligned shards scored in
+# worker processes (a multi-hour transcript is ~1M characters)
+PARALLEL_MIN_CHARS = 200_000
+SHARD_MIN_CHARS = 50_000
+MAX_EXAMPLES = 3
+
+# Longest unterminated text analyze_stream buffers before forcing a sentence break
+STREAM_MAX_PENDING_CHARS = 100_000
+
+
+def _last_space(text: str) -> int:
+    """Index of the last whitespace character in text, or len(text) when there is none."""
+    for i in range(len(text) - 1, -1, -1):
+        if text[i].isspace():
+            return i
+    return len(text)
 
 
 class Sentiment(Enum):
@@ -10,137 +40,195 @@ class Sentiment(Enum):
     NEUTRAL = "neutral"
 
 
-@dataclass
+@dataclass(slots=True)
 class FeatureSentiment:
     feature: str
     sentiment: Sentiment
     confidence: float
+    score: float
     relevant_text: List[str]
+    spans: List[Tuple[int, int]]
+    lexicon_version: str
+    language: str
+
+
+@dataclass(slots=True)
+class FeatureAccumulator:
+    """Running per-feature state; sentences are (start, end) spans into the text."""
+
+    # Non-overlapping partial sums whose exact total is the score sum, so the
+    # result does not depend on the order or grouping of additions
+    partials: List[float] = field(default_factory=list)
+    sentence_count: int = 0
+    examples: List[str] = field(default_factory=list)
+    spans: List[Tuple[int, int]] = field(default_factory=list)
+
+    @property
+    def total_score(self) -> float:
+        return math.fsum(self.partials)
+
+    def _add_exact(self, x: float):
+        """Shewchuk's exact addition of x into the partials."""
+        partials = self.partials
+        i = 0
+        for y in partials:
+            if abs(x) < abs(y):
+                x, y = y, x
+            high = x + y
+            low = y - (high - x)
+            if low:
+                partials[i] = low
+                i += 1
+            x = high
+        partials[i:] = [x]
+
+    def add(self, score: float, text: str, start: int, end: int, offset: int = 0):
+        self._add_exact(score)
+        self.sentence_count += 1
+        # Only the returned examples are ever materialized as strings
+        if len(self.examples) < MAX_EXAMPLES:
+            self.examples.append(text[start:end])
+            self.spans.append((offset + start, offset + end))
+
+    def merge(self, other: "FeatureAccumulator"):
+        """Fold in the accumulator of the text that directly follows this one's."""
+        for partial in other.partials:
+            self._add_exact(partial)
+        self.sentence_count += other.sentence_count
+        room = MAX_EXAMPLES - len(self.examples)
+        self.examples.extend(other.examples[:room])
+        self.spans.extend(other.spans[:room])
+
+
+def _shard_bounds(text: str, count: int) -> List[Tuple[int, int]]:
+    """Split text into about `count` pieces, each cut just after a sentence delimiter.
+
+    No sentence crosses such a cut, so the pieces yield exactly the sentences
+    of the whole text.
+    """
+    bounds = []
+    start = 0
+    for i in range(1, count):
+        match = SENTENCE_END.search(text, max(start, len(text) * i // count))
+        if match is None:
+            break
+        bounds.append((start, match.end()))
+        start = match.end()
+    bounds.append((start, len(text)))
+    return bounds
+
+
+def _score_shard(
+    text: str, offset: int, matcher: FeatureMatcher, shard: LexiconShard
+) -> Dict[str, FeatureAccumulator]:
+    """Worker entry point: partial accumulators for one piece of a long text."""
+    service = SentimentAnalysisService()
+    accumulators = service._new_accumulators(matcher)
+    service._accumulate(text, service._sentence_spans(text), accumulators, matcher, shard, offset)
+    return accumulators
+
+
+class ScoringPool:
+    """Process pool sized to the core count for scoring shards of long texts."""
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self._executor = None
+        self._lock = Lock()
+
+    def _ensure_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # spawn: forking a threaded Flask process is unsafe
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+        return self._executor
+
+    def score(
+        self, text: str, matcher: FeatureMatcher, shard: LexiconShard
+    ) -> Dict[str, FeatureAccumulator]:
+        """Score text in sentence-aligned shards in parallel and merge them in text order."""
+        count = min(self.max_workers, max(1, len(text) // SHARD_MIN_CHARS))
+        executor = self._ensure_executor()
+        futures = [
+            executor.submit(_score_shard, text[start:end], start, matcher, shard)
+            for start, end in _shard_bounds(text, count)
+        ]
+        accumulators = futures[0].result()
+        for future in futures[1:]:
+            for feature, partial in future.result().items():
+                accumulators[feature].merge(partial)
+        return accumulators
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+scoring_pool = ScoringPool()
 
 
 class SentimentAnalysisService:
     """Service for analyzing sentiment of device features using a lexicon-based model."""
 
-    # Define feature keywords and their variations (ROZSZERZONE)
-    FEATURE_KEYWORDS = {
-        "camera": [
-            "camera", "photo", "picture", "lens", "megapixel", "zoom", "selfie", 
-            "video", "recording", "aparat", "zdjęcie", "zdjęcia", "obiektyw", 
-            "nagrywanie", "nagrania"
-        ],
-        "battery": [
-            "battery", "charge", "charging", "power", "autonomy", "mah", "life", 
-            "bateria", "ładowanie", "zasilanie", "żywotność", "czas pracy", "drain"
-        ],
-        "screen": [
-            "screen", "display", "brightness", "resolution", "oled", "lcd", "panel", 
-            "ekran", "wyświetlacz", "jasność", "dotyk", "touch"
-        ],
-        "performance": [
-            "performance", "speed", "fast", "slow", "lag", "processor", "ram", 
-            "cpu", "gpu", "chip", "wydajność", "szybkość", "procesor", "opóźnienie",
-            "płynność", "responsive", "smooth"
-        ],
-        "design": [
-            "design", "look", "appearance", "build", "quality", "material", 
-            "aesthetic", "wygląd", "jakość wykonania", "materiał", "estetyka", 
-            "kształt", "feeling", "feel"
-        ],
-        "sound": [
-            "sound", "audio", "speaker", "volume", "music", "headphone", "mic",
-            "dźwięk", "głośnik", "głośniki", "muzyka", "mikrofon", "słuchawki"
-        ],
-    }
-
-    # Positive and negative keywords with weights (ROZSZERZONA I UJEDNOLICONA LISTA)
-    POSITIVE_KEYWORDS = {
-        # English (Rozszerzone)
-        "excellent": 0.9, "amazing": 0.9, "great": 0.8, "good": 0.7, "nice": 0.6,
-        "love": 0.8, "perfect": 0.9, "fantastic": 0.9, "awesome": 0.8, 
-        "wonderful": 0.8, "impressive": 0.8, "outstanding": 0.9, "superb": 0.9, 
-        "best": 0.9, "beautiful": 0.7, "solid": 0.6, "smooth": 0.7, "fast": 0.7,
-        "bright": 0.6, "clear": 0.6, "sharp": 0.7, "long-lasting": 0.8, 
-        "efficient": 0.7, "top-notch": 0.9, "flawless": 0.9, "decent": 0.5,
-        "reliable": 0.7, "stunning": 0.8, "vibrant": 0.7, "quick": 0.7,
-        "premium": 0.6, "brilliant": 0.8, "crisp": 0.7, "vivid": 0.7,
-        
-        # Polish
-        "doskonały": 0.9, "fantastyczny": 0.9, "świetny": 0.8, "dobry": 0.7, 
-        "ładny": 0.6, "rewelacyjny": 0.9, "znakomity": 0.9, "wspaniały": 0.8, 
-        "imponujący": 0.8, "piękny": 0.7, "szybki": 0.7, "jasny": 0.6, 
-        "ostry": 0.7, "wydajny": 0.7, "idealny": 0.9, "genialny": 0.9, 
-        "super": 0.7, "fajny": 0.6, "elegancki": 0.7, "solidny": 0.6,
-    }
-
-    NEGATIVE_KEYWORDS = {
-        # English (Rozszerzone)
-        "terrible": -0.9, "awful": -0.9, "bad": -0.7, "poor": -0.7, "horrible": -0.9, 
-        "hate": -0.8, "worst": -0.9, "disappointing": -0.8, "useless": -0.9, 
-        "slow": -0.7, "lag": -0.7, "dim": -0.6, "dark": -0.6, "short": -0.6, 
-        "weak": -0.7, "mediocre": -0.5, "issue": -0.6, "problem": -0.7, 
-        "fails": -0.8, "broken": -0.9, "unreliable": -0.7, "fuzzy": -0.6,
-        "blurry": -0.7, "drain": -0.8, "glitch": -0.6, "expensive": -0.5,
-        "overheat": -0.7, "buggy": -0.6, "useless": -0.9, "clunky": -0.5,
-        
-        # Polish
-        "okropny": -0.9, "straszny": -0.9, "zły": -0.7, "kiepski": -0.7, 
-        "fatalny": -0.9, "rozczarowujący": -0.8, "słaby": -0.7, "wolny": -0.7, 
-        "ciemny": -0.6, "krótki": -0.6, "problem": -0.7, "wadliwy": -0.8, 
-        "nieudany": -0.8, "marny": -0.7, "beznadziejny": -0.9, 
-        "niedostateczny": -0.7, "drogi": -0.5, "grzeje": -0.7,
-    }
-
-    def __init__(self):
-        pass
-
-    def _extract_sentences(self, text: str) -> List[str]:
-        """Split text into sentences."""
-        sentences = re.split(r"[.!?]+", text)
-        return [s.strip() for s in sentences if s.strip()]
-
-    def _find_feature_sentences(self, text: str, feature: str) -> List[str]:
-        """Find sentences that mention a specific feature."""
-        sentences = self._extract_sentences(text)
-        keywords = self.FEATURE_KEYWORDS.get(feature.lower(), [feature.lower()])
-
-        relevant_sentences = []
-        for sentence in sentences:
-            sentence_lower = sentence.lower()
-            if any(keyword in sentence_lower for keyword in keywords):
-                relevant_sentences.append(sentence)
-
-        return relevant_sentences
+    def __init__(self, lexicon: Optional[Lexicon] = None):
+        """Use a fixed `lexicon`, or follow the process-wide one (hot reloadable) when None."""
+        self._lexicon = lexicon
+
+    @property
+    def lexicon(self) -> Lexicon:
+        """Lexicon for the next analysis; each analysis captures it once."""
+        return self._lexicon or get_lexicon()
+
+    def _select_shard(self, lexicon: Lexicon, text: str, language: Optional[str]) -> LexiconShard:
+        """Lexicon shard for an explicit language, else for the detected one (mixed if unsure)."""
+        if language is None:
+            language = detect_language(text).language
+        return lexicon.shard(language)
+
+    def _sentence_spans(self, text: str, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[int, int]]:
+        """Yield (start, end) spans of the stripped sentences in text[start:end]."""
+        for match in SENTENCE_SPAN.finditer(text, start, len(text) if end is None else end):
+            yield match.span()
+
+    def _accumulate(
+        self,
+        text: str,
+        spans: Iterable[Tuple[int, int]],
+        accumulators: Dict[str, FeatureAccumulator],
+        matcher: FeatureMatcher,
+        shard: LexiconShard,
+        offset: int = 0,
+    ):
+        """Score each sentence span once and add it to every feature that mentions it.
+
+        One matcher scan per sentence finds all mentioned features, sub-features
+        rolled up into their parents, however many features are analyzed.
+        """
+        for start, end in spans:
+            matched = matcher.match(text, start, end)
+            if not matched:
+                continue
+            score = self._score_span(text, start, end, shard)
+            for feature in matched:
+                accumulators[feature].add(score, text, start, end, offset)
 
     def _calculate_sentiment_score(self, text: str) -> float:
         """Calculate sentiment score for a piece of text."""
-        text_lower = text.lower()
-        score = 0.0
-        count = 0
-
-        # Check for negations
-        negation_words = [
-            "not", "no", "never", "don't", "doesn't", "didn't", "won't", "cannot",
-            "nie", "nigdy", "żaden", "bez",
-        ]
-        words = text_lower.split()
-
-        for i, word in enumerate(words):
-            # Check if previous word is a negation
-            is_negated = i > 0 and words[i - 1] in negation_words
-
-            if word in self.POSITIVE_KEYWORDS:
-                weight = self.POSITIVE_KEYWORDS[word]
-                score += -weight if is_negated else weight
-                count += 1
-            elif word in self.NEGATIVE_KEYWORDS:
-                weight = self.NEGATIVE_KEYWORDS[word]
-                score += -weight if is_negated else weight
-                count += 1
-
-        # Normalize score
-        if count > 0:
-            return score / count
-        return 0.0
+        return self._score_span(text, 0, len(text), self._select_shard(self.lexicon, text, None))
+
+    def _score_span(self, text: str, start: int, end: int, shard: LexiconShard) -> float:
+        """Calculate sentiment score for text[start:end] without copying the span.
+
+        Tokens are normalized (lowercase, punctuation stripped) and matched
+        against single words and phrases of up to MAX_PHRASE_TOKENS tokens in
+        one pass.
+        """
+        return shard.phrases.score(text, start, end)
 
     def _determine_sentiment(self, score: float) -> Sentiment:
         """Convert numerical score to sentiment category."""
@@ -152,19 +240,45 @@ class SentimentAnalysisService:
         else:
             return Sentiment.NEUTRAL
 
-    def analyze_feature(self, text: str, feature: str) -> Optional[FeatureSentiment]:
+    def _new_accumulators(self, matcher: FeatureMatcher) -> Dict[str, FeatureAccumulator]:
+        """Accumulators for every feature the matcher reports (sub-features included)."""
+        return {feature: FeatureAccumulator() for feature in matcher.features}
+
+    def _requested_features(
+        self,
+        lexicon: Lexicon,
+        features: Optional[List[str]],
+        pack: Optional[str],
+        custom_features: Optional[Dict[str, List[str]]],
+    ) -> List[str]:
+        """Explicit features, else the pack's top-level features plus any custom ones."""
+        if features is not None:
+            return list(dict.fromkeys(features))
+        defaults = lexicon.default_features(pack)
+        return list(dict.fromkeys([*defaults, *(custom_features or {})]))
+
+    def analyze_feature(
+        self, text: str, feature: str, language: Optional[str] = None
+    ) -> Optional[FeatureSentiment]:
         """Analyze sentiment for a specific feature in the text."""
-        relevant_sentences = self._find_feature_sentences(text, feature)
+        lexicon = self.lexicon
+        shard = self._select_shard(lexicon, text, language)
+        matcher = shard.feature_matcher([feature])
+        accumulators = self._new_accumulators(matcher)
+        self._accumulate(text, self._sentence_spans(text), accumulators, matcher, shard)
+        accumulator = accumulators[feature]
 
-        if not relevant_sentences:
+        if not accumulator.sentence_count:
             return None
 
-        # Calculate overall sentiment from relevant sentences
-        total_score = 0.0
-        for sentence in relevant_sentences:
-            total_score += self._calculate_sentiment_score(sentence)
+        return self._build_feature_sentiment(feature, accumulator, lexicon, shard)
 
-        avg_score = total_score / len(relevant_sentences)
+    def _build_feature_sentiment(
+        self, feature: str, accumulator: FeatureAccumulator, lexicon: Lexicon, shard: LexiconShard
+    ) -> FeatureSentiment:
+        """Turn accumulated sentence scores for a feature into a FeatureSentiment."""
+        sentence_count = accumulator.sentence_count
+        avg_score = accumulator.total_score / sentence_count
         sentiment = self._determine_sentiment(avg_score)
         
         # POPRAWKA PEWNOŚCI: Zapewnienie, że sentymenty inne niż neutralne mają widoczną pewność
@@ -181,35 +295,159 @@ class SentimentAnalysisService:
         confidence = min(1.0, max(0.0, confidence)) 
 
         # Jeśli wynik jest neutralny i nie znaleziono żadnych słów sentymentu (score=0), ustaw confidence na 0.01
-        if avg_score == 0.0 and len(relevant_sentences) > 0 and sentiment == Sentiment.NEUTRAL:
+        if avg_score == 0.0 and sentence_count > 0 and sentiment == Sentiment.NEUTRAL:
              confidence = 0.01
         
         return FeatureSentiment(
             feature=feature,
             sentiment=sentiment,
             confidence=confidence,
-            relevant_text=relevant_sentences[:3],  # Limit to 3 examples
+            score=avg_score,
+            relevant_text=accumulator.examples,  # Limit to 3 examples
+            spans=accumulator.spans,
+            lexicon_version=lexicon.version,
+            language=shard.language,
         )
 
+    def _format_result(self, analysis: FeatureSentiment) -> Dict:
+        """Serialize a FeatureSentiment for API responses."""
+        return {
+            "sentiment": analysis.sentiment.value,
+            "confidence": round(analysis.confidence, 2),
+            "score": round(analysis.score, 4),
+            "relevant_text": analysis.relevant_text,
+            # Character offsets of each snippet in the analyzed text
+            "spans": [list(span) for span in analysis.spans],
+            "lexicon_version": analysis.lexicon_version,
+            "language": analysis.language,
+        }
+
     def analyze_all_features(
-        self, text: str, features: Optional[List[str]] = None
+        self,
+        text: str,
+        features: Optional[List[str]] = None,
+        language: Optional[str] = None,
+        pack: Optional[str] = None,
+        custom_features: Optional[Dict[str, List[str]]] = None,
     ) -> Dict[str, Dict]:
-        """Analyze sentiment for all specified features."""
-        if features is None:
-            features = list(self.FEATURE_KEYWORDS.keys())
-
-        results = {}
-        for feature in features:
-            analysis = self.analyze_feature(text, feature)
-            if analysis:
-                results[feature] = {
-                    "sentiment": analysis.sentiment.value,
-                    "confidence": round(analysis.confidence, 2),
-                    "relevant_text": analysis.relevant_text,
-                }
-
-        return results
+        """Analyze sentiment for all specified features.
+
+        `features` defaults to the top-level features of `pack` (the lexicon's
+        default pack when None) plus any `custom_features` (name -> keywords,
+        which also override lexicon definitions); sub-feature results are
+        nested under their parent's "subfeatures". `language` picks the
+        lexicon shard; when None it is identified from the text.
+        Texts of PARALLEL_MIN_CHARS or more are scored across worker processes;
+        the merged result is identical to scoring them in one pass.
+        """
+        lexicon = self.lexicon
+        shard = self._select_shard(lexicon, text, language)
+        features = self._requested_features(lexicon, features, pack, custom_features)
+        matcher = shard.feature_matcher(features, custom_features)
+
+        if len(text) >= PARALLEL_MIN_CHARS and scoring_pool.max_workers > 1:
+            accumulators = scoring_pool.score(text, matcher, shard)
+        else:
+            accumulators = self._new_accumulators(matcher)
+            self._accumulate(text, self._sentence_spans(text), accumulators, matcher, shard)
+        return self._collect_results(features, accumulators, lexicon, shard)
+
+    def analyze_stream(
+        self,
+        chunks: Iterable[str],
+        features: Optional[List[str]] = None,
+        language: Optional[str] = None,
+        pack: Optional[str] = None,
+        custom_features: Optional[Dict[str, List[str]]] = None,
+    ) -> Dict[str, Dict]:
+        """Analyze sentiment over an iterable of text chunks in bounded memory.
+
+        Complete sentences are scored as soon as their delimiter arrives and
+        only per-feature accumulators are kept, so memory does not grow with
+        the input. Results (including spans, as offsets into the concatenated
+        stream) match analyze_all_features on the joined text, except when a
+        run of STREAM_MAX_PENDING_CHARS arrives without a delimiter: it is cut
+        at its last whitespace and scored as a sentence of its own, where
+        analyze_all_features would keep the whole run as one sentence, so
+        negation scopes, span boundaries and scores can differ there.
+        """
+        lexicon = self.lexicon
+        features = self._requested_features(lexicon, features, pack, custom_features)
+
+        shard = None
+        matcher = None
+        accumulators = None
+        pending: List[str] = []  # chunks after the last scored sentence
+        pending_chars = 0
+        offset = 0  # position of the first pending character in the whole stream
+        for chunk in chunks:
+            if not chunk:
+                continue
+            pending.append(chunk)
+            pending_chars += len(chunk)
+            if shard is None:
+                # Hold back scoring until the head of the stream identifies the language
+                if language is None and pending_chars < LANGUAGE_SAMPLE_CHARS:
+                    continue
+                pending = ["".join(pending)]
+                shard = self._select_shard(lexicon, pending[0], language)
+                matcher = shard.feature_matcher(features, custom_features)
+                accumulators = self._new_accumulators(matcher)
+
+            # Earlier chunks were searched when they arrived: only the newest can end a sentence
+            last = pending[-1]
+            boundary = max(last.rfind("."), last.rfind("!"), last.rfind("?"))
+            if boundary < 0 and pending_chars < STREAM_MAX_PENDING_CHARS:
+                continue
+            text = "".join(pending)
+            if boundary >= 0:
+                end = len(text) - len(last) + boundary
+            else:
+                # No delimiter for too long: break at the last whitespace instead
+                end = _last_space(text)
+            resume = min(end + 1, len(text))
+            self._accumulate(
+                text, self._sentence_spans(text, 0, end), accumulators, matcher, shard, offset
+            )
+            # Only the unterminated tail is carried over to the next chunk
+            tail = text[resume:]
+            pending = [tail] if tail else []
+            pending_chars = len(tail)
+            offset += resume
+
+        text = "".join(pending)
+        if shard is None:
+            shard = self._select_shard(lexicon, text, language)
+            matcher = shard.feature_matcher(features, custom_features)
+            accumulators = self._new_accumulators(matcher)
+        self._accumulate(text, self._sentence_spans(text), accumulators, matcher, shard, offset)
+        return self._collect_results(features, accumulators, lexicon, shard)
+
+    def _collect_results(
+        self,
+        features: List[str],
+        accumulators: Dict[str, FeatureAccumulator],
+        lexicon: Lexicon,
+        shard: LexiconShard,
+    ) -> Dict[str, Dict]:
+        """Results of the mentioned features, sub-features nested under their parents."""
+        taxonomy = shard.taxonomy
+
+        def collect(names):
+            results = {}
+            for feature in names:
+                accumulator = accumulators[feature]
+                if not accumulator.sentence_count:
+                    continue
+                analysis = self._build_feature_sentiment(feature, accumulator, lexicon, shard)
+                results[feature] = self._format_result(analysis)
+                subfeatures = collect(taxonomy.children.get(feature, ()))
+                if subfeatures:
+                    results[feature]["subfeatures"] = subfeatures
+            return results
+
+        return collect(taxonomy.roots(features))
 
     def get_available_features(self) -> List[str]:
-        """Get list of available features."""
-        return list(self.FEATURE_KEYWORDS.keys())
\ No newline at end of file
+        """Get list of available features (sub-features included)."""
+        return list(self.lexicon.features)
\ No newline at end of file
@@ -0,0 +1,71 @@
+"""
+Single Flight
+Collapses concurrent identical jobs into one in-flight job with many waiters
+"""
+
+from concurrent.futures import Future
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+
+@dataclass(slots=True, eq=False)
+class Flight:
+    key: Hashable
+    future: Future
+    context: Any  # what the leader attached, e.g. its TranscriptionService
+    waiters: int = 1
+
+
+class SingleFlight:
+    """Registry of in-flight jobs by key.
+
+    The first caller for a key starts the job; callers arriving before it
+    finishes attach to the same Future. Entries disappear as soon as the job
+    completes, so this only covers the window before a result exists. When
+    every caller has left, nobody wants the result and the job is cancelled.
+    """
+
+    def __init__(self):
+        self._flights: Dict[Hashable, Flight] = {}
+        self._lock = Lock()
+
+    def join(
+        self, key: Hashable, context: Any, start: Callable[[], Future]
+    ) -> Tuple[Flight, bool]:
+        """Attach to the flight for `key`, starting it if needed; returns (flight, leader)."""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and not flight.future.done():
+                flight.waiters += 1
+                return flight, False
+
+            flight = self._flights[key] = Flight(key, start(), context)
+
+        flight.future.add_done_callback(lambda _: self._finish(flight))
+        return flight, True
+
+    def leave(self, flight: Flight) -> int:
+        """Detach a waiter; returns how many are still waiting.
+
+        The last waiter to leave cancels the job. The flight is unregistered
+        first, so a caller arriving meanwhile starts a fresh job instead of
+        attaching to the cancelled one.
+        """
+        with self._lock:
+            flight.waiters -= 1
+            waiters = flight.waiters
+            if waiters == 0 and self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+        if waiters == 0:
+            # Outside the lock: cancel() runs _finish synchronously
+            flight.future.cancel()
+        return waiters
+
+    def _finish(self, flight: Flight):
+        with self._lock:
+            if self._flights.get(flight.key) is flight:
+                del self._flights[flight.key]
+
+    def __len__(self):
+        return len(self._flights)
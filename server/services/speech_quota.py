@@ -0,0 +1,113 @@
+"""
+Speech Quota
+Admission control for Azure Speech sessions: concurrency cap, audio-hours
+token bucket and classification of cancellation errors
+"""
+
+import asyncio
+import os
+import random
+import time
+
+MAX_SESSIONS = int(os.getenv("AZURE_MAX_SESSIONS", "10"))
+AUDIO_HOURS_PER_HOUR = float(os.getenv("AZURE_AUDIO_HOURS_PER_HOUR", "20"))
+
+MAX_ATTEMPTS = 6
+BASE_BACKOFF = 2.0  # seconds
+MAX_BACKOFF = 120.0
+
+# CancellationErrorCode names, grouped by what to do about them
+THROTTLED_CODES = {"TooManyRequests", "ServiceUnavailable"}
+TRANSIENT_CODES = {"ConnectionFailure", "ServiceTimeout", "ServiceError"}
+RETRYABLE = {"throttled", "transient"}
+
+
+def _name(value) -> str:
+    return getattr(value, "name", None) or str(value).rsplit(".", 1)[-1]
+
+
+def classify_cancellation(details) -> str:
+    """Map SDK CancellationDetails to "end", "throttled", "transient" or "fatal"."""
+    if details is None or _name(details.reason) != "Error":
+        return "end"  # EndOfStream / CancelledByUser
+    code = _name(details.error_code)
+    if code in THROTTLED_CODES:
+        return "throttled"
+    if code in TRANSIENT_CODES:
+        return "transient"
+    return "fatal"  # authentication, forbidden, bad request, ...
+
+
+def backoff_delay(attempt: int) -> float:
+    """Full-jitter exponential backoff before retry number `attempt` (0-based)."""
+    return random.uniform(0, min(MAX_BACKOFF, BASE_BACKOFF * 2 ** attempt))
+
+
+class RecognitionRejected(Exception):
+    """Raised when Azure cancels a session with a retryable error."""
+
+    def __init__(self, category: str, details: str):
+        super().__init__(f"recognition {category}: {details}")
+        self.category = category
+
+
+class SpeechQuota:
+    """Concurrent-session cap plus a token bucket of audio seconds.
+
+    The bucket holds `audio_hours_per_hour` hours of audio and refills at that
+    rate, so admitted work never outruns the subscription quota. Used from the
+    pipeline event loop only.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = MAX_SESSIONS,
+        audio_hours_per_hour: float = AUDIO_HOURS_PER_HOUR,
+        clock=time.monotonic,
+    ):
+        if max_sessions < 1:
+            raise ValueError(f"max_sessions must be at least 1 (AZURE_MAX_SESSIONS), got {max_sessions}")
+        if audio_hours_per_hour <= 0:
+            raise ValueError(
+                "audio_hours_per_hour must be positive (AZURE_AUDIO_HOURS_PER_HOUR),"
+                f" got {audio_hours_per_hour}"
+            )
+        self.max_sessions = max_sessions
+        self.capacity = audio_hours_per_hour * 3600.0  # audio seconds
+        self.rate = self.capacity / 3600.0  # audio seconds refilled per second
+        self.tokens = self.capacity
+        self.active = 0
+        self._clock = clock
+        self._updated = clock()
+        self._condition = asyncio.Condition()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self, audio_seconds: float) -> float:
+        """Wait for a session slot and audio budget; returns the tokens taken."""
+        cost = min(audio_seconds, self.capacity)
+        async with self._condition:
+            while True:
+                self._refill()
+                if self.active < self.max_sessions and self.tokens >= cost:
+                    self.active += 1
+                    self.tokens -= cost
+                    return cost
+                # Slots free up on release; budget refills with time
+                timeout = None
+                if self.active < self.max_sessions:
+                    timeout = (cost - self.tokens) / self.rate
+                try:
+                    await asyncio.wait_for(self._condition.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def release(self, refund: float = 0.0):
+        """Return a session slot (and budget Azure did not consume)."""
+        async with self._condition:
+            self.active -= 1
+            self.tokens = min(self.capacity, self.tokens + refund)
+            self._condition.notify_all()
@@ -0,0 +1,170 @@
+"""
+Feature Taxonomy
+Features, their sub-features and category packs, and the single keyword
+automaton that attributes a sentence to every matching feature at once
+"""
+
+import hashlib
+import json
+import re
+from typing import Dict, Iterable, List, Optional, Sequence, Set
+
+from services.lru_cache import LRUCache
+
+MATCHER_CACHE_SIZE = 128  # compiled feature sets kept per process
+
+
+class FeatureTaxonomy:
+    """Feature hierarchy (parent -> sub-features) plus named packs of top-level features.
+
+    Language independent: the keywords of every feature, sub-features
+    included, live in the per-language lexicon shards.
+    """
+
+    def __init__(
+        self,
+        children: Optional[Dict[str, List[str]]] = None,
+        packs: Optional[Dict[str, List[str]]] = None,
+        default_pack: Optional[str] = None,
+    ):
+        self.children = {parent: list(kids) for parent, kids in (children or {}).items()}
+        self.packs = {name: list(features) for name, features in (packs or {}).items()}
+        self.default_pack = default_pack
+        self.parents: Dict[str, str] = {}
+        for parent, kids in self.children.items():
+            for child in kids:
+                if child in self.parents:
+                    raise ValueError(f"Feature {child!r} has two parents")
+                self.parents[child] = parent
+        for feature in self.parents:
+            self.ancestors(feature)  # raises on cycles
+        if default_pack is not None and default_pack not in self.packs:
+            raise ValueError(f"Unknown default pack: {default_pack}")
+
+    @classmethod
+    def from_dict(cls, data: Optional[dict]) -> "FeatureTaxonomy":
+        data = data or {}
+        return cls(data.get("children"), data.get("packs"), data.get("default_pack"))
+
+    def to_dict(self) -> dict:
+        return {"children": self.children, "packs": self.packs, "default_pack": self.default_pack}
+
+    @property
+    def nodes(self) -> Set[str]:
+        return set(self.children) | set(self.parents)
+
+    def ancestors(self, feature: str) -> List[str]:
+        """Parent, grandparent, ... of a feature."""
+        ancestors = []
+        while feature in self.parents:
+            feature = self.parents[feature]
+            if feature in ancestors:
+                raise ValueError(f"Feature taxonomy has a cycle through {feature!r}")
+            ancestors.append(feature)
+        return ancestors
+
+    def expand(self, features: Iterable[str]) -> List[str]:
+        """The features followed by their sub-features (depth first), without duplicates."""
+        expanded = {}
+        stack = list(reversed(list(features)))
+        while stack:
+            feature = stack.pop()
+            if feature not in expanded:
+                expanded[feature] = None
+                stack.extend(reversed(self.children.get(feature, ())))
+        return list(expanded)
+
+    def roots(self, features: Sequence[str]) -> List[str]:
+        """The features that have no ancestor among `features`."""
+        selected = set(features)
+        return [f for f in features if not selected.intersection(self.ancestors(f))]
+
+    def pack(self, name: Optional[str] = None) -> Optional[List[str]]:
+        """Top-level features of a pack (the default one when name is None)."""
+        name = name or self.default_pack
+        if name is None:
+            return None
+        if name not in self.packs:
+            raise ValueError(f"Unknown feature pack: {name}")
+        return list(self.packs[name])
+
+
+def _trie_pattern(words: Iterable[str]) -> str:
+    """Regex alternation of `words` factored into a prefix trie, longest match first.
+
+    At each position the engine follows one trie path instead of trying every
+    keyword in turn, so the cost does not grow with the number of keywords.
+    """
+    trie: dict = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[""] = {}
+
+    def emit(node: dict) -> str:
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie) or "(?!)"
+
+
+class FeatureMatcher:
+    """One compiled pattern over the keywords of a set of features.
+
+    A single scan of a sentence yields every feature it mentions, with each
+    matched sub-feature also attributed to its ancestors in the set (rollups
+    are resolved bottom-up when the matcher is built, not per sentence).
+    Like per-feature keyword search, keywords match case-insensitively
+    anywhere in the sentence.
+    """
+
+    def __init__(self, keywords: Dict[str, List[str]], taxonomy: FeatureTaxonomy):
+        self.features = list(keywords)
+        owners: Dict[str, Set[str]] = {}
+        for feature, words in keywords.items():
+            targets = {feature}.union(a for a in taxonomy.ancestors(feature) if a in keywords)
+            for word in words:
+                owners.setdefault(word.lower(), set()).update(targets)
+
+        # The scan reports the longest keyword starting at each position, which
+        # implies every shorter keyword that is a prefix of it
+        self._owners = {}
+        for word, targets in owners.items():
+            implied = set(targets)
+            for i in range(1, len(word)):
+                implied.update(owners.get(word[:i], ()))
+            self._owners[word] = frozenset(implied)
+
+        # Zero-width lookahead: keywords starting at every position are found,
+        # including ones overlapping a previous match
+        self._pattern = re.compile(f"(?=({_trie_pattern(owners)}))", re.IGNORECASE)
+
+    def match(self, text: str, start: int = 0, end: Optional[int] = None) -> Set[str]:
+        """Features (and their ancestors) mentioned in text[start:end]."""
+        found: Set[str] = set()
+        owners = self._owners
+        for match in self._pattern.finditer(text, start, len(text) if end is None else end):
+            found.update(owners.get(match.group(1).lower(), ()))
+        return found
+
+
+def definition_hash(keywords: Dict[str, List[str]], taxonomy: FeatureTaxonomy) -> str:
+    """Content hash of everything a FeatureMatcher is compiled from."""
+    ancestors = {feature: taxonomy.ancestors(feature) for feature in keywords}
+    canonical = json.dumps([list(keywords.items()), ancestors], ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+# Keyed by content, so any caller sending the same definitions reuses the matcher
+matcher_cache: LRUCache[FeatureMatcher] = LRUCache(MATCHER_CACHE_SIZE)
+
+
+def compiled_matcher(keywords: Dict[str, List[str]], taxonomy: FeatureTaxonomy) -> FeatureMatcher:
+    """Cached FeatureMatcher for these keyword definitions (compiled on a miss)."""
+    return matcher_cache.get_or_create(
+        definition_hash(keywords, taxonomy), lambda: FeatureMatcher(keywords, taxonomy)
+    )
@@ -5,20 +5,68 @@ Handles YouTube audio download and Azure Speech transcription
 
 import os
 from threading import Thread, Lock
-from time import sleep
-from yt_dlp import YoutubeDL
-import azure.cognitiveservices.speech as speechsdk
-from pydub import AudioSegment
-from pydub.utils import which
+from services.audio_conversion import conversion_pool
+from services.captions import flatten_captions, select_caption_track
+from services.language_service import RECOGNITION_LOCALES
+from services.pipeline import pipeline
+from services.segment_store import SegmentStore
+from services.vad import trim_silence
 
-AudioSegment.converter = which("ffmpeg") or os.environ.get("FFMPEG_BINARY")
-AudioSegment.ffprobe = which("ffprobe") or os.environ.get("FFPROBE_BINARY")
+# Longest video accepted for analysis (checked before anything is downloaded)
+MAX_VIDEO_SECONDS = int(os.getenv("MAX_VIDEO_SECONDS", "5400"))
 
-if AudioSegment.converter is None or AudioSegment.ffprobe is None:
-    print(
-        "WARNING: ffmpeg/ffprobe not found on PATH and FFMPEG_BINARY/FFPROBE_BINARY not set."
-        " Install ffmpeg or set env vars. Continue anyway (conversion will fail later)."
-    )
+# Transcript written when recognition finds no speech at all
+NO_SPEECH_TRANSCRIPT = "[No speech detected]"
+
+# yt-dlp, the Azure Speech SDK and pydub are heavy to import (extractor
+# registry, native library, ffmpeg PATH lookups), so they are loaded on
+# first use rather than when the routes are imported.
+YoutubeDL = None
+speechsdk = None
+AudioSegment = None
+
+
+def _load_yt_dlp():
+    """Import yt-dlp on first use."""
+    global YoutubeDL
+    if YoutubeDL is None:
+        from yt_dlp import YoutubeDL as youtube_dl
+
+        YoutubeDL = youtube_dl
+    return YoutubeDL
+
+
+def _load_speechsdk():
+    """Import the Azure Speech SDK on first use."""
+    global speechsdk
+    if speechsdk is None:
+        import azure.cognitiveservices.speech as sdk
+
+        speechsdk = sdk
+    return speechsdk
+
+
+def _load_pydub():
+    """Import pydub and locate ffmpeg/ffprobe on first use."""
+    global AudioSegment
+    if AudioSegment is None:
+        from pydub import AudioSegment as audio_segment
+        from pydub.utils import which
+
+        audio_segment.converter = which("ffmpeg") or os.environ.get("FFMPEG_BINARY")
+        audio_segment.ffprobe = which("ffprobe") or os.environ.get("FFPROBE_BINARY")
+
+        if audio_segment.converter is None or audio_segment.ffprobe is None:
+            print(
+                "WARNING: ffmpeg/ffprobe not found on PATH and FFMPEG_BINARY/FFPROBE_BINARY not set."
+                " Install ffmpeg or set env vars. Continue anyway (conversion will fail later)."
+            )
+        AudioSegment = audio_segment
+    return AudioSegment
+
+
+class VideoRejected(Exception):
+    """Raised when pre-flight metadata rules a video out before download."""
 
 
 class TranscriptionService:
@@ -32,8 +80,18 @@ class TranscriptionService:
         youtube_url=None,
         filename=None,
         platform=None,
+        autostart=False,
+        language=None,
+        record_segments=True,
     ):
-        """Initialize transcription service."""
+        """Initialize transcription service.
+
+        `language` ("en", "pl") forces the recognition locale; None lets Azure
+        auto-detect among RECOGNITION_LOCALES. Work begins only on start()
+        (or with autostart=True), never as a side effect of construction.
+        `record_segments=False` skips the timed segment files, for callers
+        that only need the final text.
+        """
         # Keep this check to prevent re-initialization
         if hasattr(self, "_initialized"):
             return
@@ -45,6 +103,7 @@ class TranscriptionService:
             youtube_url or "https://www.youtube.com/shorts/cJUVXUF7GNg?feature=share"
         )
         self.platform = platform or "youtube"
+        self.language = language
 
         # Use custom filename prefix to avoid conflicts
         if filename is None:
@@ -53,8 +112,15 @@ class TranscriptionService:
         self.output_path = os.path.join(static_dir, f"{filename}.%(ext)s")
         self.audio_mp3 = os.path.join(static_dir, f"{filename}.mp3")
         self.audio_wav = os.path.join(static_dir, f"{filename}.wav")
+        self.speech_wav = os.path.join(static_dir, f"{filename}.speech.wav")
         self.transcript_file = os.path.join(static_dir, f"{filename}.txt")
+        self.segments = SegmentStore(os.path.join(static_dir, filename))
+        self.record_segments = record_segments
 
+        self.offset_map = None  # trimmed -> original time, set when silence was cut
+        self.duration = None  # seconds, from pre-flight metadata
+        self.caption_text = None  # platform captions, when they make recognition unnecessary
+        self.error = None  # why the background workflow failed, if it did
         self._transcription_done = False
         self._transcription_started = False
         self._initialized = True
@@ -63,9 +129,22 @@ class TranscriptionService:
         print(f"  URL: {self.youtube_url}")
         print(f"  Filename: {filename}")
         print(f"  Azure region: {azure_region}")
-        print(f"  ffmpeg: {AudioSegment.converter}")
 
-        # Start background transcription
+        # Start background transcription (the async pipeline drives stages itself)
+        if autostart:
+            self.start()
+
+    @property
+    def state(self):
+        """created, running, done or failed."""
+        if self._transcription_done:
+            return "done"
+        if self.error is not None:
+            return "failed"
+        return "running" if self._transcription_started else "created"
+
+    def start(self):
+        """Start the background download/transcription workflow (idempotent)."""
         self._start_background_process()
 
     def _start_background_process(self):
@@ -80,92 +159,177 @@ class TranscriptionService:
         """Complete transcription workflow."""
         try:
             print("=== Starting transcription workflow ===")
-            self._download_and_prepare_audio()
-            if os.path.exists(self.audio_wav):
-                print(f"WAV file exists: {self.audio_wav}")
-                self._transcribe_audio_full(self.audio_wav)
-            else:
-                print(f"ERROR: WAV file not found: {self.audio_wav}")
+            self._preflight()
+            if self.caption_text is not None:
+                self._save_transcript([self.caption_text])
+                return
+            # Media stages wait for a batch-lane slot, like pipeline analyses
+            with pipeline.scheduled("batch", self.duration):
+                self._download_audio()
+                self._convert_audio()
+                if os.path.exists(self.audio_wav):
+                    print(f"WAV file exists: {self.audio_wav}")
+                    self._trim_audio()
+                    self._transcribe_audio_full()
+                else:
+                    print(f"ERROR: WAV file not found: {self.audio_wav}")
         except Exception as e:
             print(f"ERROR in transcription workflow: {e}")
+            self.error = str(e)
             import traceback
 
             traceback.print_exc()
+        finally:
+            if not self._transcription_done and self.error is None:
+                self.error = "Transcription finished without a transcript"
+
+    def _preflight(self):
+        """Read video metadata without downloading media.
 
-    def _download_and_prepare_audio(self):
-        """Download audio from video platform and convert to WAV 16kHz mono."""
-        print("=== Download and prepare audio ===")
+        Rejects videos longer than MAX_VIDEO_SECONDS and, when the platform has
+        captions in the target language, fetches them into caption_text.
+        """
+        if os.path.exists(self.audio_mp3) or os.path.exists(self.audio_wav):
+            return
 
+        ydl_opts = {"quiet": True, "no_warnings": True, "noplaylist": True, "skip_download": True}
+        try:
+            with _load_yt_dlp()(ydl_opts) as ydl:
+                info = ydl.extract_info(self.youtube_url, download=False)
+                self.duration = info.get("duration")
+                if self.duration and self.duration > MAX_VIDEO_SECONDS:
+                    raise VideoRejected(
+                        f"Video is {self.duration / 60:.0f} min long;"
+                        f" the limit is {MAX_VIDEO_SECONDS / 60:.0f} min"
+                    )
+
+                languages = [self.language] if self.language else list(RECOGNITION_LOCALES)
+                selected = select_caption_track(info, languages)
+                if selected is None:
+                    return
+                language, track = selected
+                data = ydl.urlopen(track["url"]).read().decode("utf-8", errors="replace")
+        except VideoRejected:
+            raise
+        except Exception as e:
+            # Pre-flight is an optimization; the download reports real failures
+            print(f"WARNING: pre-flight metadata unavailable: {e}")
+            return
+
+        text = flatten_captions(data, track["ext"])
+        if text:
+            self.caption_text = text
+            self.language = language
+            print(f"✅ Using {language} captions ({len(text)} characters), skipping recognition")
+
+    def _download_format(self):
+        """yt-dlp format selector for the current platform."""
+        # TikTok and some other platforms require richer formats.
+        return "bestaudio/best" if self.platform in {"tiktok", "vimeo"} else "worstaudio"
+
+    def _download_audio(self):
+        """Download audio as MP3 unless it is already present."""
         # Check if MP3 already exists
         if os.path.exists(self.audio_mp3):
             print(f"✓ Audio file already exists: {self.audio_mp3}")
-        else:
-            # TikTok and some other platforms require richer formats.
-            download_format = (
-                "bestaudio/best" if self.platform in {"tiktok", "vimeo"} else "worstaudio"
-            )
-            ydl_opts = {
-                "format": download_format,
-                "outtmpl": self.output_path,
-                "postprocessors": [
-                    {
-                        "key": "FFmpegExtractAudio",
-                        "preferredcodec": "mp3",
-                        "preferredquality": "192",
-                    },
-                ],
-                "noplaylist": True,
-                "quiet": False,
-                "no_warnings": False,
-            }
-            print(f"Downloading audio from: {self.youtube_url}")
-            try:
-                with YoutubeDL(ydl_opts) as ydl:
-                    ydl.download([self.youtube_url])
-                print(f"✅ Downloaded: {self.audio_mp3}")
-            except Exception as e:
-                print(f"ERROR downloading audio: {e}")
-                raise
-
-        # Convert to WAV if needed
-        if not os.path.exists(self.audio_wav):
-            print("Converting audio to WAV format...")
-            try:
-                # pydub uses ffmpeg/ffprobe: ensure they are available
-                sound = AudioSegment.from_file(self.audio_mp3, format="mp3")
-                sound = sound.set_channels(1).set_frame_rate(16000)
-                sound.export(self.audio_wav, format="wav")
-                print(f"✅ Converted to WAV: {self.audio_wav}")
-
-                # Verify file size
-                wav_size = os.path.getsize(self.audio_wav)
-                print(f"WAV file size: {wav_size} bytes")
-            except Exception as e:
-                print(f"ERROR converting audio: {e}")
-                raise
-        else:
+            return
+
+        ydl_opts = {
+            "format": self._download_format(),
+            "outtmpl": self.output_path,
+            "postprocessors": [
+                {
+                    "key": "FFmpegExtractAudio",
+                    "preferredcodec": "mp3",
+                    "preferredquality": "192",
+                },
+            ],
+            "noplaylist": True,
+            "quiet": False,
+            "no_warnings": False,
+        }
+        print(f"Downloading audio from: {self.youtube_url}")
+        try:
+            with _load_yt_dlp()(ydl_opts) as ydl:
+                ydl.download([self.youtube_url])
+            print(f"✅ Downloaded: {self.audio_mp3}")
+        except Exception as e:
+            print(f"ERROR downloading audio: {e}")
+            raise
+
+    def _convert_audio(self):
+        """Convert the downloaded MP3 to WAV 16kHz mono unless already converted."""
+        if os.path.exists(self.audio_wav):
             print(f"✓ WAV file already exists: {self.audio_wav}")
+            return
 
-    def _transcribe_audio_full(self, filepath):
-        """Transcribe audio file using Azure Speech Services."""
-        print("=== Starting transcription ===")
+        print("Converting audio to WAV format...")
+        try:
+            # pydub holds the GIL while resampling, so convert out of process
+            result = conversion_pool.convert(self.audio_mp3, self.audio_wav)
+            print(f"✅ Converted to WAV: {result.path}")
+            print(f"WAV file size: {result.size} bytes ({result.duration:.1f}s)")
+        except Exception as e:
+            print(f"ERROR converting audio: {e}")
+            raise
+
+    @property
+    def recognition_audio(self):
+        """WAV sent to Azure: the speech-only file when silence was trimmed."""
+        return self.speech_wav if self.offset_map is not None else self.audio_wav
 
-        if not self.azure_key or not self.azure_region:
-            print("ERROR: Azure credentials not configured!")
-            print(f"  Key: {'SET' if self.azure_key else 'NOT SET'}")
-            print(f"  Region: {self.azure_region}")
+    def _trim_audio(self):
+        """Cut non-speech stretches from the WAV, keeping an offset map to original time."""
+        try:
+            result = trim_silence(self.audio_wav, self.speech_wav)
+        except Exception as e:
+            # Trimming is an optimization; recognize the full file if it fails
+            print(f"WARNING: silence trimming failed: {e}")
+            return
+        if result is None:
+            print("Silence trimming skipped (nothing worth cutting)")
             return
+        self.offset_map = result.offset_map
+        print(
+            f"✅ Trimmed silence: {result.original_seconds:.1f}s -> {result.trimmed_seconds:.1f}s"
+        )
 
-        if not os.path.exists(filepath):
-            print(f"ERROR: Audio file not found: {filepath}")
+    def _reset_segments(self):
+        """Start an empty segment log before a recognition pass."""
+        if self.record_segments:
+            self.segments.reset()
+
+    def _record_segment(self, result):
+        """Persist a recognized segment with its time in the original video."""
+        if not self.record_segments:
             return
+        # The SDK reports offset and duration in 100 ns ticks
+        start = result.offset / 10_000_000
+        end = start + result.duration / 10_000_000
+        if self.offset_map is not None:
+            start = self.offset_map.to_original(start)
+            end = max(start, self.offset_map.to_original(end))
+        self.segments.append(start, end, result.text)
+
+    def _transcribe_audio_full(self):
+        """Transcribe the recognition audio using Azure Speech Services.
+
+        The session runs on the shared analysis pipeline, so background jobs
+        are admitted by the same speech quota (session cap, audio budget,
+        throttling backoff) as video analyses.
+        """
+        print("=== Starting transcription ===")
+
+        filepath = self.recognition_audio
+        if not os.path.exists(filepath):
+            raise FileNotFoundError(f"Audio file not found: {filepath}")
 
         file_size = os.path.getsize(filepath)
         print(f"Transcribing file: {filepath} ({file_size} bytes)")
 
         # Debug: print audio diagnostics using pydub
         try:
-            dbg = AudioSegment.from_wav(filepath)
+            dbg = _load_pydub().from_wav(filepath)
             print("DEBUG audio duration (s):", len(dbg) / 1000.0)
             print("DEBUG channels:", dbg.channels)
             print("DEBUG frame_rate:", dbg.frame_rate)
@@ -173,137 +337,71 @@ class TranscriptionService:
         except Exception as ex:
             print("DEBUG: failed to read WAV with pydub:", ex)
 
-        try:
-            speech_config = speechsdk.SpeechConfig(
-                subscription=self.azure_key, region=self.azure_region
-            )
-            speech_config.speech_recognition_language = "en-US"
+        # Blocks this workflow thread, not the pipeline loop
+        return pipeline.submit(pipeline.transcribe(self)).result()
 
-            audio_config = speechsdk.audio.AudioConfig(filename=filepath)
-            recognizer = speechsdk.SpeechRecognizer(
+    def _create_recognizer(self, filepath):
+        """Build a continuous-recognition SpeechRecognizer for a WAV file."""
+        speechsdk = _load_speechsdk()
+        speech_config = speechsdk.SpeechConfig(
+            subscription=self.azure_key, region=self.azure_region
+        )
+        audio_config = speechsdk.audio.AudioConfig(filename=filepath)
+
+        locale = RECOGNITION_LOCALES.get(self.language)
+        if locale:
+            speech_config.speech_recognition_language = locale
+            return speechsdk.SpeechRecognizer(
                 speech_config=speech_config, audio_config=audio_config
             )
 
-            all_text = []
+        # Unknown language: let Azure identify it continuously among the supported locales
+        speech_config.set_property(
+            speechsdk.PropertyId.SpeechServiceConnection_LanguageIdMode, "Continuous"
+        )
+        auto_detect = speechsdk.languageconfig.AutoDetectSourceLanguageConfig(
+            languages=list(RECOGNITION_LOCALES.values())
+        )
+        return speechsdk.SpeechRecognizer(
+            speech_config=speech_config,
+            audio_config=audio_config,
+            auto_detect_source_language_config=auto_detect,
+        )
 
-            def recognizing(evt):
-                # partial results
-                try:
-                    print(f"Recognizing: {evt.result.text}")
-                except Exception:
-                    pass
+    def _save_transcript(self, all_text):
+        """Join recognized segments, write them to the transcript file and return the text."""
+        full_text = " ".join(all_text).strip()
 
-            def recognized(evt):
-                try:
-                    if evt.result and evt.result.text:
-                        print(f"✓ Recognized: {evt.result.text}")
-                        all_text.append(evt.result.text)
-                except Exception:
-                    pass
+        print(f"=== Transcription complete ===")
+        print(f"Recognized {len(all_text)} segments")
+        print(f"Total text length: {len(full_text)} characters")
 
-            def canceled(evt):
-                # More detailed cancellation logging
-                print("Recognition canceled event:", evt)
-                try:
-                    print("  Cancellation reason:", evt.reason)
-                except Exception:
-                    pass
-                try:
-                    # Try to obtain CancellationDetails from the SDK
-                    details = speechsdk.CancellationDetails(evt.result)
-                    print("  cancellation.reason:", details.reason)
-                    print("  cancellation.error_details:", details.error_details)
-                except Exception:
-                    try:
-                        print("  error_details:", getattr(evt, "error_details", None))
-                    except Exception:
-                        pass
-
-            def session_started(evt):
-                print("Session started")
-
-            def session_stopped(evt):
-                print("Session stopped")
-
-            recognizer.recognizing.connect(recognizing)
-            recognizer.recognized.connect(recognized)
-            recognizer.canceled.connect(canceled)
-            recognizer.session_started.connect(session_started)
-            recognizer.session_stopped.connect(session_stopped)
-
-            done = False
-
-            def stop(evt):
-                nonlocal done
-                print("Stopping recognition...")
-                done = True
-
-            recognizer.session_stopped.connect(stop)
-            recognizer.canceled.connect(stop)
-
-            print("Starting continuous recognition...")
-            recognizer.start_continuous_recognition()
-
-            # Wait for recognition to complete (with timeout)
-            timeout = 1200  # 20 minutes
-            elapsed = 0.0
-            while not done and elapsed < timeout:
-                sleep(0.5)
-                elapsed += 0.5
-                if int(elapsed) % 5 == 0:
-                    print(f"Still recognizing... ({elapsed:.1f}s elapsed)")
-
-            if elapsed >= timeout:
-                print("WARNING: Recognition timeout!")
-
-            recognizer.stop_continuous_recognition()
-
-            # Save transcription
-            full_text = " ".join(all_text).strip()
-
-            print(f"=== Transcription complete ===")
-            print(f"Recognized {len(all_text)} segments")
-            print(f"Total text length: {len(full_text)} characters")
-
-            if full_text:
-                with open(self.transcript_file, "w", encoding="utf-8") as f:
-                    f.write(full_text)
-                print(f"✅ Transcription saved to {self.transcript_file}")
-
-                # Verify file was written
-                if os.path.exists(self.transcript_file):
-                    saved_size = os.path.getsize(self.transcript_file)
-                    print(f"Transcript file size: {saved_size} bytes")
-                else:
-                    print("ERROR: Transcript file was not created!")
+        if full_text:
+            with open(self.transcript_file, "w", encoding="utf-8") as f:
+                f.write(full_text)
+            print(f"✅ Transcription saved to {self.transcript_file}")
 
-                self._transcription_done = True
+            # Verify file was written
+            if os.path.exists(self.transcript_file):
+                saved_size = os.path.getsize(self.transcript_file)
+                print(f"Transcript file size: {saved_size} bytes")
             else:
-                print("⚠️  WARNING: No text was transcribed!")
-                print("This could mean:")
-                print("  - Audio file is silent or corrupted")
-                print("  - Azure Speech API issue")
-                print("  - Wrong language setting (currently: en-UA)")
-
-                # Write empty file to indicate completion
-                with open(self.transcript_file, "w", encoding="utf-8") as f:
-                    f.write("[No speech detected]")
-                print(f"Empty transcript saved to {self.transcript_file}")
-
-            # --------------------------------------------------------
-            # DEBUG NOTE: keep WAV for inspection instead of deleting it.
-            # Comment out deletion while debugging. Restore when stable.
-            # --------------------------------------------------------
-            if os.path.exists(filepath):
-                # os.remove(filepath)
-                print(f"(DEBUG) WAV preserved for inspection: {filepath}")
-            # --------------------------------------------------------
+                print("ERROR: Transcript file was not created!")
 
-        except Exception as e:
-            print(f"ERROR during transcription: {e}")
-            import traceback
-
-            traceback.print_exc()
+            self._transcription_done = True
+            return full_text
+        else:
+            print("⚠️  WARNING: No text was transcribed!")
+            print("This could mean:")
+            print("  - Audio file is silent or corrupted")
+            print("  - Azure Speech API issue")
+            print("  - Wrong language setting (currently: en-UA)")
+
+            # Write empty file to indicate completion
+            with open(self.transcript_file, "w", encoding="utf-8") as f:
+                f.write(NO_SPEECH_TRANSCRIPT)
+            print(f"Empty transcript saved to {self.transcript_file}")
+            return NO_SPEECH_TRANSCRIPT
 
     def quick_recognize_once(self, filepath):
         """Helper: single-shot recognition for quick tests."""
@@ -311,6 +409,7 @@ class TranscriptionService:
         if not os.path.exists(filepath):
             print("ERROR: file not found:", filepath)
             return
+        speechsdk = _load_speechsdk()
         try:
             speech_config = speechsdk.SpeechConfig(
                 subscription=self.azure_key, region=self.azure_region
@@ -336,6 +435,48 @@ class TranscriptionService:
         except Exception as e:
             print("ERROR in quick_recognize_once:", e)
 
+    def remove_files(self):
+        """Delete the job's audio, transcript and segment files (missing ones are skipped)."""
+        paths = (
+            self.audio_mp3,
+            self.audio_wav,
+            self.speech_wav,
+            self.transcript_file,
+            self.segments.index_path,
+            self.segments.text_path,
+        )
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as e:
+                print(f"Warning: File cleanup failed: {e}")
+
+    def content_version(self):
+        """Cheap transcript version: (tag, mtime or None), without reading any text.
+
+        A written transcript is versioned by its size and mtime; an in-progress
+        one by how many segments have been recognized so far.
+        """
+        try:
+            stat = os.stat(self.transcript_file)
+        except FileNotFoundError:
+            return f"s{len(self.segments)}", None
+        return f"f{stat.st_size}-{stat.st_mtime_ns}", stat.st_mtime
+
+    def get_transcript_since(self, cursor):
+        """Text recognized after `cursor` (a segment count); returns (text, next cursor).
+
+        Transcripts without timed segments (e.g. from captions) count as one segment.
+        """
+        if self.segments.refresh():
+            new = self.segments.since(cursor)
+            return " ".join(segment.text for segment in new), cursor + len(new)
+        if cursor == 0 and self._transcription_done:
+            return self.get_transcript_text() or "", 1
+        return "", cursor
+
     def is_transcription_done(self):
         """Check if transcription is complete."""
         return self._transcription_done
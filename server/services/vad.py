@@ -0,0 +1,150 @@
+"""
+Voice Activity Detection
+Trims silence and non-speech stretches from 16 kHz mono WAV files before
+recognition, keeping a map from trimmed time back to original time
+"""
+
+import wave
+from bisect import bisect_right
+from dataclasses import dataclass
+from typing import List, Optional
+
+FRAME_MS = 30
+PADDING_MS = 300  # speech kept on both sides of a voiced region
+MIN_SILENCE_MS = 800  # shorter pauses are kept as they are
+KEEP_SILENCE_MS = 200  # what a longer pause is compressed to
+MIN_SAVING = 0.05  # below this fraction the original file is used as is
+
+ENERGY_MARGIN_DB = 12.0  # above the noise floor: voiced speech
+WEAK_ENERGY_MARGIN_DB = 6.0  # above the noise floor with high ZCR: fricatives
+FRICATIVE_ZCR = 0.25
+SILENCE_FLOOR_DB = -60.0  # frames quieter than this are never speech
+
+# NumPy is only needed by the preprocessing stage, so import it on first use
+np = None
+
+
+def _load_numpy():
+    global np
+    if np is None:
+        import numpy
+
+        np = numpy
+    return np
+
+
+@dataclass(slots=True)
+class OffsetMap:
+    """Piecewise-linear map from trimmed audio time to original audio time (seconds)."""
+
+    trimmed_starts: List[float]
+    original_starts: List[float]
+
+    def to_original(self, seconds: float) -> float:
+        index = max(0, bisect_right(self.trimmed_starts, seconds) - 1)
+        return self.original_starts[index] + (seconds - self.trimmed_starts[index])
+
+
+@dataclass(slots=True)
+class TrimResult:
+    path: str
+    original_seconds: float
+    trimmed_seconds: float
+    offset_map: OffsetMap
+
+
+def speech_mask(samples, frame_rate: int):
+    """Per-frame speech decision from RMS energy and zero-crossing rate."""
+    np = _load_numpy()
+    frame = frame_rate * FRAME_MS // 1000
+    count = len(samples) // frame
+    frames = samples[: count * frame].reshape(count, frame).astype(np.float32) / 32768.0
+
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+    energy_db = 20.0 * np.log10(np.maximum(rms, 1e-6))
+    signs = np.signbit(frames)
+    zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / frame
+
+    floor = max(np.percentile(energy_db, 10), SILENCE_FLOOR_DB)
+    voiced = energy_db > floor + ENERGY_MARGIN_DB
+    fricative = (energy_db > floor + WEAK_ENERGY_MARGIN_DB) & (zcr > FRICATIVE_ZCR)
+    return (voiced | fricative) & (energy_db > SILENCE_FLOOR_DB)
+
+
+def _regions(mask):
+    """[start, end) frame indices of True runs."""
+    np = _load_numpy()
+    edges = np.diff(np.concatenate(([0], mask.astype(np.int8), [0])))
+    return np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)
+
+
+def speech_regions(mask):
+    """Padded speech regions with short pauses merged, as [start, end) frame arrays."""
+    np = _load_numpy()
+    padding = PADDING_MS // FRAME_MS
+    if padding:
+        # Dilate: a frame is kept if any speech frame lies within `padding` frames
+        kernel = np.ones(2 * padding + 1, dtype=np.int32)
+        mask = np.convolve(mask.astype(np.int32), kernel, mode="same") > 0
+
+    starts, ends = _regions(mask)
+    if len(starts) > 1:
+        # Merge regions separated by pauses shorter than MIN_SILENCE_MS
+        gaps = starts[1:] - ends[:-1]
+        keep = np.concatenate(([True], gaps * FRAME_MS >= MIN_SILENCE_MS))
+        starts = starts[keep]
+        ends = np.concatenate((ends[:-1][keep[1:]], ends[-1:]))
+    return starts, ends
+
+
+def trim_silence(source: str, target: str) -> Optional[TrimResult]:
+    """Write the speech-only version of `source` to `target`.
+
+    Long non-speech stretches are compressed to KEEP_SILENCE_MS. Returns None
+    (and writes nothing) when there is no speech or too little to gain.
+    """
+    np = _load_numpy()
+    with wave.open(source, "rb") as audio:
+        params = audio.getparams()
+        pcm = audio.readframes(params.nframes)
+    if params.nchannels != 1 or params.sampwidth != 2:
+        return None
+
+    samples = np.frombuffer(pcm, dtype="<i2")
+    frame_rate = params.framerate
+    original_seconds = len(samples) / frame_rate
+
+    mask = speech_mask(samples, frame_rate)
+    if not mask.any():
+        return None
+    starts, ends = speech_regions(mask)
+
+    frame = frame_rate * FRAME_MS // 1000
+    gap = np.zeros(frame_rate * KEEP_SILENCE_MS // 1000, dtype=samples.dtype)
+    pieces, trimmed_starts, original_starts = [], [], []
+    position = 0
+    for start, end in zip(starts * frame, np.minimum(ends * frame, len(samples))):
+        if pieces:
+            pieces.append(gap)
+            position += len(gap)
+        trimmed_starts.append(position / frame_rate)
+        original_starts.append(start / frame_rate)
+        pieces.append(samples[start:end])
+        position += end - start
+
+    trimmed_seconds = position / frame_rate
+    if trimmed_seconds > original_seconds * (1 - MIN_SAVING):
+        return None
+
+    with wave.open(target, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(frame_rate)
+        out.writeframes(np.concatenate(pieces).tobytes())
+
+    return TrimResult(
+        path=target,
+        original_seconds=original_seconds,
+        trimmed_seconds=trimmed_seconds,
+        offset_map=OffsetMap(trimmed_starts, original_starts),
+    )
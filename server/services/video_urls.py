@@ -0,0 +1,64 @@
+"""
+Video URLs
+Platform detection and canonical video keys for submitted URLs
+"""
+
+import re
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+# Domain fragment -> platform name
+SUPPORTED_PLATFORMS = {
+    "youtube.com": "youtube",
+    "youtu.be": "youtube",
+    "vimeo.com": "vimeo",
+    "tiktok.com": "tiktok",
+    "vm.tiktok.com": "tiktok",
+}
+
+YOUTUBE_PATH_ID = re.compile(r"^/(?:shorts|embed|live|v)/([\w-]{6,})")
+VIMEO_ID = re.compile(r"^/(?:video/)?(\d+)")
+TIKTOK_ID = re.compile(r"/video/(\d+)")
+
+
+def detect_platform(url: str) -> Optional[str]:
+    """Platform name for a supported video URL, else None."""
+    for domain, platform_name in SUPPORTED_PLATFORMS.items():
+        if domain in url:
+            return platform_name
+    return None
+
+
+def canonical_video_key(url: str, platform: Optional[str] = None) -> str:
+    """Stable key for the video behind a URL, e.g. "youtube:cJUVXUF7GNg".
+
+    Share links, shorts/embed paths and tracking parameters of the same video
+    map to the same key; URLs whose id cannot be found fall back to the URL
+    without query string and fragment.
+    """
+    platform = platform or detect_platform(url)
+    parsed = urlparse(url.strip())
+    host = parsed.netloc.lower()
+    path = parsed.path.rstrip("/")
+
+    video_id = None
+    if platform == "youtube":
+        if host.endswith("youtu.be"):
+            video_id = path.lstrip("/") or None
+        else:
+            video_id = parse_qs(parsed.query).get("v", [None])[0]
+            if video_id is None:
+                match = YOUTUBE_PATH_ID.match(path)
+                video_id = match.group(1) if match else None
+    elif platform == "vimeo":
+        match = VIMEO_ID.match(path)
+        video_id = match.group(1) if match else None
+    elif platform == "tiktok":
+        match = TIKTOK_ID.search(path)
+        video_id = match.group(1) if match else None
+
+    if video_id:
+        return f"{platform}:{video_id}"
+    if host.startswith("www."):
+        host = host[4:]
+    return f"{platform or 'url'}:{host}{path}"
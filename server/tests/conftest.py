@@ -52,6 +52,7 @@ def app():
         flask_app.config.update({
             "TESTING": True,
             "STATIC_DIR": temp_dir,
+            "ANALYSIS_DB": os.path.join(temp_dir, "analysis.db"),
             "AZURE_SPEECH_KEY": "test-key",
             "AZURE_SPEECH_REGION": "test-region",
         })
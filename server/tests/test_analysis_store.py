@@ -0,0 +1,141 @@
+"""
+Tests for the SQLite analysis store and canonical video keys.
+"""
+
+from services.analysis_store import AnalysisRecord, AnalysisStore
+from services.video_urls import canonical_video_key
+
+
+class TestCanonicalVideoKey:
+    """Test cases for canonical video keys."""
+
+    def test_youtube_url_variants_share_a_key(self):
+        """Test that watch, short-link, shorts and tracking URLs map to one key."""
+        urls = [
+            "https://www.youtube.com/watch?v=cJUVXUF7GNg&t=42s",
+            "https://youtu.be/cJUVXUF7GNg?si=share",
+            "https://www.youtube.com/shorts/cJUVXUF7GNg?feature=share",
+        ]
+        assert {canonical_video_key(url) for url in urls} == {"youtube:cJUVXUF7GNg"}
+
+
+class TestAnalysisStore:
+    """Test cases for AnalysisStore."""
+
+    def test_feature_query_by_model(self, tmp_path):
+        """Test that batched records are queryable by feature and normalized model."""
+        store = AnalysisStore(str(tmp_path / "analysis.db"))
+        battery = {"sentiment": "negative", "score": -0.4, "confidence": 0.4, "relevant_text": ["x"]}
+        store.record(AnalysisRecord("a", "youtube:a", "u1", model="Google Pixel 8", results={"battery": battery}))
+        store.record(AnalysisRecord("b", "youtube:b", "u2", model="iPhone 15", results={"battery": battery}))
+        store.record(AnalysisRecord("c", "youtube:c", "u3", status="failed", error="[No speech detected]"))
+        store.flush()
+
+        results = store.feature_sentiments("battery", model="pixel 8")
+
+        assert [r["job_id"] for r in results] == ["a"]
+        assert results[0]["relevant_text"] == ["x"]
+        assert len(store.feature_sentiments("battery")) == 2
+        assert store.latest_for_video("youtube:c") is None
+        assert store.latest_for_video("youtube:a")["results"]["battery"]["score"] == -0.4
+
+    def test_rollups_are_maintained_incrementally(self, tmp_path):
+        """Test that each new finished job is folded into the model rollups exactly once."""
+        store = AnalysisStore(str(tmp_path / "analysis.db"))
+        good = {"sentiment": "positive", "score": 0.6, "confidence": 0.6, "relevant_text": []}
+        bad = {"sentiment": "negative", "score": -0.2, "confidence": 0.2, "relevant_text": []}
+        store.record(AnalysisRecord("a", "youtube:a", "u1", model="Google Pixel 8",
+                                    results={"camera": good}))
+        store.record(AnalysisRecord("b", "youtube:b", "u2", model="Pixel 8",
+                                    results={"camera": bad}))
+        store.flush()
+        # Re-recording a known job must not count it twice
+        store.record(AnalysisRecord("a", "youtube:a", "u1", model="Google Pixel 8",
+                                    results={"camera": good}))
+        store.flush()
+
+        rollup = store.model_rollup("pixel 8")
+
+        assert rollup["videos"] == {"count": 2, "positive": 1, "negative": 1, "neutral": 0}
+        camera = rollup["features"]["camera"]
+        assert camera["count"] == 2
+        assert abs(camera["mean_score"] - 0.2) < 1e-9
+        assert abs(camera["weighted_score"] - (0.36 - 0.04) / 0.8) < 1e-9
+        assert store.model_rollup("iPhone 15") is None
+
+    def test_rewritten_job_drops_removed_features(self, tmp_path):
+        """Test that re-recording a job replaces its feature rows instead of merging them."""
+        store = AnalysisStore(str(tmp_path / "analysis.db"))
+        result = {"sentiment": "positive", "score": 0.5, "confidence": 0.5, "relevant_text": []}
+        store.record(AnalysisRecord("a", "youtube:a", "u1", model="Pixel 8",
+                                    results={"camera": result, "battery": result}))
+        store.flush()
+        store.record(AnalysisRecord("a", "youtube:a", "u1", model="Pixel 8", results={"camera": result}))
+        store.flush()
+
+        assert list(store.latest_for_video("youtube:a")["results"]) == ["camera"]
+        assert store.feature_sentiments("battery") == []
+
+    def test_reanalyzed_video_replaces_its_rollup_contribution(self, tmp_path):
+        """Test that analyzing the same video again under new job ids counts it once."""
+        store = AnalysisStore(str(tmp_path / "analysis.db"))
+        good = {"sentiment": "positive", "score": 0.6, "confidence": 0.6, "relevant_text": []}
+        bad = {"sentiment": "negative", "score": -0.2, "confidence": 0.2, "relevant_text": []}
+        store.record(AnalysisRecord("a1", "youtube:a", "u1", model="Pixel 8", results={"camera": bad}))
+        store.record(AnalysisRecord("b", "youtube:b", "u2", model="Pixel 8", results={"camera": good}))
+        store.flush()
+        store.record(AnalysisRecord("a2", "youtube:a", "u1", model="Pixel 8",
+                                    results={"camera": good, "battery": good}))
+        store.flush()
+
+        rollup = store.model_rollup("pixel 8")
+
+        assert rollup["videos"] == {"count": 2, "positive": 2, "negative": 0, "neutral": 0}
+        assert rollup["features"]["camera"]["count"] == 2
+        assert abs(rollup["features"]["camera"]["mean_score"] - 0.6) < 1e-9
+        assert rollup["features"]["battery"]["count"] == 1
+
+        # A re-analysis that extracts another model moves the video between models
+        store.record(AnalysisRecord("a3", "youtube:a", "u1", model="iPhone 15", results={"camera": bad}))
+        store.flush()
+
+        assert store.model_rollup("pixel 8")["videos"]["count"] == 1
+        assert "battery" not in store.model_rollup("pixel 8")["features"]
+        assert store.model_rollup("iPhone 15")["videos"] == {
+            "count": 1, "positive": 0, "negative": 1, "neutral": 0,
+        }
+
+    def test_batch_reads_run_inside_the_write_transaction(self, tmp_path):
+        """Test that a batch reads earlier analyses under the write lock, not before it."""
+        store = AnalysisStore(str(tmp_path / "analysis.db"))
+        counted = store._counted_analyses
+        in_transaction = []
+
+        def read(connection, video_keys):
+            in_transaction.append(connection.in_transaction)
+            return counted(connection, video_keys)
+
+        store._counted_analyses = read
+        good = {"sentiment": "positive", "score": 0.6, "confidence": 0.6, "relevant_text": []}
+        store.record(AnalysisRecord("a", "youtube:a", "u1", model="Pixel 8", results={"camera": good}))
+        store.flush()
+
+        assert in_transaction == [True]
+        assert store.model_rollup("pixel 8")["videos"]["count"] == 1
+
+    def test_sub_features_are_stored_as_dotted_features(self, tmp_path):
+        """Test that nested sub-feature results get their own rows and rollups but no vote."""
+        store = AnalysisStore(str(tmp_path / "analysis.db"))
+        good = {"sentiment": "positive", "score": 0.6, "confidence": 0.6, "relevant_text": []}
+        bad = {"sentiment": "negative", "score": -0.2, "confidence": 0.2, "relevant_text": []}
+        results = {"camera": {**good, "subfeatures": {"night_mode": bad, "zoom": bad}}}
+        store.record(AnalysisRecord("a", "youtube:a", "u1", model="Pixel 8", results=results))
+        store.flush()
+
+        assert [r["sentiment"] for r in store.feature_sentiments("camera.night_mode")] == ["negative"]
+        rollup = store.model_rollup("pixel 8")
+        assert rollup["videos"]["positive"] == 1
+        assert list(rollup["features"]) == ["camera", "camera.night_mode", "camera.zoom"]
+        latest = store.latest_for_video("youtube:a")["results"]
+        assert set(latest["camera"]["subfeatures"]) == {"night_mode", "zoom"}
+        assert latest["camera"]["subfeatures"]["zoom"]["sentiment"] == "negative"
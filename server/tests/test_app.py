@@ -0,0 +1,89 @@
+"""
+Tests for the application factory and worker profiles.
+"""
+
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app import create_app
+
+SERVER_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class TestCreateApp:
+    """Test cases for create_app."""
+
+    def test_sentiment_profile_registers_only_sentiment_routes(self):
+        """Test that the sentiment profile serves only the sentiment blueprint."""
+        app = create_app("sentiment")
+        rules = {rule.rule for rule in app.url_map.iter_rules()}
+
+        assert "/api/sentiment/analyze" in rules
+        assert "/api/video/analyze" not in rules
+        assert list(app.config["IMPORT_TIMINGS_MS"]) == ["routes.sentiment"]
+
+    def test_heavy_dependencies_are_not_imported_at_startup(self):
+        """Test that building an app does not load yt-dlp, the Speech SDK or pydub."""
+        script = (
+            "import sys, app; app.create_app('full'); "
+            "print(sorted(m for m in ('yt_dlp', 'azure.cognitiveservices.speech', 'pydub') "
+            "if m in sys.modules))"
+        )
+        output = subprocess.check_output(
+            [sys.executable, "-c", script], cwd=SERVER_DIR, text=True
+        )
+        assert output.strip().splitlines()[-1] == "[]"
+
+    def test_profiling_is_opt_in_per_request(self, app, client, tmp_path):
+        """Test that only requests carrying the admin token are profiled to folded stacks."""
+        app.config.update({"PROFILE_TOKEN": "secret", "PROFILE_DIR": str(tmp_path)})
+        body = {"text": "The camera is great. " * 2000}
+        try:
+            plain = client.post("/api/sentiment/analyze", json=body)
+            profiled = client.post(
+                "/api/sentiment/analyze",
+                json=body,
+                headers={"X-Profile-Token": "secret", "X-Request-Id": "req-1"},
+            )
+        finally:
+            app.config["PROFILE_TOKEN"] = None
+
+        assert "X-Profile-Id" not in plain.headers
+        assert profiled.status_code == 200
+        assert profiled.headers["X-Profile-Id"] == "req-1"
+        assert os.listdir(tmp_path) == ["req-1.folded"]
+        lines = (tmp_path / "req-1.folded").read_text().splitlines()
+        assert lines and all(line.rsplit(" ", 1)[1].isdigit() for line in lines)
+
+    def test_json_responses_are_projected_and_compressed(self, client, sample_review_text):
+        """Test fields= projection and negotiated gzip/brotli encoding of JSON payloads."""
+        import gzip
+        import json
+
+        body = {"text": sample_review_text * 20}
+        projected = client.post(
+            "/api/sentiment/analyze?fields=-results.*.relevant_text,-results.*.spans", json=body
+        )
+        camera = projected.get_json()["results"]["camera"]
+        assert "relevant_text" not in camera and "spans" not in camera
+        assert camera["sentiment"] == "positive"
+
+        only = client.post("/api/sentiment/analyze?fields=results.*.sentiment", json=body)
+        expected = {
+            feature: {"sentiment": result["sentiment"]}
+            for feature, result in projected.get_json()["results"].items()
+        }
+        assert only.get_json() == {"results": expected}
+
+        encoded = client.post("/api/sentiment/analyze", json=body, headers={"Accept-Encoding": "gzip"})
+        assert encoded.headers["Content-Encoding"] == "gzip"
+        assert "Accept-Encoding" in encoded.headers["Vary"]
+        assert json.loads(gzip.decompress(encoded.data))["analyzed_features"]
+
+        brotli = pytest.importorskip("brotli")
+        encoded = client.post("/api/sentiment/analyze", json=body, headers={"Accept-Encoding": "gzip, br"})
+        assert encoded.headers["Content-Encoding"] == "br"
+        assert json.loads(brotli.decompress(encoded.data))["analyzed_features"]
@@ -0,0 +1,28 @@
+"""
+Tests for the audio conversion process pool.
+"""
+
+import os
+import pytest
+
+from services.audio_conversion import ConversionPool
+
+
+class TestConversionPool:
+    """Test cases for ConversionPool."""
+
+    def test_pool_sized_to_core_count(self):
+        """Test that the default pool size follows the CPU count."""
+        pool = ConversionPool()
+        assert pool.max_workers == (os.cpu_count() or 1)
+
+    def test_worker_errors_propagate_and_leave_no_output(self, temp_static_dir):
+        """Test that a failing job raises in the caller and removes partial output."""
+        pool = ConversionPool(max_workers=1)
+        target = os.path.join(temp_static_dir, "missing.wav")
+        try:
+            with pytest.raises(Exception):
+                pool.convert(os.path.join(temp_static_dir, "missing.mp3"), target, timeout=30)
+        finally:
+            pool.shutdown()
+        assert not os.path.exists(target)
@@ -0,0 +1,42 @@
+"""
+Tests for platform caption selection and flattening.
+"""
+
+import json
+
+from services.captions import flatten_captions, select_caption_track
+
+
+class TestCaptions:
+    """Test cases for caption tracks from yt-dlp metadata."""
+
+    def test_creator_subtitles_win_and_translations_are_skipped(self):
+        """Test track choice: creator subtitles first, automatic only in the spoken language."""
+        track = lambda name: [{"ext": "vtt", "url": f"{name}.vtt"}, {"ext": "json3", "url": f"{name}.json3"}]
+        info = {
+            "language": "en",
+            "subtitles": {"en-GB": track("creator")},
+            "automatic_captions": {"en-orig": track("auto"), "pl": track("translated")},
+        }
+
+        assert select_caption_track(info, ["en"]) == ("en", {"ext": "json3", "url": "creator.json3"})
+        # Polish automatic captions of an English video are machine translations
+        assert select_caption_track(info, ["pl"]) is None
+        del info["subtitles"]
+        assert select_caption_track(info, ["pl", "en"])[1]["url"] == "auto.json3"
+
+    def test_flatten_automatic_captions_into_sentences(self):
+        """Test that unpunctuated cues become short sentences and rolling repeats vanish."""
+        json3 = json.dumps({"events": [
+            {"segs": [{"utf8": "the camera"}, {"utf8": " is great"}]},
+            {"segs": [{"utf8": "\n"}]},
+            {"segs": [{"utf8": "battery &amp; charging are slow"}]},
+        ]})
+        vtt = (
+            "WEBVTT\nKind: captions\nLanguage: en\n\n"
+            "00:00:00.000 --> 00:00:02.000\nthe camera is great\n\n"
+            "00:00:02.000 --> 00:00:04.000\nthe camera is great\n<c>battery is slow</c>\n"
+        )
+
+        assert flatten_captions(json3, "json3") == "the camera is great. battery & charging are slow."
+        assert flatten_captions(vtt, "vtt") == "the camera is great. battery is slow."
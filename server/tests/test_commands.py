@@ -0,0 +1,200 @@
+"""
+Tests for the bulk CLI commands.
+"""
+
+import json
+import os
+from unittest.mock import AsyncMock, patch
+
+from services.analysis_store import AnalysisRecord, get_store
+from services.lexicon import get_lexicon
+from services.pipeline import pipeline
+
+
+class TestRescoreCommand:
+    """Test cases for `flask rescore`."""
+
+    def test_files_to_jsonl_resumes_from_output(self, app, runner, tmp_path):
+        """Test that a second run skips transcripts already written at this lexicon version."""
+        static_dir = app.config["STATIC_DIR"]
+        for name, text in (("a", "The camera is great."), ("b", "The battery is terrible.")):
+            with open(os.path.join(static_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+                f.write(text)
+        output = tmp_path / "rescored.jsonl"
+
+        result = runner.invoke(args=["rescore", "--output", str(output), "--workers", "2"])
+        assert result.exit_code == 0, result.output
+        lines = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+        assert {line["id"] for line in lines} == {"a", "b"}
+        assert {line["lexicon_version"] for line in lines} == {get_lexicon().version}
+
+        # An interrupted write leaves a torn line, which is dropped on resume
+        with open(output, "a", encoding="utf-8") as f:
+            f.write('{"id": "c", "lexic')
+        result = runner.invoke(args=["rescore", "--output", str(output), "--workers", "1"])
+        assert "0 rescored, 2 skipped" in result.output
+        assert len(output.read_text(encoding="utf-8").splitlines()) == 2
+
+    def test_store_rescore_updates_results_and_rollups(self, app, runner):
+        """Test that stored jobs are re-scored in place without double counting rollups."""
+        store = get_store(app.config["ANALYSIS_DB"])
+        stale = {"sentiment": "negative", "score": -0.5, "confidence": 0.5, "relevant_text": []}
+        store.record(AnalysisRecord(
+            "job", "youtube:job", "u", model="Pixel 8", lexicon_version="old",
+            transcript="The camera is great.", results={"camera": stale, "sound": stale},
+        ))
+        store.flush()
+
+        for _ in range(2):
+            result = runner.invoke(args=["rescore", "--source", "store", "--to-store", "--workers", "1"])
+            assert result.exit_code == 0, result.output
+
+        assert store.lexicon_versions() == {"job": get_lexicon().version}
+        rollup = store.model_rollup("pixel 8")
+        assert rollup["videos"] == {"count": 1, "positive": 1, "negative": 0, "neutral": 0}
+        assert list(rollup["features"]) == ["camera"]
+        assert rollup["features"]["camera"]["positive"] == 1
+        assert store.latest_for_video("youtube:job")["results"]["camera"]["sentiment"] == "positive"
+
+    def test_files_to_store_matches_file_names_to_jobs(self, app, runner):
+        """Test that transcript files reach the store only through a job of the same id."""
+        store = get_store(app.config["ANALYSIS_DB"])
+        store.record(AnalysisRecord("job", "youtube:job", "u", lexicon_version="old", results={}))
+        store.flush()
+        static_dir = app.config["STATIC_DIR"]
+        for name, text in (
+            ("job", "The camera is great."),
+            ("job-default", "The battery is terrible."),
+            ("silent", "[No speech detected]"),
+        ):
+            with open(os.path.join(static_dir, f"{name}.txt"), "w", encoding="utf-8") as f:
+                f.write(text)
+
+        result = runner.invoke(args=["rescore", "--to-store", "--workers", "1"])
+
+        assert result.exit_code == 0, result.output
+        assert "1 rescored, 1 skipped" in result.output
+        assert "1 transcript file(s) match no stored job" in result.output
+        assert store.lexicon_versions() == {"job": get_lexicon().version}
+        assert store.latest_for_video("youtube:job")["results"]["camera"]["sentiment"] == "positive"
+
+
+class TestIngestCommand:
+    """Test cases for `flask ingest`."""
+
+    @staticmethod
+    def _fake_stages(calls, fail_key=None):
+        """Pipeline stage stand-ins that write the files the real stages would."""
+        async def download(service):
+            calls.append(("download", service.youtube_url))
+            with open(service.audio_mp3, "wb") as f:
+                f.write(b"mp3")
+
+        async def convert(service):
+            calls.append(("convert", service.youtube_url))
+            with open(service.audio_wav, "wb") as f:
+                f.write(b"wav")
+
+        async def transcribe(service):
+            calls.append(("transcribe", service.youtube_url))
+            assert pipeline.scheduler.running >= 1  # inside a scheduler slot
+            if fail_key and fail_key in service.youtube_url:
+                raise RuntimeError("recognition failed")
+            service.language = "en"
+            return service._save_transcript(["The camera is great."])
+
+        return {
+            "preflight": AsyncMock(),
+            "download": download,
+            "convert": convert,
+            "trim": AsyncMock(),
+            "transcribe": transcribe,
+        }
+
+    def _run(self, runner, stages, *args):
+        with patch.multiple(pipeline, **stages):
+            return runner.invoke(args=["ingest", *args])
+
+    def test_dedupes_urls_and_writes_results(self, runner, tmp_path):
+        """Test that equivalent URLs are analyzed once and unsupported ones are skipped."""
+        urls = tmp_path / "urls.txt"
+        urls.write_text(
+            "# catalog\n"
+            "https://www.youtube.com/watch?v=abc123DEF\n"
+            "https://youtu.be/abc123DEF\n"
+            "https://www.youtube.com/shorts/abc123DEF?feature=share\n"
+            "\n"
+            "https://vimeo.com/76979871\n"
+            "https://example.com/video\n",
+            encoding="utf-8",
+        )
+        output = tmp_path / "results.jsonl"
+        calls = []
+
+        result = self._run(
+            runner, self._fake_stages(calls), str(urls), "--output", str(output),
+            "--work-dir", str(tmp_path / "work"),
+        )
+        assert result.exit_code == 0, result.output
+        assert "2 videos (2 duplicate URLs dropped, 1 unsupported)" in result.output
+
+        lines = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+        assert {line["video_key"] for line in lines} == {"youtube:abc123DEF", "vimeo:76979871"}
+        for line in lines:
+            assert line["overall"] == "positive"
+            assert line["results"]["camera"]["sentiment"] == "positive"
+            assert line["transcript"] == "The camera is great."
+        assert sum(1 for stage, _ in calls if stage == "download") == 2
+        assert pipeline.scheduler.running == 0
+        # Media is removed once the transcript is journaled
+        assert all(name.endswith(".txt") for name in os.listdir(tmp_path / "work"))
+
+    def test_rerun_resumes_from_journal(self, runner, tmp_path):
+        """Test that a rerun skips finished videos and restarts failed ones at their first unfinished stage."""
+        urls = tmp_path / "urls.txt"
+        urls.write_text(
+            "https://www.youtube.com/watch?v=good12345\nhttps://www.youtube.com/watch?v=bad123456\n",
+            encoding="utf-8",
+        )
+        output = tmp_path / "results.jsonl"
+        args = (str(urls), "--output", str(output), "--work-dir", str(tmp_path / "work"))
+
+        calls = []
+        result = self._run(runner, self._fake_stages(calls, fail_key="bad"), *args)
+        assert result.exit_code == 0, result.output
+        assert "1 analyzed, 1 failed" in result.output
+        journal = [json.loads(line) for line in (tmp_path / "results.jsonl.journal").read_text().splitlines()]
+        assert {"key": "youtube:bad123456", "stage": "converted"} in journal
+
+        calls = []
+        result = self._run(runner, self._fake_stages(calls), *args)
+        assert result.exit_code == 0, result.output
+        assert "1 already done" in result.output
+        # Download and conversion of the failed video were journaled, so only recognition reruns
+        assert calls == [("transcribe", "https://www.youtube.com/watch?v=bad123456")]
+
+        lines = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+        assert sorted(("error" in line) for line in lines) == [False, False, True]
+        assert "error" not in lines[-1] and lines[-1]["video_key"] == "youtube:bad123456"
+
+    def test_lost_transcript_is_rebuilt_from_a_new_download(self, runner, tmp_path):
+        """Test that a journaled transcript whose file and media are gone is downloaded again."""
+        urls = tmp_path / "urls.txt"
+        urls.write_text("https://www.youtube.com/watch?v=lost12345\n", encoding="utf-8")
+        output = tmp_path / "results.jsonl"
+        args = (str(urls), "--output", str(output), "--work-dir", str(tmp_path / "work"))
+        assert self._run(runner, self._fake_stages([]), *args).exit_code == 0
+
+        journal = [json.loads(line) for line in (tmp_path / "results.jsonl.journal").read_text().splitlines()]
+        transcript = journal[-1]["transcript"]
+        assert journal[-1]["stage"] == "transcribed" and os.path.exists(transcript)
+        os.remove(transcript)
+        output.write_text("", encoding="utf-8")
+
+        calls = []
+        result = self._run(runner, self._fake_stages(calls), *args)
+
+        assert result.exit_code == 0, result.output
+        assert "1 analyzed, 0 failed" in result.output
+        assert [stage for stage, _ in calls] == ["download", "convert", "transcribe"]
+
@@ -0,0 +1,72 @@
+"""
+Tests for custom feature dictionaries and the compiled matcher cache.
+"""
+
+from unittest.mock import patch
+
+import pytest
+
+from services.custom_features import CustomFeatureSets, validate_definition
+from services.lru_cache import LRUCache
+from services.sentiment_service import SentimentAnalysisService
+
+
+class TestCustomFeatures:
+    """Test cases for custom feature definitions."""
+
+    def test_repeated_definitions_skip_compilation(self):
+        """Test that the same custom features reuse the cached matcher, whatever the text."""
+        service = SentimentAnalysisService()
+        custom = {"wifi": ["wi-fi", "wifi"]}
+
+        first = service.analyze_all_features("The Wi-Fi is great.", custom_features=custom)
+        with patch("services.taxonomy.FeatureMatcher") as compile_matcher:
+            again = service.analyze_all_features(
+                "Wifi is terrible.", custom_features={"wifi": ["wi-fi", "wifi"]}
+            )
+        compile_matcher.assert_not_called()
+
+        assert first["wifi"]["sentiment"] == "positive"
+        assert again["wifi"]["sentiment"] == "negative"
+
+    def test_definitions_are_validated_and_registered_by_content(self):
+        """Test that registration normalizes keywords and identical sets share an id."""
+        sets = CustomFeatureSets(max_sets=1)
+        set_id = sets.register({"gps": [" GPS ", "gps", "navigation"]})
+
+        assert sets.register({"gps": ["gps", "navigation"]}) == set_id
+        assert sets.resolve(set_id) == {"gps": ["gps", "navigation"]}
+        sets.register({"nfc": ["nfc"]})
+        with pytest.raises(ValueError):
+            sets.resolve(set_id)  # evicted by the newer set
+        for bad in ({}, {"gps": []}, {"gps": "gps"}, {"": ["x"]}, {"gps": ["x" * 65]}):
+            with pytest.raises(ValueError):
+                validate_definition(bad)
+
+    def test_lru_cache_evicts_least_recently_used(self):
+        """Test that reads refresh entries and the oldest is evicted past capacity."""
+        cache = LRUCache(2)
+        cache.put("a", 1)
+        cache.put("b", 2)
+        cache.get("a")
+        cache.put("c", 3)
+
+        assert "b" not in cache and cache.get("a") == 1 and len(cache) == 2
+
+    def test_registered_set_is_usable_by_id(self, client):
+        """Test registering a custom set and analyzing with its id."""
+        response = client.post(
+            "/api/sentiment/custom-features", json={"features": {"wifi": ["wifi"]}}
+        )
+        assert response.status_code == 201
+        set_id = response.get_json()["id"]
+
+        response = client.post(
+            "/api/sentiment/analyze",
+            json={"text": "The camera and wifi are great.", "custom_features": set_id},
+        )
+        assert response.status_code == 200
+        assert {"camera", "wifi"} <= set(response.get_json()["analyzed_features"])
+        assert client.post(
+            "/api/sentiment/analyze", json={"text": "wifi", "custom_features": "missing"}
+        ).status_code == 400
@@ -0,0 +1,63 @@
+"""
+Tests for the process-wide job registry.
+"""
+
+import pytest
+
+from services.job_registry import JobRegistry, JobRegistryFull
+
+
+class FakeService:
+    def __init__(self):
+        self.state = "created"
+        self.starts = 0
+
+    def start(self):
+        self.starts += 1
+        self.state = "running"
+
+
+class TestJobRegistry:
+    """Test cases for JobRegistry."""
+
+    def test_lookup_creates_once_and_never_starts(self):
+        """Test that get_or_create reuses jobs and that reads leave them unstarted."""
+        registry = JobRegistry(max_jobs=4)
+        job = registry.get_or_create("a", FakeService)
+
+        assert registry.get_or_create("a", FakeService) is job
+        assert registry.get("a") is job
+        assert registry.get("missing") is None
+        assert job.service.starts == 0
+
+        registry.start("a")
+        registry.start("a")
+        assert job.state == "running"
+
+    def test_evicts_least_recently_used_finished_jobs(self):
+        """Test that only finished jobs are evicted, oldest access first."""
+        evicted = []
+        registry = JobRegistry(max_jobs=3, on_evict=lambda job: evicted.append(job.job_id))
+        for job_id in ("old", "recent", "active"):
+            registry.get_or_create(job_id, FakeService)
+        registry.get("old").service.state = "done"
+        registry.get("recent").service.state = "failed"
+        registry.get("recent")  # touch: "old" is now the LRU finished job
+
+        registry.get_or_create("new", FakeService)
+
+        assert "old" not in registry
+        assert evicted == ["old"]
+        assert {"recent", "active", "new"} == set(registry._jobs)
+        assert len(registry) == 3
+
+    def test_full_of_active_jobs_refuses_new_ones(self):
+        """Test that running or unstarted jobs are never evicted."""
+        registry = JobRegistry(max_jobs=2)
+        registry.get_or_create("a", FakeService)
+        registry.get_or_create("b", FakeService)
+        registry.start("b")
+
+        with pytest.raises(JobRegistryFull):
+            registry.get_or_create("c", FakeService)
+        assert len(registry) == 2
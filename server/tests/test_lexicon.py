@@ -0,0 +1,75 @@
+"""
+Tests for lexicon snapshots and hot reload.
+"""
+
+import json
+import os
+
+from services.lexicon import (
+    DEFAULT_LEXICON_PATH,
+    MIXED,
+    PhraseLexicon,
+    compile_snapshot,
+    load_snapshot,
+    reload_lexicon,
+)
+from services.sentiment_service import SentimentAnalysisService
+
+
+class TestLexiconSnapshot:
+    """Test cases for compiled lexicon snapshots."""
+
+    def test_snapshot_round_trip_matches_source(self, tmp_path):
+        """Test that a loaded snapshot scores exactly like a lexicon compiled from source."""
+        with open(DEFAULT_LEXICON_PATH, encoding="utf-8") as f:
+            source = json.load(f)
+        lexicon = load_snapshot(compile_snapshot(DEFAULT_LEXICON_PATH, str(tmp_path / "default.lexbin")))
+
+        assert lexicon.version == source["version"]
+        for language, shard_source in source["languages"].items():
+            weights = list(shard_source["positive"].items()) + list(shard_source["negative"].items())
+            expected = PhraseLexicon.compile(weights, shard_source["negations"])
+            shard = lexicon.shard(language)
+            assert shard.features == shard_source["features"]
+            for text in ["not great but top-notch", "krótki czas pracy", "terrible battery drain"]:
+                assert shard.phrases.score(text) == expected.score(text)
+
+    def test_unknown_language_falls_back_to_mixed_shard(self, tmp_path):
+        """Test that texts of undecided language are scored with the merged shard."""
+        lexicon = load_snapshot(compile_snapshot(DEFAULT_LEXICON_PATH, str(tmp_path / "default.lexbin")))
+
+        assert lexicon.shard(None) is lexicon.shard("de") is lexicon.shard(MIXED)
+        assert lexicon.shard(MIXED).phrases.score("great but krótki czas pracy") == 0.0
+
+    def test_reload_swaps_version_and_tags_results(self, tmp_path):
+        """Test that reloading switches the active lexicon and results carry its version."""
+        with open(DEFAULT_LEXICON_PATH, encoding="utf-8") as f:
+            source = json.load(f)
+        source["version"] = "test-2"
+        source_path = tmp_path / "custom.json"
+        source_path.write_text(json.dumps(source), encoding="utf-8")
+
+        service = SentimentAnalysisService()
+        try:
+            reload_lexicon(str(source_path))
+            results = service.analyze_all_features("The camera is great.")
+            assert results["camera"]["lexicon_version"] == "test-2"
+            assert os.path.exists(tmp_path / "custom.lexbin")
+        finally:
+            reload_lexicon(DEFAULT_LEXICON_PATH)
+
+    def test_shards_pickle_as_a_reference_to_the_snapshot(self, tmp_path):
+        """Test that worker copies of a shard map the snapshot instead of carrying its tables."""
+        import pickle
+
+        snapshot_path = compile_snapshot(DEFAULT_LEXICON_PATH, str(tmp_path / "default.lexbin"))
+        shard = load_snapshot(snapshot_path).shard("en")
+
+        data = pickle.dumps(shard)
+        assert len(data) < 1024 and b"phrase" not in data
+        assert pickle.loads(data).phrases.score("not great but top-notch") == \
+            shard.phrases.score("not great but top-notch")
+
+        os.remove(snapshot_path)  # replaced or deleted: fall back to a copy by value
+        copy = pickle.loads(pickle.dumps(shard))
+        assert copy.phrases.score("terrible battery drain") == shard.phrases.score("terrible battery drain")
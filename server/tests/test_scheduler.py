@@ -0,0 +1,69 @@
+"""
+Tests for the duration-aware job scheduler.
+"""
+
+import asyncio
+
+from services.scheduler import AGING_RATE, LANES, JobScheduler
+
+
+async def _admission_order(scheduler, jobs):
+    """Hold the only slot, queue `jobs` (name, lane, duration, enqueue time), return start order."""
+    now = [0.0]
+    scheduler._clock = lambda: now[0]
+    order = []
+
+    async def job(name, lane, duration):
+        async with scheduler.slot(lane, duration):
+            order.append(name)
+
+    await scheduler.acquire("interactive", 1)
+    tasks = []
+    for name, lane, duration, enqueued_at in jobs:
+        now[0] = enqueued_at
+        tasks.append(asyncio.ensure_future(job(name, lane, duration)))
+        await asyncio.sleep(0)
+    scheduler.release()
+    await asyncio.gather(*tasks)
+    return order
+
+
+class TestJobScheduler:
+    """Test cases for JobScheduler."""
+
+    def test_shortest_job_first_and_interactive_lane_first(self):
+        """Test that shorter jobs start first and interactive jobs overtake batch ones."""
+        order = asyncio.run(_admission_order(JobScheduler(max_running=1), [
+            ("long review", "interactive", 3600, 0),
+            ("batch short", "batch", 30, 0),
+            ("short", "interactive", 30, 0),
+            ("unknown", "interactive", None, 0),
+        ]))
+
+        assert order == ["short", "unknown", "batch short", "long review"]
+
+    def test_waiting_jobs_age_past_newer_shorter_ones(self):
+        """Test that aging eventually lets a long-waiting batch job go first."""
+        waited = (LANES["batch"] + 600) / AGING_RATE + 1
+        order = asyncio.run(_admission_order(JobScheduler(max_running=1), [
+            ("old batch", "batch", 600, 0),
+            ("new short", "interactive", 30, waited),
+        ]))
+
+        assert order == ["old batch", "new short"]
+
+    def test_slots_are_released(self):
+        """Test that capacity returns after jobs finish or are cancelled while waiting."""
+        async def scenario():
+            scheduler = JobScheduler(max_running=1)
+            await scheduler.acquire("interactive", 10)
+            waiter = asyncio.ensure_future(scheduler.acquire("batch", 10))
+            await asyncio.sleep(0)
+            waiter.cancel()
+            await asyncio.sleep(0)
+            scheduler.release()
+            return scheduler
+
+        scheduler = asyncio.run(scenario())
+        assert scheduler.running == 0
+        assert scheduler.waiting == 0
@@ -0,0 +1,38 @@
+"""
+Tests for the time-indexed transcript segment store.
+"""
+
+from services.segment_store import RECORD, SegmentStore
+
+
+class TestSegmentStore:
+    """Test cases for SegmentStore."""
+
+    def test_range_query_returns_overlapping_segments(self, tmp_path):
+        """Test that a time window returns exactly the segments overlapping it."""
+        store = SegmentStore(str(tmp_path / "video"))
+        for i in range(10):
+            store.append(i * 30, i * 30 + 25, f"segment {i} – zażółć")
+
+        found = store.range(120, 180)
+
+        assert [s.index for s in found] == [4, 5]
+        assert found[0].text == "segment 4 – zażółć"
+        assert (found[1].start, found[1].end) == (150.0, 175.0)
+        assert [s.index for s in store.range(0, float("inf"))] == list(range(10))
+
+    def test_incremental_reads_of_a_growing_transcript(self, tmp_path):
+        """Test that readers pick up appended segments and ignore a torn index tail."""
+        writer = SegmentStore(str(tmp_path / "video"))
+        reader = SegmentStore(str(tmp_path / "video"))
+        writer.reset()
+        writer.append(0.0, 1.5, "first")
+
+        assert [s.text for s in reader.since(0)] == ["first"]
+
+        writer.append(2.0, 3.0, "second")
+        with open(writer.index_path, "ab") as f:
+            f.write(b"\0" * (RECORD // 2))  # a record being written
+
+        assert [s.text for s in reader.since(1)] == ["second"]
+        assert len(reader) == 2
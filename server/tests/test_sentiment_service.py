@@ -52,3 +52,127 @@ class TestSentimentAnalysisService:
         
         assert score_positive > 0
         assert score_negated < 0
+
+    def test_analyze_stream_matches_full_text_analysis(self, sample_review_text):
+        """Test that streaming over arbitrary chunks gives the same result as the full text."""
+        service = SentimentAnalysisService()
+        chunks = [sample_review_text[i:i + 7] for i in range(0, len(sample_review_text), 7)]
+
+        assert service.analyze_stream(iter(chunks)) == service.analyze_all_features(sample_review_text)
+
+    def test_analyze_stream_bounds_undelimited_input(self, monkeypatch):
+        """Test that megabytes without sentence delimiters are scored in bounded memory."""
+        import tracemalloc
+        from services import sentiment_service
+
+        cap = 16 * 1024
+        monkeypatch.setattr(sentiment_service, "STREAM_MAX_PENDING_CHARS", cap)
+        phrase = "the camera is great and sharp "
+        chunk = phrase * (4096 // len(phrase))
+
+        def chunks():
+            for _ in range(512):  # 2 MB, never a [.!?]
+                yield chunk
+
+        service = SentimentAnalysisService()
+        tracemalloc.start()
+        try:
+            results = service.analyze_stream(chunks(), features=["camera"])
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+        assert results["camera"]["sentiment"] == "positive"
+        assert peak < 32 * (cap + len(chunk))
+
+    def test_analyze_stream_endpoint_accepts_plain_text(self, client, sample_review_text):
+        """Test that the streaming endpoint scores a raw text body."""
+        response = client.post(
+            "/api/sentiment/analyze-stream?features=camera,battery",
+            data=sample_review_text.encode("utf-8"),
+            content_type="text/plain; charset=utf-8",
+        )
+
+        assert response.status_code == 200
+        assert response.get_json()["analyzed_features"] == ["camera", "battery"]
+
+    def test_analyze_endpoints_reject_unsupported_languages(self, client):
+        """Test that a language without a lexicon shard is a 400, not a silent mixed fallback."""
+        response = client.post("/api/sentiment/analyze", json={"text": "The camera is great.", "language": "xx"})
+
+        assert response.status_code == 400
+        assert response.get_json()["supported_languages"] == ["en", "mixed", "pl"]
+        assert client.post("/api/sentiment/analyze-stream?language=xx", data=b"x").status_code == 400
+        assert client.post(
+            "/api/sentiment/analyze", json={"text": "Aparat jest świetny.", "language": "pl"}
+        ).status_code == 200
+
+    def test_spans_are_offsets_of_relevant_text(self, sample_review_text):
+        """Test that returned spans locate each snippet in the original text."""
+        service = SentimentAnalysisService()
+        results = service.analyze_all_features(sample_review_text)
+
+        for result in results.values():
+            assert len(result["spans"]) == len(result["relevant_text"])
+            for (start, end), snippet in zip(result["spans"], result["relevant_text"]):
+                assert sample_review_text[start:end] == snippet
+
+    def test_phrases_and_punctuated_tokens_score(self):
+        """Test that hyphenated/punctuated words and multi-word phrases are matched."""
+        service = SentimentAnalysisService()
+
+        assert service._calculate_sentiment_score("The build is top-notch, really") > 0
+        assert service._calculate_sentiment_score("this phone is a waste of money") < 0
+        # The phrase replaces the overlapping single word "krótki" instead of adding to it
+        assert service._calculate_sentiment_score("bardzo krótki czas pracy") == -0.8
+
+    def test_language_is_detected_and_routes_to_its_shard(self):
+        """Test that Polish text is identified and scored with the Polish lexicon shard."""
+        service = SentimentAnalysisService()
+        text = "Aparat jest naprawdę świetny w nocy. Bateria niestety szybko się rozładowuje."
+
+        results = service.analyze_all_features(text)
+
+        assert results["camera"]["language"] == "pl"
+        assert results["camera"]["sentiment"] == "positive"
+        # Forcing English routes to the English shard, whose keywords do not match
+        assert "camera" not in service.analyze_all_features(text, language="en")
+
+    def test_parallel_shards_match_sequential_result(self, monkeypatch, sample_review_text):
+        """Test that map-reduce scoring of a long text is byte-identical to one pass."""
+        import json
+        import services.sentiment_service as sentiment_module
+
+        text = " ".join([sample_review_text, "Screen is bad! Battery is okay?"] * 40)
+        service = SentimentAnalysisService()
+        sequential = service.analyze_all_features(text)
+
+        pool = sentiment_module.ScoringPool(max_workers=3)
+        monkeypatch.setattr(sentiment_module, "scoring_pool", pool)
+        monkeypatch.setattr(sentiment_module, "PARALLEL_MIN_CHARS", 1)
+        monkeypatch.setattr(sentiment_module, "SHARD_MIN_CHARS", len(text) // 5)
+        try:
+            parallel = service.analyze_all_features(text)
+        finally:
+            pool.shutdown()
+
+        assert json.dumps(parallel) == json.dumps(sequential)
+
+    def test_accumulator_sums_do_not_depend_on_grouping(self):
+        """Test that merged partial sums are exact, unlike naive float addition."""
+        from services.sentiment_service import FeatureAccumulator, _shard_bounds
+
+        scores = [0.1] * 10 + [1e16, 1.0, -1e16]
+        whole = FeatureAccumulator()
+        for score in scores:
+            whole.add(score, "x", 0, 1)
+        left, right = FeatureAccumulator(), FeatureAccumulator()
+        for score in scores[:11]:
+            left.add(score, "x", 0, 1)
+        for score in scores[11:]:
+            right.add(score, "x", 0, 1)
+        left.merge(right)
+
+        assert left.total_score == whole.total_score == 2.0
+        assert left.sentence_count == 13 and len(left.examples) == 3
+        assert _shard_bounds("One. Two! Three? Four", 3) == [(0, 9), (9, 16), (16, 21)]
@@ -0,0 +1,46 @@
+"""
+Tests for single-flight de-duplication of pipeline jobs.
+"""
+
+import asyncio
+import threading
+
+from services.pipeline import AnalysisPipeline
+from services.single_flight import SingleFlight
+
+
+class TestSingleFlight:
+    """Test cases for SingleFlight."""
+
+    def test_job_is_cancelled_when_every_waiter_leaves(self):
+        """Test that the leader's job stops once nobody waits for its result."""
+        pipeline = AnalysisPipeline()
+        flights = SingleFlight()
+        started = threading.Event()
+        cancelled = threading.Event()
+
+        async def slow_job():
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        flight, leader = flights.join("video", None, lambda: pipeline.submit(slow_job()))
+        follower, follower_leads = flights.join("video", None, lambda: pipeline.submit(slow_job()))
+        assert leader and not follower_leads and follower is flight
+        assert started.wait(5)
+
+        assert flights.leave(follower) == 1
+        assert not flight.future.cancelled()
+
+        assert flights.leave(flight) == 0
+        assert flight.future.cancelled()
+        assert cancelled.wait(5)
+        assert len(flights) == 0
+
+        # A later caller starts a fresh job rather than joining the cancelled one
+        fresh, fresh_leads = flights.join("video", None, lambda: pipeline.submit(asyncio.sleep(0)))
+        assert fresh_leads and fresh is not flight
+        fresh.future.result(5)
@@ -0,0 +1,73 @@
+"""
+Tests for Azure Speech admission control.
+"""
+
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from services.speech_quota import RecognitionRejected, SpeechQuota, classify_cancellation
+
+
+def _details(reason, code="NoError"):
+    return SimpleNamespace(reason=reason, error_code=code, error_details="details")
+
+
+class TestSpeechQuota:
+    """Test cases for SpeechQuota and cancellation handling."""
+
+    def test_cancellation_codes_are_classified(self):
+        """Test that throttling, transient and fatal error codes are told apart."""
+        assert classify_cancellation(_details("EndOfStream")) == "end"
+        assert classify_cancellation(_details("Error", "TooManyRequests")) == "throttled"
+        assert classify_cancellation(_details("Error", "ConnectionFailure")) == "transient"
+        assert classify_cancellation(_details("Error", "AuthenticationFailure")) == "fatal"
+
+    def test_sessions_are_capped_and_budget_is_charged(self):
+        """Test that acquire waits for a free slot and draws audio seconds from the bucket."""
+        async def scenario():
+            quota = SpeechQuota(max_sessions=1, audio_hours_per_hour=1, clock=lambda: 0.0)
+            await quota.acquire(600)
+            second = asyncio.ensure_future(quota.acquire(600))
+            await asyncio.sleep(0.01)
+            assert not second.done()
+
+            await quota.release()
+            await asyncio.wait_for(second, 1)
+            return quota
+
+        quota = asyncio.run(scenario())
+        assert quota.active == 1
+        assert quota.tokens == 3600 - 1200
+
+    def test_non_positive_limits_are_rejected(self):
+        """Test that a zero or negative session cap or audio budget fails at construction."""
+        with pytest.raises(ValueError, match="audio_hours_per_hour"):
+            SpeechQuota(audio_hours_per_hour=0)
+        with pytest.raises(ValueError, match="max_sessions"):
+            SpeechQuota(max_sessions=0)
+
+    def test_throttled_recognition_is_retried(self, tmp_path):
+        """Test that a throttled session is requeued and the retry's result returned."""
+        import wave
+        from services.pipeline import AnalysisPipeline
+
+        audio_wav = tmp_path / "audio.wav"
+        with wave.open(str(audio_wav), "wb") as audio:
+            audio.setnchannels(1)
+            audio.setsampwidth(2)
+            audio.setframerate(16000)
+            audio.writeframes(b"\0\0" * 16000)
+
+        pipeline = AnalysisPipeline()
+        recognize = AsyncMock(side_effect=[RecognitionRejected("throttled", "429"), (["ok"], "en")])
+        with patch.object(pipeline, "_recognize", new=recognize), \
+                patch("services.pipeline.backoff_delay", return_value=0):
+            result = asyncio.run(pipeline._recognize_admitted(SimpleNamespace(recognition_audio=str(audio_wav))))
+
+        assert result == (["ok"], "en")
+        assert recognize.await_count == 2
+        assert pipeline.quota.active == 0
+        assert pipeline.quota.tokens == pytest.approx(pipeline.quota.capacity - 1.0, abs=0.1)
@@ -0,0 +1,82 @@
+"""
+Tests for the feature taxonomy and its single-scan matcher.
+"""
+
+import random
+
+import pytest
+
+from services.sentiment_service import SentimentAnalysisService
+from services.taxonomy import FeatureMatcher, FeatureTaxonomy
+
+TAXONOMY = FeatureTaxonomy(
+    children={"camera": ["zoom", "night_mode"], "night_mode": ["astro"], "battery": ["endurance"]},
+    packs={"phone": ["camera", "battery"]},
+    default_pack="phone",
+)
+
+
+class TestFeatureTaxonomy:
+    """Test cases for FeatureTaxonomy."""
+
+    def test_expand_roots_and_packs(self):
+        """Test that sub-features are expanded depth first and packs resolve."""
+        assert TAXONOMY.expand(["camera", "battery"]) == [
+            "camera", "zoom", "night_mode", "astro", "battery", "endurance"
+        ]
+        assert TAXONOMY.ancestors("astro") == ["night_mode", "camera"]
+        assert TAXONOMY.roots(["zoom", "camera", "endurance"]) == ["camera", "endurance"]
+        assert TAXONOMY.pack(None) == ["camera", "battery"]
+        with pytest.raises(ValueError):
+            TAXONOMY.pack("laptop")
+
+    def test_invalid_hierarchies_are_rejected(self):
+        """Test that cycles and features with two parents fail to compile."""
+        with pytest.raises(ValueError):
+            FeatureTaxonomy(children={"a": ["b"], "b": ["a"]})
+        with pytest.raises(ValueError):
+            FeatureTaxonomy(children={"a": ["c"], "b": ["c"]})
+
+
+class TestFeatureMatcher:
+    """Test cases for the single-scan feature matcher."""
+
+    def test_sub_feature_matches_roll_up_to_ancestors(self):
+        """Test that a sentence is attributed to the matched leaf and all its parents."""
+        matcher = FeatureMatcher(
+            {"camera": ["camera"], "night_mode": ["night mode"], "astro": ["astro"], "battery": ["battery"]},
+            TAXONOMY,
+        )
+
+        assert matcher.match("The ASTRO shots are great") == {"astro", "night_mode", "camera"}
+        assert matcher.match("Night mode and battery") == {"night_mode", "camera", "battery"}
+        assert matcher.match("Night mode and battery", 0, 10) == {"night_mode", "camera"}
+        assert matcher.match("nothing here") == set()
+
+    def test_matches_like_searching_each_feature(self):
+        """Test that overlapping and prefix keywords match like per-feature substring search."""
+        keywords = {"a": ["night", "light"], "b": ["night mode"], "c": ["ode", "mod"], "d": ["gh"]}
+        matcher = FeatureMatcher(keywords, FeatureTaxonomy())
+        rng = random.Random(7)
+        alphabet = "nightmode l"
+        for _ in range(300):
+            text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+            expected = {f for f, words in keywords.items() if any(w in text.lower() for w in words)}
+            assert matcher.match(text) == expected, text
+
+
+class TestTaxonomyAnalysis:
+    """Test cases for hierarchical sentiment results."""
+
+    def test_sub_feature_results_nest_under_parents(self):
+        """Test that default-pack results nest sub-features and roll them up."""
+        service = SentimentAnalysisService()
+        text = "Night mode is amazing. The charger is great but the battery life is terrible."
+
+        results = service.analyze_all_features(text)
+
+        assert set(results) == {"camera", "battery"}
+        assert list(results["camera"]["subfeatures"]) == ["night_mode"]
+        assert set(results["battery"]["subfeatures"]) == {"charging_speed", "endurance"}
+        assert "keyboard" not in service.analyze_all_features("The keyboard is great.")
+        assert "keyboard" in service.analyze_all_features("The keyboard is great.", pack="laptop")
@@ -0,0 +1,129 @@
+"""
+Tests for transcription routes.
+"""
+
+import os
+import pytest
+from unittest.mock import patch
+
+
+@pytest.fixture
+def transcription_service(app):
+    """The default job's service, started without running its workflow thread."""
+    import routes.transcription as transcription_routes
+    from services.job_registry import DEFAULT_JOB, job_registry
+
+    job_registry.discard(DEFAULT_JOB)
+    with patch("services.transcription_service.Thread"), app.app_context():
+        service = transcription_routes.get_transcription_service()
+        service.start()
+    open(service.audio_wav, "wb").close()
+    yield service
+    job_registry.discard(DEFAULT_JOB)
+
+
+class TestTranscriptionPolling:
+    """Test cases for conditional and incremental transcript polling."""
+
+    def test_unchanged_transcript_is_answered_with_304(self, client, transcription_service):
+        """Test that If-None-Match short-circuits without reading the transcript."""
+        transcription_service._save_transcript(["The camera is great."])
+
+        first = client.get("/api/transcription/text")
+        assert first.status_code == 200
+        assert first.headers["Last-Modified"]
+
+        with patch.object(transcription_service, "get_transcript_text") as read:
+            again = client.get(
+                "/api/transcription/text", headers={"If-None-Match": first.headers["ETag"]}
+            )
+        assert again.status_code == 304
+        read.assert_not_called()
+
+        status = client.get("/api/transcription/status")
+        assert client.get(
+            "/api/transcription/status", headers={"If-None-Match": status.headers["ETag"]}
+        ).status_code == 304
+
+    def test_since_cursor_returns_only_appended_text(self, client, transcription_service):
+        """Test that in-progress polls with since= return new segments and a new ETag."""
+        segments = transcription_service.segments
+        segments.reset()
+        segments.append(0.0, 2.0, "First segment.")
+
+        first = client.get("/api/transcription/text?since=0").get_json()
+        assert first == {"text": "First segment.", "next": 1, "done": False}
+
+        etag = client.get("/api/transcription/text?since=1").headers["ETag"]
+        segments.append(2.0, 4.0, "Second segment.")
+        response = client.get("/api/transcription/text?since=1", headers={"If-None-Match": etag})
+
+        assert response.status_code == 200
+        assert response.get_json()["text"] == "Second segment."
+
+        # A since= tag never validates the full transcript or another cursor
+        headers = {"If-None-Match": response.headers["ETag"]}
+        assert client.get("/api/transcription/text?since=2", headers=headers).status_code == 200
+        assert client.get("/api/transcription/text", headers=headers).status_code != 304
+
+
+class TestTranscriptionJobs:
+    """Test cases for explicit job start through the registry."""
+
+    def test_reads_never_start_work(self, client):
+        """Test that polling unknown or unstarted jobs does not create or start anything."""
+        from services.job_registry import job_registry
+
+        with patch("services.transcription_service.Thread") as thread:
+            assert client.get("/api/transcription/text?job=idle").status_code == 404
+            assert client.get("/api/transcription/status?job=idle").status_code == 404
+            assert "idle" not in job_registry
+
+            response = client.post("/api/transcription/start?job=idle")
+            assert response.status_code == 202
+            assert response.get_json()["state"] == "running"
+            client.post("/api/transcription/start?job=idle")
+        thread.assert_called_once()
+        job_registry.discard("idle")
+
+    def test_analyze_transcription_requires_known_finished_job(self, client, transcription_service):
+        """Test that sentiment analysis looks the job up instead of building a service."""
+        assert client.post(
+            "/api/sentiment/analyze-transcription", json={"job_id": "missing"}
+        ).status_code == 404
+        assert client.post("/api/sentiment/analyze-transcription").status_code == 202
+
+        transcription_service._save_transcript(["The camera is great."])
+        response = client.post("/api/sentiment/analyze-transcription")
+        assert response.status_code == 200
+        assert "camera" in response.get_json()["analyzed_features"]
+
+    def test_jobs_keep_separate_videos_and_files(self, client):
+        """Test that two started jobs download their own URLs into their own files."""
+        from services.job_registry import job_registry
+
+        with patch("services.transcription_service.Thread"):
+            first = client.post(
+                "/api/transcription/start?job=first", json={"url": "https://youtu.be/first1"}
+            )
+            second = client.post(
+                "/api/transcription/start?job=second/../x", json={"url": "https://youtu.be/second2"}
+            )
+            conflict = client.post(
+                "/api/transcription/start?job=first", json={"url": "https://youtu.be/other3"}
+            )
+        assert [first.status_code, second.status_code, conflict.status_code] == [202, 202, 409]
+
+        services = [job_registry.get(job_id).service for job_id in ("first", "second/../x")]
+        job_registry.discard("first")
+        job_registry.discard("second/../x")
+
+        assert [s.youtube_url for s in services] == ["https://youtu.be/first1", "https://youtu.be/second2"]
+        artifacts = [
+            {s.audio_mp3, s.audio_wav, s.speech_wav, s.transcript_file, s.segments.index_path}
+            for s in services
+        ]
+        assert not artifacts[0] & artifacts[1]
+        for path in artifacts[1]:
+            assert os.path.dirname(path) == services[1].static_dir
+            assert os.path.basename(path).startswith("job-second____x-")
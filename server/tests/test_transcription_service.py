@@ -2,6 +2,7 @@
 Tests for TranscriptionService.
 """
 
+import asyncio
 import os
 import pytest
 from unittest.mock import patch, MagicMock
@@ -31,6 +32,67 @@ class TestTranscriptionService:
         result = service.get_transcript_text()
         assert result == expected_text
 
+    @patch("services.transcription_service.Thread")
+    def test_background_recognition_is_admitted_by_the_speech_quota(self, mock_thread, temp_static_dir):
+        """Test that the thread-based workflow recognizes inside a shared quota slot."""
+        import wave
+        from unittest.mock import AsyncMock
+        from services.pipeline import pipeline
+        from services.transcription_service import TranscriptionService
+
+        service = TranscriptionService(
+            azure_key="test-key",
+            azure_region="test-region",
+            static_dir=temp_static_dir,
+        )
+        with wave.open(service.audio_wav, "wb") as audio:
+            audio.setnchannels(1)
+            audio.setsampwidth(2)
+            audio.setframerate(16000)
+            audio.writeframes(b"\0\0" * 16000)
+
+        active = []
+
+        async def recognize(service):
+            active.append(pipeline.quota.active)
+            return ["The camera is great."], "en"
+
+        with patch.object(pipeline, "_recognize", new=AsyncMock(side_effect=recognize)):
+            service._transcribe_audio_full()
+
+        assert active == [1]
+        assert pipeline.quota.active == 0
+        assert "The camera is great." in service.get_transcript_text()
+
+    @patch("services.transcription_service.Thread")
+    def test_background_media_stages_take_a_batch_scheduler_slot(self, mock_thread, temp_static_dir):
+        """Test that the thread-based workflow downloads and converts inside a batch-lane slot."""
+        from services.pipeline import pipeline
+        from services.transcription_service import TranscriptionService
+
+        service = TranscriptionService(
+            azure_key="test-key",
+            azure_region="test-region",
+            static_dir=temp_static_dir,
+        )
+        running = []
+
+        def stage():
+            running.append(pipeline.scheduler.running)
+
+        with patch.object(service, "_preflight"), \
+                patch.object(service, "_download_audio", side_effect=stage), \
+                patch.object(service, "_convert_audio", side_effect=stage), \
+                patch.object(pipeline.scheduler, "priority", wraps=pipeline.scheduler.priority) as priority:
+            service._transcription_workflow()
+
+        assert running == [1, 1]
+        priority.assert_called_once_with("batch", None)
+        # The WAV never appeared, so the job fails, and its slot is handed back
+        assert service.state == "failed"
+        pipeline.submit(asyncio.sleep(0)).result()
+        assert pipeline.scheduler.running == 0
+
 
 class TestTranscriptionServiceIntegration:
     """Integration tests for TranscriptionService with real audio files."""
@@ -102,7 +164,7 @@ class TestTranscriptionServiceIntegration:
         service._transcription_started = True
         
         # Transcribe the audio file
-        service._transcribe_audio_full(wav_path)
+        service._transcribe_audio_full()
         
         # Get the transcription result
         result_text = service.get_transcript_text()
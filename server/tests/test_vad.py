@@ -0,0 +1,56 @@
+"""
+Tests for voice-activity-based silence trimming.
+"""
+
+import wave
+
+import numpy as np
+
+from services.vad import PADDING_MS, trim_silence
+
+
+def _write_wav(path, samples, frame_rate=16000):
+    with wave.open(str(path), "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(frame_rate)
+        out.writeframes(samples.astype("<i2").tobytes())
+
+
+class TestTrimSilence:
+    """Test cases for trim_silence."""
+
+    def test_silence_is_cut_and_offsets_map_back(self, tmp_path):
+        """Test that long pauses are removed and trimmed time maps to original time."""
+        rate = 16000
+        rng = np.random.default_rng(0)
+        t = np.arange(rate) / rate
+        tone = 8000 * np.sin(2 * np.pi * 220 * t)
+        quiet = lambda seconds: rng.normal(0, 20, int(seconds * rate))
+        # 3s quiet, 1s "speech", 4s quiet, 1s "speech", 3s quiet
+        samples = np.concatenate([quiet(3), tone, quiet(4), tone, quiet(3)])
+        _write_wav(tmp_path / "audio.wav", samples)
+
+        result = trim_silence(str(tmp_path / "audio.wav"), str(tmp_path / "audio.speech.wav"))
+
+        assert result.original_seconds == 12.0
+        assert result.trimmed_seconds < 4.0
+        with wave.open(result.path, "rb") as trimmed:
+            assert trimmed.getnframes() == round(result.trimmed_seconds * rate)
+
+        padding = PADDING_MS / 1000
+        offset_map = result.offset_map
+        assert len(offset_map.trimmed_starts) == 2
+        # Start of the second spoken second, relative to its padded region
+        second = offset_map.trimmed_starts[1] + padding
+        assert abs(offset_map.to_original(second) - 8.0) < 0.05
+        assert abs(offset_map.to_original(padding) - 3.0) < 0.05
+
+    def test_audio_without_pauses_is_left_alone(self, tmp_path):
+        """Test that nothing is written when there is no silence worth cutting."""
+        rate = 16000
+        t = np.arange(3 * rate) / rate
+        _write_wav(tmp_path / "audio.wav", 8000 * np.sin(2 * np.pi * 220 * t))
+
+        assert trim_silence(str(tmp_path / "audio.wav"), str(tmp_path / "out.wav")) is None
+        assert not (tmp_path / "out.wav").exists()
@@ -4,7 +4,29 @@ Tests for video analysis routes.
 
 import json
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
+
+
+def _fake_stages(transcript=None, **stages):
+    """Patch the pipeline's media stages with AsyncMock stand-ins, except those given.
+
+    The stand-in recognition returns `transcript`.
+    """
+    from services.pipeline import pipeline
+
+    defaults = {
+        "preflight": AsyncMock(),
+        "download": AsyncMock(),
+        "convert": AsyncMock(),
+        "transcribe": AsyncMock(return_value=transcript),
+    }
+    return patch.multiple(pipeline, **{**defaults, **stages})
+
+
+def _analyze(client, url):
+    return client.post(
+        "/api/video/analyze", data=json.dumps({"url": url}), content_type="application/json"
+    )
 
 
 class TestVideoAnalyzeEndpoint:
@@ -12,11 +34,7 @@ class TestVideoAnalyzeEndpoint:
 
     def test_analyze_returns_400_for_unsupported_platform(self, client):
         """Test that unsupported platform returns 400 error."""
-        response = client.post(
-            "/api/video/analyze",
-            data=json.dumps({"url": "https://unsupported-site.com/video/123"}),
-            content_type="application/json",
-        )
+        response = _analyze(client, "https://unsupported-site.com/video/123")
         assert response.status_code == 400
         data = response.get_json()
         assert "error" in data
@@ -27,4 +45,140 @@ class TestVideoAnalyzeEndpoint:
         from routes.video import _extract_phone_name
         text = "Today we're reviewing the iPhone 15 Pro Max and it's amazing."
         result = _extract_phone_name(text)
-        assert "iPhone" in result
\ No newline at end of file
+        assert "iPhone" in result
+
+    def test_analyze_runs_pipeline_and_returns_sentiment(self, client, sample_transcription_text):
+        """Test that the async view awaits the pipeline job and formats its result."""
+        with _fake_stages(sample_transcription_text):
+            response = _analyze(client, "https://www.youtube.com/watch?v=abc123")
+
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data["embedUrl"] == "https://www.youtube.com/embed/abc123"
+        assert data["sentiment"]["camera"]["sentiment"] == "positive"
+
+    def test_finished_analysis_is_queryable_from_store(self, app, client, sample_transcription_text):
+        """Test that a finished analysis is persisted and served by the sentiment query."""
+        from services.analysis_store import get_store
+
+        with _fake_stages(sample_transcription_text):
+            _analyze(client, "https://youtu.be/abc123")
+        get_store(app.config["ANALYSIS_DB"]).flush()
+
+        response = client.get("/api/video/sentiment?feature=battery&model=iphone 15 pro")
+
+        assert response.status_code == 200
+        results = response.get_json()["results"]
+        assert [r["video_key"] for r in results] == ["youtube:abc123"]
+        assert results[0]["sentiment"] == "positive"
+
+        latest = client.get("/api/video/latest?url=https://www.youtube.com/watch?v=abc123")
+        assert latest.status_code == 200
+        assert latest.get_json()["results"]["battery"]["sentiment"] == "positive"
+        assert client.get("/api/video/latest?url=https://youtu.be/unknown").status_code == 404
+
+        rollup = client.get("/api/video/rollups?model=iPhone 15 Pro").get_json()
+        assert rollup["videos"]["count"] == 1
+        assert rollup["features"]["battery"]["positive"] == 1
+
+    def test_concurrent_identical_requests_share_one_job(self, app, sample_transcription_text):
+        """Test that concurrent submissions of one video run a single pipeline job."""
+        import asyncio
+        from concurrent.futures import ThreadPoolExecutor
+        from services.pipeline import pipeline
+
+        async def slow_transcribe(service):
+            await asyncio.sleep(0.3)
+            return sample_transcription_text
+
+        def submit(url):
+            return _analyze(app.test_client(), url)
+
+        download = AsyncMock()
+        with _fake_stages(download=download, transcribe=slow_transcribe):
+            with ThreadPoolExecutor(3) as executor:
+                responses = list(executor.map(submit, [
+                    "https://www.youtube.com/watch?v=viral1",
+                    "https://youtu.be/viral1",
+                    "https://www.youtube.com/watch?v=viral1&t=5",
+                ]))
+
+        assert [r.status_code for r in responses] == [200, 200, 200]
+        assert download.await_count == 1
+        assert len(pipeline.flights) == 0
+
+    def test_analysis_leaves_no_files_in_static_dir(self, client, temp_static_dir, sample_transcription_text):
+        """Test that every audio, transcript and segment file of an analysis is removed."""
+        import os
+        from types import SimpleNamespace
+
+        def touch(*paths):
+            for path in paths:
+                open(path, "wb").close()
+
+        async def download(service):
+            touch(service.audio_mp3)
+
+        async def convert(service):
+            touch(service.audio_wav, service.speech_wav)
+
+        async def transcribe(service):
+            # Analyses keep no timed segments: nothing could read them
+            service._reset_segments()
+            service._record_segment(SimpleNamespace(offset=0, duration=10_000_000, text="Hi."))
+            assert not os.path.exists(service.segments.index_path)
+            return service._save_transcript([sample_transcription_text])
+
+        with _fake_stages(download=download, convert=convert, transcribe=transcribe):
+            response = _analyze(client, "https://www.youtube.com/watch?v=cleanup1")
+
+        assert response.status_code == 200
+        leftovers = [name for name in os.listdir(temp_static_dir) if not name.startswith("analysis.db")]
+        assert leftovers == []
+
+    def test_overlong_video_is_rejected_before_download(self, client):
+        """Test that the pre-flight duration limit stops the job before any download."""
+        from services.transcription_service import VideoRejected
+
+        download = AsyncMock()
+        with _fake_stages(preflight=AsyncMock(side_effect=VideoRejected("too long")), download=download):
+            response = _analyze(client, "https://www.youtube.com/watch?v=long1")
+
+        assert response.status_code == 413
+        download.assert_not_awaited()
+
+    def test_captions_skip_recognition(self, client, sample_transcription_text):
+        """Test that captions found by the pre-flight step replace download and recognition."""
+        async def with_captions(service):
+            service.caption_text = sample_transcription_text
+
+        download = AsyncMock()
+        with _fake_stages(preflight=with_captions, download=download):
+            response = _analyze(client, "https://www.youtube.com/watch?v=captioned1")
+
+        assert response.status_code == 200
+        assert response.get_json()["sentiment"]["camera"]["sentiment"] == "positive"
+        download.assert_not_awaited()
+
+    def test_analyze_reports_failed_transcription(self, client):
+        """Test that a failure marker from the pipeline becomes a 500 error."""
+        with _fake_stages("[No speech detected]"):
+            response = _analyze(client, "https://youtu.be/abc123")
+
+        assert response.status_code == 500
+        assert "No speech detected" in response.get_json()["error"]
+
+    def test_analyze_records_pipeline_errors_as_failed(self, app, client):
+        """Test that a job that raises is stored as failed before the 500 is returned."""
+        from services.analysis_store import get_store
+        from services.pipeline import PipelineError
+
+        store = get_store(app.config["ANALYSIS_DB"])
+        with _fake_stages(download=AsyncMock(side_effect=PipelineError("yt_dlp failed"))), \
+                patch.object(store, "record") as record:
+            response = _analyze(client, "https://youtu.be/broken1")
+
+        assert response.status_code == 500
+        stored = record.call_args.args[0]
+        assert (stored.video_key, stored.status) == ("youtube:broken1", "failed")
+        assert stored.error == "PipelineError: yt_dlp failed"